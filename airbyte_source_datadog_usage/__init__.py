@@ -3,6 +3,18 @@
 #
 
 
-from .source import SourceDatadogUsage
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .source import SourceDatadogUsage
 
 __all__ = ["SourceDatadogUsage"]
+
+
+def __getattr__(name: str) -> Any:
+    # Imported on first use, so that `spec` runs without loading the CDK.
+    if name == "SourceDatadogUsage":
+        from .source import SourceDatadogUsage
+
+        return SourceDatadogUsage
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
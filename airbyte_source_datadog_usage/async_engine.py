@@ -0,0 +1,171 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import asyncio
+import random
+import threading
+from concurrent.futures import Future
+from typing import Any, List, Mapping, Optional
+
+import requests
+
+from .concurrency import Slice, SliceFetcher
+from .http2 import http2_available
+from .page_size import PAGE_LIMIT_PARAM
+from .response_cache import CACHE_HEADER
+
+
+class AsyncSliceFetcher(SliceFetcher):
+    """
+    Fetches upcoming slices of `stream` as coroutines on a single event loop thread.
+
+    Pagination, request building and record parsing are delegated to the stream, so
+    the records are the same as with the synchronous path; only the transport
+    (httpx) differs. Requests in flight are capped by a semaphore of
+    `max_concurrency` and by the stream's shared rate-limit budget. Records are
+    handed back in slice order through the `SliceFetcher` interface.
+    """
+
+    def __init__(
+        self, stream: Any, stream_state: Mapping[str, Any], max_concurrency: int
+    ):
+        super().__init__(fetch=None, max_workers=max_concurrency)
+        self._stream = stream
+        self._stream_state = stream_state
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def _start(self) -> None:
+        try:
+            import httpx
+        except ImportError as error:
+            raise ImportError(
+                "The async read engine requires httpx; install the `async` extra."
+            ) from error
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="slice-fetcher-async", daemon=True
+        )
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._open(httpx), self._loop).result()
+
+    async def _open(self, httpx: Any) -> None:
+        connect_timeout, read_timeout = self._stream.timeout
+        self._client = httpx.AsyncClient(
+            http2=self._stream.http2 and http2_available(),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=self._max_workers),
+            headers={"Accept-Encoding": "gzip, deflate"},
+        )
+        self._semaphore = asyncio.Semaphore(self._max_workers)
+
+    def _stop(self) -> None:
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = self._thread = self._client = self._semaphore = None
+
+    def _submit(self, stream_slice: Slice) -> Future:
+        return asyncio.run_coroutine_threadsafe(
+            self._fetch_slice(stream_slice), self._loop
+        )
+
+    async def _fetch_slice(self, stream_slice: Slice) -> List[Mapping[str, Any]]:
+        records = []
+        next_page_token = None
+        while True:
+            response = await self._request(stream_slice, next_page_token)
+            records.extend(
+                self._stream._parse_page(
+                    None, response, self._stream_state, stream_slice
+                )
+            )
+            next_page_token = self._stream.next_page_token(response)
+            if not next_page_token:
+                return records
+
+    async def _request(
+        self, stream_slice: Slice, next_page_token: Optional[Mapping[str, Any]]
+    ) -> Any:
+        import httpx
+
+        stream = self._stream
+        kwargs = {
+            "stream_state": self._stream_state,
+            "stream_slice": stream_slice,
+            "next_page_token": next_page_token,
+        }
+        url = stream._join_url(stream.url_base, stream.path(**kwargs))
+        params = stream.request_params(**kwargs)
+        headers = stream.request_headers(**kwargs)
+
+        cache = stream.response_cache
+        if cache is not None:
+            # Same key as the synchronous path, which encodes the URL with requests.
+            full_url = requests.Request("GET", url, params=params).prepare().url
+            if stream._cacheable(full_url):
+                key = cache.key(full_url, headers.get("DD-API-KEY", ""))
+                body = cache.get(key)
+                if body is not None:
+                    stream.metrics.add("cache_hits")
+                    return httpx.Response(
+                        200, content=body, headers={CACHE_HEADER: "hit"}
+                    )
+                response = await self._send(url, params, headers)
+                if response.status_code == 200:
+                    cache.put(key, response.content)
+                return response
+        return await self._send(url, params, headers)
+
+    async def _send(
+        self, url: str, params: Mapping[str, Any], headers: Mapping[str, Any]
+    ) -> Any:
+        import httpx
+
+        stream = self._stream
+        max_retries = stream.max_retries or 0
+        metrics = stream.metrics
+        rate_limiter = stream._rate_limiter(headers)
+
+        attempt = 0
+        while True:
+            metrics.add("throttle_wait_seconds", await rate_limiter.acquire_async())
+            metrics.add("requests")
+            if stream.adaptive_page_size is not None and PAGE_LIMIT_PARAM in params:
+                params = {**params, PAGE_LIMIT_PARAM: stream.adaptive_page_size.current}
+            try:
+                async with self._semaphore:
+                    with metrics.timer("network_seconds"):
+                        response = await self._client.get(
+                            url, params=params, headers=headers
+                        )
+            except httpx.TransportError as error:
+                if isinstance(error, httpx.TimeoutException):
+                    stream._shrink_page_size()
+                if attempt >= max_retries:
+                    raise
+                metrics.add("retries")
+                backoff = None
+            else:
+                rate_limiter.update(response.headers)
+                if response.status_code >= 500:
+                    stream._shrink_page_size()
+                retried = stream.should_retry(response) and attempt < max_retries
+                metrics.observe_response(response.status_code, retried=retried)
+                if not retried:
+                    response.raise_for_status()
+                    return response
+                backoff = stream.backoff_time(response)
+
+            if backoff is None:
+                backoff = stream.retry_factor * 2**attempt * (0.5 + random.random())
+            await asyncio.sleep(backoff)
+            attempt += 1
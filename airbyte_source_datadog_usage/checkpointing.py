@@ -0,0 +1,80 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import threading
+import time
+from typing import Any, Callable, Mapping, Optional
+
+DEFAULT_INTERVAL_SECONDS = 60.0
+
+
+class CheckpointPolicy:
+    """
+    Decides when a stream checkpoints its state within a slice.
+
+    A checkpoint is due once `interval_seconds` have elapsed, `interval_bytes`
+    have been downloaded or `interval_records` have been read since the previous
+    one; a limit of `None` never triggers. The CDK also checkpoints at the end of
+    every slice, which starts a new interval. Bytes may be added from the threads
+    that fetch slices or pages ahead.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: Optional[float] = DEFAULT_INTERVAL_SECONDS,
+        interval_bytes: Optional[int] = None,
+        interval_records: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.interval_seconds = interval_seconds
+        self.interval_bytes = interval_bytes
+        self.interval_records = interval_records
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._started = clock()
+        self._bytes = 0
+        self._records = 0
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "CheckpointPolicy":
+        checkpointing = config.get("checkpointing") or {}
+        interval_mb = checkpointing.get("interval_mb")
+        return cls(
+            interval_seconds=checkpointing.get(
+                "interval_seconds", DEFAULT_INTERVAL_SECONDS
+            )
+            or None,
+            interval_bytes=int(interval_mb * 2**20) if interval_mb else None,
+            interval_records=checkpointing.get("interval_records") or None,
+        )
+
+    def add_bytes(self, size: int) -> None:
+        with self._lock:
+            self._bytes += size
+
+    def due(self) -> bool:
+        """Counts one more record and tells whether to checkpoint after it, starting a new interval if so."""
+        with self._lock:
+            self._records += 1
+            if (
+                (self.interval_records and self._records >= self.interval_records)
+                or (self.interval_bytes and self._bytes >= self.interval_bytes)
+                or (
+                    self.interval_seconds
+                    and self._clock() - self._started >= self.interval_seconds
+                )
+            ):
+                self._reset()
+                return True
+            return False
+
+    def reset(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        self._started = self._clock()
+        self._bytes = 0
+        self._records = 0
@@ -0,0 +1,136 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Full, Queue
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+Slice = Mapping[str, Any]
+T = TypeVar("T")
+
+_DONE = object()
+
+
+class SliceFetcher:
+    """
+    Fetches upcoming stream slices on a bounded thread pool.
+
+    Slices are submitted in order and at most `max_workers` of them are fetched or
+    buffered ahead of the one being emitted, so memory stays bounded. Records are
+    handed back strictly in slice order, which keeps the records and the state
+    messages the CDK emits after each slice in cursor order.
+    """
+
+    def __init__(
+        self, fetch: Callable[[Slice], List[Mapping[str, Any]]], max_workers: int
+    ):
+        self._fetch = fetch
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Deque[Slice] = deque()
+        self._in_flight: Deque[Tuple[Slice, Future]] = deque()
+
+    def schedule(self, slices: Iterable[Slice]) -> None:
+        self.close()
+        self._start()
+        self._pending = deque(slices)
+        self._fill()
+
+    def has(self, stream_slice: Optional[Slice]) -> bool:
+        return bool(self._in_flight) and self._in_flight[0][0] == stream_slice
+
+    def records(self, stream_slice: Slice) -> Iterable[Mapping[str, Any]]:
+        _, future = self._in_flight.popleft()
+        self._fill()
+        try:
+            records = future.result()
+        except BaseException:
+            self.close()
+            raise
+        if not self._in_flight:
+            self.close()
+        yield from records
+
+    def close(self) -> None:
+        for _, future in self._in_flight:
+            future.cancel()
+        self._pending.clear()
+        self._in_flight.clear()
+        self._stop()
+
+    def _start(self) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=self._max_workers, thread_name_prefix="slice-fetcher"
+        )
+
+    def _stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _submit(self, stream_slice: Slice) -> Future:
+        return self._executor.submit(self._fetch, stream_slice)
+
+    def _fill(self) -> None:
+        while self._pending and len(self._in_flight) < self._max_workers:
+            stream_slice = self._pending.popleft()
+            self._in_flight.append((stream_slice, self._submit(stream_slice)))
+
+
+def prefetched(items: Iterator[T], depth: int) -> Iterator[T]:
+    """
+    Advances `items` on a background thread while the caller consumes them.
+
+    At most `depth` items wait in the queue, plus the one being produced, so
+    memory stays bounded. Items keep their order, and an exception raised by
+    `items` is re-raised to the caller when it reaches it. Closing the returned
+    iterator stops the producer at its next item.
+    """
+    queue: "Queue[Tuple[Any, Optional[BaseException]]]" = Queue(maxsize=depth)
+    stopped = threading.Event()
+
+    def put(item: Any, error: Optional[BaseException] = None) -> bool:
+        while not stopped.is_set():
+            try:
+                queue.put((item, error), timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put(item):
+                    return
+        except BaseException as error:
+            put(None, error)
+        else:
+            put(_DONE)
+
+    threading.Thread(target=produce, name="page-prefetcher", daemon=True).start()
+    try:
+        while True:
+            item, error = queue.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        stopped.set()
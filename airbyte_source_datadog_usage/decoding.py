@@ -0,0 +1,84 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import json
+from typing import Any, Iterator, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_CACHE_ATTRIBUTE = "_datadog_usage_json"
+_MISSING = object()
+
+
+def loads(content: Union[bytes, bytearray, str]) -> Any:
+    """Decodes a JSON document with orjson when it is installed, the stdlib otherwise."""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def response_json(response: Any) -> Any:
+    """
+    Returns the decoded body of `response`, parsing it at most once.
+
+    The result is cached on the response object so that pagination and record
+    parsing share a single decode of every page.
+    """
+    cached = response.__dict__.get(_CACHE_ATTRIBUTE, _MISSING)
+    if cached is not _MISSING:
+        return cached
+
+    content = getattr(response, "content", None)
+    if not isinstance(content, (bytes, bytearray)):
+        # Not a materialized HTTP response (e.g. a test double): defer to its own decoder.
+        return response.json()
+
+    cached = loads(content)
+    response.__dict__[_CACHE_ATTRIBUTE] = cached
+    return cached
+
+
+def stream_items(response: Any, prefix: str = "data.item") -> Iterator[Any]:
+    """
+    Yields the items found at `prefix` while the body of a `stream=True` response
+    is still being downloaded.
+
+    Every other part of the document (e.g. `meta.pagination`) is kept and cached as
+    the decoded body once the stream is exhausted, so `response_json` still works
+    for pagination without buffering the whole page.
+    """
+    try:
+        import ijson
+    except ImportError as error:
+        raise ImportError(
+            "Streaming response parsing requires ijson; install the `streaming` extra."
+        ) from error
+
+    response.raw.decode_content = True
+    document = ijson.ObjectBuilder()
+    item = None
+    depth = 0
+    for path, event, value in ijson.parse(response.raw, use_float=True):
+        if depth == 0 and not (
+            path == prefix and event in ("start_map", "start_array")
+        ):
+            document.event(event, value)
+            continue
+
+        if depth == 0:
+            item = ijson.ObjectBuilder()
+        item.event(event, value)
+        if event in ("start_map", "start_array"):
+            depth += 1
+        elif event in ("end_map", "end_array"):
+            depth -= 1
+            if depth == 0:
+                yield item.value
+                item = None
+
+    response.__dict__[_CACHE_ATTRIBUTE] = document.value
@@ -0,0 +1,295 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import logging
+import os
+import random
+import ssl
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple, Union
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import (
+    DEFAULT_CA_BUNDLE_PATH,
+    get_encoding_from_headers,
+    select_proxy,
+)
+from urllib3.util.retry import RequestHistory
+
+logger = logging.getLogger("airbyte")
+
+# Connection-specific headers, which HTTP/2 forbids; httpx manages the connection.
+_HOP_BY_HOP_HEADERS = frozenset(
+    {"connection", "keep-alive", "proxy-connection", "transfer-encoding", "upgrade"}
+)
+# Methods retried on 5xx and connection errors, as by `build_session`.
+_RETRY_METHODS = frozenset({"GET", "HEAD"})
+_warned = False
+
+
+def http2_available() -> bool:
+    """Whether httpx and h2 are installed. Warns, once, that HTTP/1.1 is used if not."""
+    global _warned
+    try:
+        import h2  # noqa: F401
+        import httpx  # noqa: F401
+    except ImportError:
+        if not _warned:
+            logger.warning(
+                "HTTP/2 requires httpx and h2; install the `http2` extra. "
+                "Falling back to HTTP/1.1."
+            )
+            _warned = True
+        return False
+    return True
+
+
+class HTTPXRaw:
+    """
+    The body of a streamed httpx response, read like the urllib3 response that
+    `requests` exposes as `Response.raw`. Content is already decoded, and
+    `retries.history` lists the attempts that were retried, as urllib3 does.
+    """
+
+    def __init__(
+        self,
+        response: Any,
+        request: requests.PreparedRequest,
+        history: Tuple[RequestHistory, ...] = (),
+    ):
+        self._response = response
+        self._request = request
+        self.retries = SimpleNamespace(history=history)
+        self._chunks: Optional[Iterator[bytes]] = None
+        self._buffer = bytearray()
+        self.decode_content = True
+        self.http_version = response.http_version
+
+    def read(self, amt: Optional[int] = None, **kwargs) -> bytes:
+        if self._chunks is None:
+            self._chunks = self._response.iter_bytes()
+        while amt is None or len(self._buffer) < amt:
+            try:
+                chunk = next(self._chunks, None)
+            except Exception as error:
+                raise _requests_error(error, self._request) from error
+            if chunk is None:
+                self.close()
+                break
+            self._buffer += chunk
+        size = len(self._buffer) if amt is None else amt
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def stream(self, amt: int = 2**16, decode_content: bool = True) -> Iterator[bytes]:
+        while True:
+            data = self.read(amt)
+            if not data:
+                return
+            yield data
+
+    def tell(self) -> int:
+        """Bytes read from the wire, compressed."""
+        return self._response.num_bytes_downloaded
+
+    def close(self) -> None:
+        self._response.close()
+
+    def release_conn(self) -> None:
+        self.close()
+
+
+class HTTP2Adapter(BaseAdapter):
+    """
+    Sends the requests of a `requests.Session` through one httpx client with
+    HTTP/2 enabled.
+
+    Concurrent requests to a host share a single connection when the server
+    negotiates h2 over ALPN, and use HTTP/1.1 connections when it does not.
+    Responses are handed back as `requests.Response`, streamed or not.
+    Retries mirror those of the HTTP/1.1 adapter of `build_session`, and
+    `verify`, `cert` and `proxies` are honored as `HTTPAdapter` does.
+    """
+
+    def __init__(
+        self,
+        max_retries: int,
+        retry_statuses: Tuple[int, ...],
+        pool_size: int,
+        backoff_factor: float = 0.5,
+    ):
+        super().__init__()
+        import httpx
+
+        self._httpx = httpx
+        self.max_retries = max_retries
+        self.retry_statuses = retry_statuses
+        self.backoff_factor = backoff_factor
+        self.pool_size = pool_size
+        # One client, and so one connection pool, per TLS configuration and proxy.
+        self._clients: Dict[Tuple[Any, Any], Any] = {}
+        self._lock = threading.Lock()
+
+    def send(
+        self,
+        request: requests.PreparedRequest,
+        stream: bool = False,
+        timeout: Union[None, float, Tuple[float, float]] = None,
+        verify: Union[bool, str] = True,
+        cert: Any = None,
+        proxies: Optional[Mapping[str, str]] = None,
+    ) -> requests.Response:
+        httpx = self._httpx
+        client = self._client(verify, cert, select_proxy(request.url, proxies))
+        headers = {
+            name: value
+            for name, value in request.headers.items()
+            if name.lower() not in _HOP_BY_HOP_HEADERS
+        }
+        if isinstance(timeout, tuple):
+            connect_timeout, read_timeout = timeout
+            timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        elif timeout is None:
+            timeout = httpx.Timeout(None)
+        httpx_request = client.build_request(
+            request.method,
+            request.url,
+            headers=headers,
+            content=request.body,
+            timeout=timeout,
+        )
+
+        retryable = request.method in _RETRY_METHODS
+        history: List[RequestHistory] = []
+        while True:
+            try:
+                response = client.send(httpx_request, stream=True)
+            except httpx.TransportError as error:
+                if len(history) >= self.max_retries or not retryable:
+                    raise _requests_error(error, request) from error
+                history.append(
+                    RequestHistory(request.method, request.url, error, None, None)
+                )
+                delay = None
+            else:
+                if (
+                    response.status_code not in self.retry_statuses
+                    or len(history) >= self.max_retries
+                    or not retryable
+                ):
+                    return self._build_response(
+                        request, response, stream, tuple(history)
+                    )
+                history.append(
+                    RequestHistory(
+                        request.method, request.url, None, response.status_code, None
+                    )
+                )
+                delay = _retry_after(response.headers.get("Retry-After"))
+                response.close()
+            if delay is None:
+                delay = self.backoff_factor * 2 ** (len(history) - 1) + random.random()
+            time.sleep(delay)
+
+    def _client(self, verify: Union[bool, str], cert: Any, proxy: Optional[str]) -> Any:
+        key = (verify, tuple(cert) if isinstance(cert, list) else cert, proxy)
+        with self._lock:
+            if key not in self._clients:
+                httpx = self._httpx
+                # `requests` has resolved the proxy, `NO_PROXY` included, so httpx
+                # must not look at the environment again.
+                transport = httpx.HTTPTransport(
+                    http2=True,
+                    verify=_ssl_context(verify, cert),
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size,
+                    ),
+                    proxy=proxy,
+                )
+                self._clients[key] = httpx.Client(
+                    transport=transport, follow_redirects=False, trust_env=False
+                )
+            return self._clients[key]
+
+    def _build_response(
+        self,
+        request: requests.PreparedRequest,
+        response: Any,
+        stream: bool,
+        history: Tuple[RequestHistory, ...],
+    ) -> requests.Response:
+        result = requests.Response()
+        result.status_code = response.status_code
+        result.headers = CaseInsensitiveDict(response.headers.items())
+        result.encoding = get_encoding_from_headers(result.headers)
+        result.reason = response.reason_phrase
+        result.url = request.url
+        result.request = request
+        result.connection = self
+        result.raw = HTTPXRaw(response, request, history)
+        if not stream:
+            result._content = result.raw.read()
+        return result
+
+    def close(self) -> None:
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            client.close()
+
+
+def _ssl_context(verify: Union[bool, str], cert: Any) -> ssl.SSLContext:
+    """The TLS settings `requests.adapters.HTTPAdapter.cert_verify` would apply."""
+    if verify is False:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    else:
+        bundle = DEFAULT_CA_BUNDLE_PATH if verify is True else verify
+        if os.path.isdir(bundle):
+            context = ssl.create_default_context(capath=bundle)
+        else:
+            context = ssl.create_default_context(cafile=bundle)
+    if cert:
+        if isinstance(cert, str):
+            context.load_cert_chain(cert)
+        else:
+            context.load_cert_chain(*cert)
+    return context
+
+
+def _requests_error(error: Exception, request: requests.PreparedRequest) -> Exception:
+    """The `requests` counterpart of an httpx transport error, which the CDK retries."""
+    import httpx
+
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(error, request=request)
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(error, request=request)
+    if isinstance(error, httpx.ConnectError):
+        return requests.exceptions.ConnectionError(error, request=request)
+    if isinstance(error, httpx.TransportError):
+        return requests.exceptions.ChunkedEncodingError(error, request=request)
+    return error
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
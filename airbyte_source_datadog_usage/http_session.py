@@ -0,0 +1,66 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+from typing import Any, Mapping, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .http2 import HTTP2Adapter, http2_available
+
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 300.0
+DEFAULT_MAX_RETRIES = 3
+# 429s are retried by the streams, which wait for `X-RateLimit-Reset` and pace
+# the retry through the rate limiter; retrying them here would spend the budget.
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+def timeouts(config: Mapping[str, Any]) -> Tuple[float, float]:
+    http = config.get("http") or {}
+    return (
+        http.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+        http.get("read_timeout", DEFAULT_READ_TIMEOUT),
+    )
+
+
+def build_session(config: Mapping[str, Any]) -> requests.Session:
+    """
+    Builds the session shared by `check_connection` and every stream of a source.
+
+    Connections to `api.{site}` are pooled and kept alive, responses are requested
+    compressed, and idempotent requests that hit a 5xx or a connection error are
+    retried with jittered exponential backoff, honouring `Retry-After`. With
+    `http.http2`, HTTPS requests go through one HTTP/2 client instead, which
+    multiplexes them over a single connection per host.
+    """
+    http = config.get("http") or {}
+    max_retries = http.get("max_retries", DEFAULT_MAX_RETRIES)
+    pool_size = max(10, config.get("max_concurrency", 1))
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=0.5,
+        backoff_jitter=1.0,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    if http.get("http2", False) and http2_available():
+        adapter = HTTP2Adapter(
+            max_retries=max_retries, retry_statuses=RETRY_STATUSES, pool_size=pool_size
+        )
+    session.mount("https://", adapter)
+    session.headers.update(
+        {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"}
+    )
+    return session
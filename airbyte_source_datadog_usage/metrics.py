@@ -0,0 +1,158 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from airbyte_cdk.models import (
+    AirbyteAnalyticsTraceMessage,
+    AirbyteMessage,
+    AirbyteTraceMessage,
+    TraceType,
+    Type,
+)
+
+COUNTERS = (
+    "requests",
+    "cache_hits",
+    "pages",
+    "records",
+    "bytes",
+    "retries",
+    "throttled",
+)
+TIMERS = ("network_seconds", "throttle_wait_seconds", "parse_seconds")
+METRICS_EVENT = "datadog_usage_stream_metrics"
+
+
+def body_size(response: Any) -> int:
+    """Bytes of `response` read from the wire, compressed, once its body has been consumed."""
+    length = response.headers.get("Content-Length")
+    if length:
+        return int(length)
+    downloaded = getattr(response, "num_bytes_downloaded", None)  # httpx
+    if downloaded is not None:
+        return downloaded
+    raw = getattr(response, "raw", None)
+    if raw is not None and hasattr(raw, "tell"):
+        return raw.tell()
+    return len(response.content)
+
+
+class StreamMetrics:
+    """
+    Counters and timers of the hot path of one stream, plus gauges such as the
+    page size last requested, which are reported as they stand.
+
+    Updates are thread-safe, so requests issued by slice fetcher threads are
+    counted too. Reports cover what happened since the previous report; with
+    `max_concurrency` above 1 a slice report also includes the work already done
+    for the slices being fetched ahead of it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._values: Dict[str, float] = dict.fromkeys(COUNTERS + TIMERS, 0)
+        self._reported = dict(self._values)
+        self._gauges: Dict[str, float] = {}
+
+    def add(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._values[name] += value
+
+    def set(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def parsed(self, records: Iterable[Any]) -> Iterator[Any]:
+        """Yields `records` of one page, counting them and the time spent producing them."""
+        elapsed = 0.0
+        count = 0
+        iterator = iter(records)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    record = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - started
+                count += 1
+                yield record
+        finally:
+            with self._lock:
+                self._values["pages"] += 1
+                self._values["records"] += count
+                self._values["parse_seconds"] += elapsed
+
+    def observe_response(
+        self, status_code: int, retry_history: Iterable[Any] = (), retried: bool = False
+    ) -> None:
+        """
+        Counts the retries and 429s behind a response: those urllib3 already retried
+        on its own (`retry_history`) and, when `retried`, the response itself.
+        """
+        statuses = [getattr(attempt, "status", None) for attempt in retry_history]
+        statuses.append(status_code)
+        with self._lock:
+            self._values["retries"] += len(statuses) - 1 + retried
+            self._values["throttled"] += statuses.count(429)
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            return self._with_ratios({**self._values, **self._gauges})
+
+    def since_last_report(self) -> Dict[str, float]:
+        with self._lock:
+            values = {
+                name: value - self._reported[name]
+                for name, value in self._values.items()
+            }
+            self._reported = dict(self._values)
+            values.update(self._gauges)
+        return self._with_ratios(values)
+
+    @staticmethod
+    def _with_ratios(values: Dict[str, float]) -> Dict[str, float]:
+        values["records_per_page"] = (
+            values["records"] / values["pages"] if values["pages"] else 0
+        )
+        return {
+            name: round(value, 4) if isinstance(value, float) else value
+            for name, value in values.items()
+        }
+
+
+def format_metrics(values: Dict[str, float]) -> str:
+    return ", ".join(f"{name}={value}" for name, value in values.items())
+
+
+def trace_message(
+    stream_name: str, values: Dict[str, float], emitted_at: Optional[float] = None
+) -> AirbyteMessage:
+    emitted_at = time.time() * 1000 if emitted_at is None else emitted_at
+    return AirbyteMessage(
+        type=Type.TRACE,
+        trace=AirbyteTraceMessage(
+            type=TraceType.ANALYTICS,
+            emitted_at=emitted_at,
+            analytics=AirbyteAnalyticsTraceMessage(
+                type=METRICS_EVENT,
+                value=json.dumps({"stream": stream_name, **values}),
+            ),
+        ),
+    )
@@ -0,0 +1,71 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+from typing import Any, Dict, List, Mapping, Optional
+
+from .rate_limit import RateLimitScheduler
+
+
+class Organization:
+    """
+    A credential set the source syncs usage for.
+
+    `name` partitions the stream state and the slices of each organization. It is
+    `None` for the single organization of a config without `organizations`, whose
+    state keeps its unpartitioned layout. Requests are paced by `rate_limiter`,
+    the organization's own budget, or else by the stream's.
+    """
+
+    def __init__(
+        self,
+        name: Optional[str],
+        api_key: str,
+        application_key: str,
+        rate_limiter: Optional[RateLimitScheduler] = None,
+    ):
+        self.name = name
+        self.api_key = api_key
+        self.application_key = application_key
+        self.rate_limiter = rate_limiter
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "DD-API-KEY": self.api_key,
+            "DD-APPLICATION-KEY": self.application_key,
+        }
+
+
+def organizations_from_config(
+    config: Mapping[str, Any], rate_limiter: Optional[RateLimitScheduler] = None
+) -> List[Organization]:
+    """
+    Organizations listed under `organizations`, each with a rate limiter of its own,
+    or else the one of the top-level keys, paced by `rate_limiter`.
+    """
+    organizations = config.get("organizations")
+    if not organizations:
+        if not config.get("api_key") or not config.get("application_key"):
+            raise ValueError(
+                "Either `api_key` and `application_key` or `organizations` must be set."
+            )
+        return [
+            Organization(
+                None, config["api_key"], config["application_key"], rate_limiter
+            )
+        ]
+
+    names = [organization["name"] for organization in organizations]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Organization names must be unique: {names}")
+    return [
+        Organization(
+            organization["name"],
+            organization["api_key"],
+            organization["application_key"],
+            RateLimitScheduler.from_config(config),
+        )
+        for organization in organizations
+    ]
@@ -0,0 +1,74 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import re
+import threading
+from typing import Any, Mapping
+
+PAGE_LIMIT_PARAM = "page[limit]"
+# Largest `page[limit]` accepted by the hourly usage endpoint.
+MAX_PAGE_SIZE = 500
+DEFAULT_MIN_PAGE_SIZE = 50
+DEFAULT_TARGET_SECONDS = 10.0
+DEFAULT_MAX_PAGE_MB = 8
+
+_PAGE_LIMIT_VALUE = re.compile(r"(?<=[?&]page%5Blimit%5D=)\d+")
+
+
+def with_page_limit(url: str, limit: int) -> str:
+    """`url`, as encoded by requests, with its `page[limit]` parameter set to `limit`."""
+    return _PAGE_LIMIT_VALUE.sub(str(limit), url, count=1)
+
+
+class AdaptivePageSize:
+    """
+    Page size that adapts to how the API copes with the pages requested so far.
+
+    The size starts at `maximum`. It is halved, down to `minimum`, after a timeout
+    or a 5xx response, or when a page took longer than `target_seconds` to answer
+    or weighed more than `max_bytes` on the wire. It doubles back towards
+    `maximum` after a page that stayed under half of both budgets.
+    """
+
+    def __init__(
+        self,
+        minimum: int = DEFAULT_MIN_PAGE_SIZE,
+        maximum: int = MAX_PAGE_SIZE,
+        target_seconds: float = DEFAULT_TARGET_SECONDS,
+        max_bytes: int = DEFAULT_MAX_PAGE_MB * 2**20,
+    ):
+        if not 0 < minimum <= maximum:
+            raise ValueError(f"Invalid page size bounds: {minimum}..{maximum}")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.max_bytes = max_bytes
+        self._current = maximum
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "AdaptivePageSize":
+        page_size = config.get("page_size") or {}
+        return cls(
+            minimum=page_size.get("min", DEFAULT_MIN_PAGE_SIZE),
+            maximum=page_size.get("max", MAX_PAGE_SIZE),
+            target_seconds=page_size.get("target_seconds", DEFAULT_TARGET_SECONDS),
+            max_bytes=int(page_size.get("max_page_mb", DEFAULT_MAX_PAGE_MB) * 2**20),
+        )
+
+    @property
+    def current(self) -> int:
+        return self._current
+
+    def observe(self, seconds: float, size_bytes: int) -> None:
+        if seconds > self.target_seconds or size_bytes > self.max_bytes:
+            self.shrink()
+        elif seconds < self.target_seconds / 2 and size_bytes < self.max_bytes / 2:
+            with self._lock:
+                self._current = min(self._current * 2, self.maximum)
+
+    def shrink(self) -> None:
+        with self._lock:
+            self._current = max(self._current // 2, self.minimum)
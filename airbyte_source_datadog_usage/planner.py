@@ -0,0 +1,431 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import argparse
+import copy
+import json
+import math
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from airbyte_cdk.sources.connector_state_manager import ConnectorStateManager
+
+from .decoding import response_json
+from .source import HOUR_FORMAT, HourlyUsageByProductStream, SourceDatadogUsage
+
+# Round trip of a page, when it is neither given nor calibrated.
+DEFAULT_LATENCY_SECONDS = 1.0
+DEFAULT_RATE_LIMIT_PERIOD = 60.0
+# `max_concurrency` values the runtime is estimated for, besides the configured one.
+CONCURRENCY_LEVELS = (1, 2, 4, 8, 16)
+
+
+class SlicePlan:
+    """
+    The requests one slice is expected to take, and the hourly usage records it
+    would fetch when they can be estimated. `calibrated` plans are extrapolated
+    from the first page of the slice rather than from its size.
+    """
+
+    def __init__(
+        self,
+        stream_slice: Mapping[str, Any],
+        requests: int,
+        records: Optional[int] = None,
+        calibrated: bool = False,
+    ):
+        self.stream_slice = stream_slice
+        self.requests = requests
+        self.records = records
+        self.calibrated = calibrated
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "slice": dict(self.stream_slice),
+            "requests": self.requests,
+            "records": self.records,
+            "calibrated": self.calibrated,
+        }
+
+
+class StreamPlan:
+    """
+    The slices of one stream, fetched like `DatadogUsageStream._prefetch_slices`
+    does: `max_concurrency` at a time per organization when slices are
+    partitioned by organization, each of which has its own rate-limit budget.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        slices: List[SlicePlan],
+        product_families: Optional[List[str]] = None,
+        organizations: int = 1,
+        reserve: int = 0,
+        rate_limit: Optional[Tuple[float, float]] = None,
+    ):
+        self.name = name
+        self.slices = slices
+        self.product_families = product_families
+        self.organizations = organizations
+        self.reserve = reserve
+        # Requests per window and window length, from the calibration responses.
+        self.rate_limit = rate_limit
+
+    @property
+    def requests(self) -> int:
+        return sum(slice_plan.requests for slice_plan in self.slices)
+
+    @property
+    def records(self) -> Optional[int]:
+        if any(slice_plan.records is None for slice_plan in self.slices):
+            return None
+        return sum(slice_plan.records for slice_plan in self.slices)
+
+    def runtime(
+        self,
+        latency: float,
+        max_concurrency: int,
+        rate_limit: Optional[Tuple[float, float]] = None,
+    ) -> float:
+        """
+        Seconds to fetch every slice: the longest of the time the requests take
+        `max_concurrency` at a time, one page after the other within a slice, and
+        of the rate-limit windows the busiest budget has to wait for.
+        """
+        if not self.slices:
+            return 0.0
+        workers = min(max(1, max_concurrency * self.organizations), len(self.slices))
+        longest_slice = max(slice_plan.requests for slice_plan in self.slices)
+        seconds = max(self.requests * latency / workers, longest_slice * latency)
+
+        rate_limit = rate_limit or self.rate_limit
+        if rate_limit is not None:
+            limit, period = rate_limit
+            budgets = Counter()
+            for slice_plan in self.slices:
+                budgets[slice_plan.stream_slice.get("org")] += slice_plan.requests
+            # `reserve` tokens of every window are left unused.
+            per_window = max(limit - self.reserve, 1)
+            windows = max(
+                math.ceil(requests / per_window) for requests in budgets.values()
+            )
+            seconds = max(seconds, (windows - 1) * period)
+        return seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "product_families": self.product_families,
+            "requests": self.requests,
+            "records": self.records,
+            "slices": [slice_plan.to_dict() for slice_plan in self.slices],
+        }
+
+
+class SyncPlan:
+    """The streams of a sync, and the latencies measured while calibrating them."""
+
+    def __init__(
+        self,
+        streams: List[StreamPlan],
+        max_concurrency: int,
+        latencies: Optional[List[float]] = None,
+    ):
+        self.streams = streams
+        self.max_concurrency = max_concurrency
+        self.latencies = latencies or []
+
+    def estimate(
+        self,
+        latency: Optional[float] = None,
+        rate_limit: Optional[int] = None,
+        rate_limit_period: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Runtime of the sync at the configured `max_concurrency` and at each of
+        `CONCURRENCY_LEVELS`. Streams are read one after the other.
+
+        `latency` and `rate_limit` override what calibration measured; without
+        either, a request takes `DEFAULT_LATENCY_SECONDS` and the rate limit is
+        left out.
+        """
+        if latency is not None:
+            latency_source = "given"
+        elif self.latencies:
+            latency = sum(self.latencies) / len(self.latencies)
+            latency_source = "calibrated"
+        else:
+            latency = DEFAULT_LATENCY_SECONDS
+            latency_source = "assumed"
+        given_rate_limit = None
+        if rate_limit is not None:
+            given_rate_limit = (
+                rate_limit,
+                rate_limit_period or DEFAULT_RATE_LIMIT_PERIOD,
+            )
+        levels = sorted({*CONCURRENCY_LEVELS, self.max_concurrency})
+        return {
+            "latency_seconds": latency,
+            "latency_source": latency_source,
+            "rate_limits": {
+                stream.name: _rate_limit_dict(given_rate_limit or stream.rate_limit)
+                for stream in self.streams
+            },
+            "max_concurrency": self.max_concurrency,
+            "runtime_seconds": {
+                level: sum(
+                    stream.runtime(latency, level, given_rate_limit)
+                    for stream in self.streams
+                )
+                for level in levels
+            },
+        }
+
+    def to_dict(self, **assumptions) -> Dict[str, Any]:
+        return {
+            "streams": [stream.to_dict() for stream in self.streams],
+            "requests": sum(stream.requests for stream in self.streams),
+            **self.estimate(**assumptions),
+        }
+
+    def to_text(self, **assumptions) -> str:
+        lines = []
+        for stream in self.streams:
+            records = "" if stream.records is None else f", ~{stream.records:,} records"
+            lines.append(
+                f"{stream.name}: {len(stream.slices)} slices, "
+                f"~{stream.requests:,} requests{records}"
+            )
+            if stream.product_families is not None:
+                lines.append(
+                    f"  product families: {', '.join(stream.product_families)}"
+                )
+            for slice_plan in stream.slices:
+                line = (
+                    f"  {_format_slice(slice_plan.stream_slice):<48}"
+                    f" {slice_plan.requests:>6,} requests"
+                )
+                if slice_plan.records is not None:
+                    line += f" {slice_plan.records:>9,} records"
+                if slice_plan.calibrated:
+                    line += " (calibrated)"
+                lines.append(line)
+
+        estimate = self.estimate(**assumptions)
+        lines.append(
+            f"Latency: {estimate['latency_seconds']:.2f}s per request "
+            f"({estimate['latency_source']})"
+        )
+        for name, rate_limit in estimate["rate_limits"].items():
+            if rate_limit is None:
+                described = "unknown, not accounted for"
+            else:
+                described = (
+                    f"{rate_limit['limit']:g} requests per {rate_limit['period']:g}s"
+                )
+            lines.append(f"Rate limit of {name}: {described}")
+        lines.append("Estimated runtime:")
+        for level, seconds in estimate["runtime_seconds"].items():
+            configured = " (configured)" if level == self.max_concurrency else ""
+            lines.append(
+                f"  max_concurrency {level:>3}: {_format_duration(seconds)}{configured}"
+            )
+        return "\n".join(lines)
+
+
+def plan_sync(
+    source: SourceDatadogUsage,
+    config: Mapping[str, Any],
+    state: Any = None,
+    stream_names: Optional[Sequence[str]] = None,
+    calibrate: bool = False,
+) -> SyncPlan:
+    """
+    Plans a sync of `stream_names`, or of every stream, from `state`. Nothing is
+    fetched unless `calibrate` is set, in which case the first page of every
+    hourly usage slice is requested to measure its records, latency and the rate
+    limit of the endpoint.
+    """
+    streams = [
+        stream
+        for stream in source.streams(config)
+        if stream_names is None or stream.name in stream_names
+    ]
+    state_manager = ConnectorStateManager(
+        {stream.name: stream for stream in streams}, state
+    )
+    all_product_families = len(source._all_product_families())
+
+    plans = []
+    latencies = []
+    for stream in streams:
+        # Planning prunes the state as a sync would; the input is left as it is.
+        stream_state = copy.deepcopy(
+            state_manager.get_stream_state(stream.name, stream.namespace)
+        )
+        slices = stream._slices(stream_state)
+        rate_limit = None
+        product_families = None
+        if isinstance(stream, HourlyUsageByProductStream):
+            product_families = stream.product_families
+            if "all" in product_families:
+                product_families = source._all_product_families()
+        slice_plans = []
+        for stream_slice in slices:
+            if not isinstance(stream, HourlyUsageByProductStream):
+                slice_plans.append(SlicePlan(stream_slice, requests=1))
+            elif calibrate:
+                slice_plan, latency, headers = _calibrated_slice(
+                    stream, stream_slice, stream_state
+                )
+                slice_plans.append(slice_plan)
+                latencies.append(latency)
+                rate_limit = _rate_limit(headers) or rate_limit
+            else:
+                slice_plans.append(
+                    _estimated_slice(stream, stream_slice, all_product_families)
+                )
+        plans.append(
+            StreamPlan(
+                stream.name,
+                slice_plans,
+                product_families=product_families,
+                organizations=len(stream.organizations) if stream.partitioned else 1,
+                reserve=stream.rate_limiter.reserve,
+                rate_limit=rate_limit,
+            )
+        )
+    max_concurrency = config.get("max_concurrency", 1)
+    return SyncPlan(plans, max_concurrency, latencies)
+
+
+def _slice_hours(stream_slice: Mapping[str, Any]) -> int:
+    start, end = (
+        datetime.strptime(stream_slice[bound], HOUR_FORMAT)
+        for bound in ("start", "end")
+    )
+    return max(int((end - start) / timedelta(hours=1)), 1)
+
+
+def _estimated_slice(
+    stream: HourlyUsageByProductStream,
+    stream_slice: Mapping[str, Any],
+    all_product_families: int,
+) -> SlicePlan:
+    """
+    At most one record per product family and hour: an upper bound for a single
+    organization, whose quiet product families have fewer.
+    """
+    product_families = stream._product_families_filter(stream_slice).split(",")
+    families = (
+        all_product_families if "all" in product_families else len(product_families)
+    )
+    records = _slice_hours(stream_slice) * families
+    requests = max(math.ceil(records / stream.adaptive_page_size.current), 1)
+    return SlicePlan(stream_slice, requests, records)
+
+
+def _calibrated_slice(
+    stream: HourlyUsageByProductStream,
+    stream_slice: Mapping[str, Any],
+    stream_state: Mapping[str, Any],
+) -> Tuple[SlicePlan, float, Mapping[str, Any]]:
+    _, response = stream._fetch_next_page(stream_slice, stream_state)
+    data = response_json(response).get("data") or []
+    latency = response.elapsed.total_seconds()
+    if not data or not stream.next_page_token(response):
+        return SlicePlan(stream_slice, 1, len(data), True), latency, response.headers
+
+    # Pages are in timestamp order: the hours the first page covered tell how
+    # many records the whole slice holds.
+    start = datetime.strptime(stream_slice["start"], HOUR_FORMAT)
+    last_hour = max(record["attributes"]["timestamp"][:13] for record in data)
+    covered = (datetime.strptime(last_hour, HOUR_FORMAT) - start) / timedelta(hours=1)
+    records = math.ceil(len(data) * _slice_hours(stream_slice) / max(covered + 1, 1))
+    requests = max(math.ceil(records / len(data)), 2)
+    return SlicePlan(stream_slice, requests, records, True), latency, response.headers
+
+
+def _rate_limit(headers: Mapping[str, Any]) -> Optional[Tuple[float, float]]:
+    try:
+        limit = float(headers["X-RateLimit-Limit"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    try:
+        period = float(headers["X-RateLimit-Period"])
+    except (KeyError, TypeError, ValueError):
+        period = DEFAULT_RATE_LIMIT_PERIOD
+    return limit, period
+
+
+def _rate_limit_dict(
+    rate_limit: Optional[Tuple[float, float]]
+) -> Optional[Dict[str, float]]:
+    if rate_limit is None:
+        return None
+    return {"limit": rate_limit[0], "period": rate_limit[1]}
+
+
+def _format_slice(stream_slice: Mapping[str, Any]) -> str:
+    return " ".join(f"{key}={value}" for key, value in stream_slice.items())
+
+
+def _format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{seconds:02d}s"
+    return f"{seconds}s"
+
+
+def main(args: Sequence[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="plan",
+        description=(
+            "Lists the slices and requests a sync would make from a config and a "
+            "state, and estimates its runtime, without reading any records."
+        ),
+    )
+    parser.add_argument("--config", required=True)
+    parser.add_argument("--state")
+    parser.add_argument("--catalog", help="only plan the streams of this catalog")
+    parser.add_argument(
+        "--calibrate",
+        action="store_true",
+        help="request the first page of every hourly usage slice to measure "
+        "its records, the latency and the rate limit",
+    )
+    parser.add_argument("--latency", type=float, help="seconds per request")
+    parser.add_argument(
+        "--rate-limit", type=int, help="requests allowed per rate-limit window"
+    )
+    parser.add_argument(
+        "--rate-limit-period", type=float, help="length of a rate-limit window (s)"
+    )
+    parser.add_argument("--format", choices=("text", "json"), default="text")
+    parsed_args = parser.parse_args(args)
+
+    source = SourceDatadogUsage()
+    config = source.read_config(parsed_args.config)
+    state = source.read_state(parsed_args.state) if parsed_args.state else None
+    stream_names = None
+    if parsed_args.catalog:
+        catalog = source.read_catalog(parsed_args.catalog)
+        stream_names = [stream.stream.name for stream in catalog.streams]
+
+    plan = plan_sync(source, config, state, stream_names, parsed_args.calibrate)
+    assumptions = {
+        "latency": parsed_args.latency,
+        "rate_limit": parsed_args.rate_limit,
+        "rate_limit_period": parsed_args.rate_limit_period,
+    }
+    if parsed_args.format == "json":
+        print(json.dumps(plan.to_dict(**assumptions), indent=2))
+    else:
+        print(plan.to_text(**assumptions))
@@ -0,0 +1,58 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+CPROFILE = "cprofile"
+PYINSTRUMENT = "pyinstrument"
+
+
+@contextmanager
+def profiling(path: Optional[str], profiler: str = CPROFILE) -> Iterator[None]:
+    """
+    Profiles the calling thread while the block runs and writes the result to `path`.
+
+    `cprofile` writes a `pstats` dump (e.g. for `snakeviz`); `pyinstrument` writes
+    an HTML report when `path` ends with `.html` and a text call tree otherwise.
+    Nothing is profiled when `path` is empty.
+    """
+    if not path:
+        yield
+        return
+
+    if profiler == PYINSTRUMENT:
+        try:
+            from pyinstrument import Profiler
+        except ImportError as error:
+            raise ImportError(
+                "The pyinstrument profiler requires pyinstrument; install the `profiling` extra."
+            ) from error
+
+        sampler = Profiler()
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            output = (
+                sampler.output_html()
+                if path.endswith(".html")
+                else sampler.output_text()
+            )
+            with open(path, "w") as report:
+                report.write(output)
+    elif profiler == CPROFILE:
+        import cProfile
+
+        tracer = cProfile.Profile()
+        tracer.enable()
+        try:
+            yield
+        finally:
+            tracer.disable()
+            tracer.dump_stats(path)
+    else:
+        raise ValueError(f"Unknown profiler: {profiler}")
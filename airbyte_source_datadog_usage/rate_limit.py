@@ -0,0 +1,150 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Mapping, Optional
+
+ADAPTIVE = "adaptive"
+BURST = "burst"
+
+
+def _header_number(headers: Mapping[str, Any], name: str) -> Optional[float]:
+    value = headers.get(name)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimitScheduler:
+    """
+    Token bucket shared by every stream of a source.
+
+    The bucket level is re-synchronized from Datadog's `X-RateLimit-*` response
+    headers after each response and decremented locally for every request that is
+    sent, so concurrent callers cannot overdraw it. Requests go out immediately
+    while the budget is healthy. In `adaptive` mode, once the remaining budget
+    falls under `low_watermark` (a fraction of the limit) the remaining tokens are
+    spread evenly over the time left in the window, and when only `reserve`
+    tokens are left callers wait for the window to reset. `burst` mode skips the
+    pacing and only waits once the budget is exhausted.
+    """
+
+    def __init__(
+        self,
+        mode: str = ADAPTIVE,
+        low_watermark: float = 0.2,
+        reserve: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        if mode not in (ADAPTIVE, BURST):
+            raise ValueError(f"Unknown rate limit mode: {mode}")
+        self.mode = mode
+        self.low_watermark = low_watermark if mode == ADAPTIVE else 0.0
+        self.reserve = reserve if mode == ADAPTIVE else 0
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._limit: Optional[float] = None
+        self._period: Optional[float] = None
+        self._tokens: Optional[float] = None
+        self._reset_at: Optional[float] = None
+        self._next_slot = 0.0
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> "RateLimitScheduler":
+        rate_limit = config.get("rate_limit") or {}
+        return cls(
+            mode=rate_limit.get("mode", ADAPTIVE),
+            low_watermark=rate_limit.get("low_watermark", 0.2),
+            reserve=rate_limit.get("reserve", 1),
+        )
+
+    @property
+    def remaining(self) -> Optional[float]:
+        return self._tokens
+
+    def acquire(self) -> float:
+        """Blocks until a request may be sent and returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                delay = self._reserve_token()
+            if delay <= 0:
+                return waited
+            self._sleep(delay)
+            waited += delay
+
+    async def acquire_async(self) -> float:
+        """Same as `acquire`, but waits without blocking the event loop."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                delay = self._reserve_token()
+            if delay <= 0:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def update(self, headers: Mapping[str, Any]) -> None:
+        limit = _header_number(headers, "X-RateLimit-Limit")
+        remaining = _header_number(headers, "X-RateLimit-Remaining")
+        reset = _header_number(headers, "X-RateLimit-Reset")
+        period = _header_number(headers, "X-RateLimit-Period")
+        if remaining is None:
+            return
+
+        with self._lock:
+            now = self._clock()
+            self._limit = limit if limit is not None else self._limit
+            self._period = period if period is not None else self._period
+            reset_at = now + reset if reset is not None else self._reset_at
+            if (
+                self._reset_at is not None
+                and reset_at is not None
+                and reset_at > self._reset_at + 1
+            ):
+                # A response from the new window: start from its budget.
+                self._tokens = remaining
+            elif self._tokens is None or remaining < self._tokens:
+                # Other requests may still be in flight; never hand back tokens
+                # they have already taken within the same window.
+                self._tokens = remaining
+            self._reset_at = reset_at
+
+    def _reserve_token(self) -> float:
+        now = self._clock()
+        if self._tokens is None:
+            # Nothing known about the budget until the first response arrives.
+            return 0.0
+
+        if self._reset_at is not None and now >= self._reset_at:
+            self._tokens = self._limit if self._limit is not None else self._tokens + 1
+            self._reset_at = now + self._period if self._period else None
+
+        if self._tokens <= self.reserve:
+            if self._reset_at is None:
+                # No reset information: refill one token so a stale budget never blocks forever.
+                self._tokens += 1
+                return 0.0
+            return self._reset_at - now
+
+        if (
+            self._limit
+            and self._reset_at is not None
+            and self._tokens <= self._limit * self.low_watermark
+        ):
+            if now < self._next_slot:
+                return self._next_slot - now
+            spendable = self._tokens - self.reserve
+            self._next_slot = now + (self._reset_at - now) / spendable
+
+        self._tokens -= 1
+        return 0.0
@@ -0,0 +1,141 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Callable, Mapping, Optional
+
+import requests
+from urllib3.response import HTTPResponse
+
+CACHE_FILE = "responses.sqlite3"
+CACHE_HEADER = "X-Datadog-Usage-Cache"
+DEFAULT_MAX_SIZE_MB = 1024
+DEFAULT_FRESHNESS_HOURS = 72
+
+
+class ResponseCache:
+    """
+    On-disk cache of response bodies that can no longer change, shared by every
+    stream of a source.
+
+    Bodies are stored zlib-compressed in a SQLite database under `directory`,
+    keyed by the request URL (endpoint, time window, product families and page
+    token) and the API key it was sent with, so organizations never share
+    entries. Once the compressed size exceeds `max_size_bytes`, the least
+    recently used entries are evicted. The first page of a chain is always read
+    before the next ones, so it is evicted first, and a chain is never served from
+    the cache after its first page has been fetched again with a new page token.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_size_bytes: int = DEFAULT_MAX_SIZE_MB * 2**20,
+        freshness_hours: int = DEFAULT_FRESHNESS_HOURS,
+        clock: Callable[[], float] = time.time,
+    ):
+        os.makedirs(directory, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.freshness_hours = freshness_hours
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            os.path.join(directory, CACHE_FILE), check_same_thread=False
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, body BLOB NOT NULL,"
+            " size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)"
+        )
+        self._size = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config: Mapping[str, Any]) -> Optional["ResponseCache"]:
+        response_cache = config.get("response_cache") or {}
+        if not response_cache.get("path"):
+            return None
+        return cls(
+            response_cache["path"],
+            max_size_bytes=response_cache.get("max_size_mb", DEFAULT_MAX_SIZE_MB)
+            * 2**20,
+            freshness_hours=response_cache.get(
+                "freshness_hours", DEFAULT_FRESHNESS_HOURS
+            ),
+        )
+
+    @staticmethod
+    def key(url: str, api_key: str) -> str:
+        return hashlib.blake2b(f"{api_key}\n{url}".encode()).hexdigest()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT body FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "UPDATE responses SET accessed = ? WHERE key = ?", (self._clock(), key)
+            )
+            self._connection.commit()
+        return zlib.decompress(row[0])
+
+    def put(self, key: str, body: bytes) -> None:
+        compressed = zlib.compress(body)
+        with self._lock:
+            previous = self._connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, body, size, accessed)"
+                " VALUES (?, ?, ?, ?)",
+                (key, compressed, len(compressed), self._clock()),
+            )
+            self._size += len(compressed) - (previous[0] if previous else 0)
+            self._evict()
+            self._connection.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _evict(self) -> None:
+        while self._size > self.max_size_bytes:
+            row = self._connection.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return
+            self._connection.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._size -= row[1]
+
+
+def cached_response(
+    request: requests.PreparedRequest, body: bytes, cache_status: str = "hit"
+) -> requests.Response:
+    """Wraps a cached body in a response that reads like a live one, streamed or not."""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = request.url
+    response.request = request
+    response.headers["Content-Type"] = "application/json"
+    response.headers[CACHE_HEADER] = cache_status
+    response.raw = HTTPResponse(body=io.BytesIO(body), preload_content=False)
+    return response
@@ -0,0 +1,75 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, Mapping, Tuple
+
+HOUR = "hour"
+DAY = "day"
+MONTH = "month"
+ROLLUPS = {HOUR, DAY, MONTH}
+
+# Fields that identify a row of a window rather than being summed.
+KEY_FIELDS = ("product_family", "org_name", "usage_type", "type")
+
+
+def rollup_window(timestamp: str, window: str) -> str:
+    """
+    Start of the day or month of `timestamp`, in its own format: either an hour
+    (`YYYY-MM-DDThh`) or a full ISO 8601 timestamp.
+    """
+    if window == DAY:
+        return f"{timestamp[:11]}00{timestamp[13:]}"
+    return f"{timestamp[:8]}01T00{timestamp[13:]}"
+
+
+def next_rollup_window(start: datetime, window: str) -> datetime:
+    """Start of the day or month that follows the one `start` is in."""
+    if window == DAY:
+        return start.replace(hour=0) + timedelta(days=1)
+    years, month_index = divmod(start.month, 12)
+    return start.replace(year=start.year + years, month=month_index + 1, day=1, hour=0)
+
+
+def rolled_up(
+    records: Iterable[Mapping[str, Any]], window: str
+) -> Iterator[Dict[str, Any]]:
+    """
+    Sums hourly usage `records` per day or month, product family, organization
+    and usage type, in any output format: nested `measurements` are summed per
+    usage type, and every other field that is not part of the key is summed as is.
+
+    Rows are emitted once `records` is exhausted, timestamped with the start of
+    their window. Only the running totals are held, so memory is bounded by the
+    number of rows of the windows `records` spans rather than by its length.
+    """
+    rows: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    for record in records:
+        timestamp = rollup_window(record["timestamp"], window)
+        key = (timestamp, *[record.get(field) for field in KEY_FIELDS])
+        row = rows.get(key)
+        if row is None:
+            rows[key] = row = {"timestamp": timestamp}
+            for field in KEY_FIELDS:
+                if field in record:
+                    row[field] = record[field]
+        for field, value in record.items():
+            if field == "measurements":
+                totals = row.setdefault(field, {})
+                for measurement in value:
+                    usage_type = measurement["usage_type"]
+                    totals[usage_type] = (
+                        totals.get(usage_type, 0) + measurement["value"]
+                    )
+            elif field != "timestamp" and field not in KEY_FIELDS:
+                row[field] = row.get(field, 0) + value
+
+    for row in rows.values():
+        if "measurements" in row:
+            row["measurements"] = [
+                {"usage_type": usage_type, "value": value}
+                for usage_type, value in row["measurements"].items()
+            ]
+        yield row
@@ -3,13 +3,46 @@
 #
 
 
+import json
 import sys
+from importlib import resources
 
-from airbyte_cdk.entrypoint import launch
+SPEC_FILE = "spec.yaml"
 
-from .source import SourceDatadogUsage
+
+def spec_message() -> str:
+    """
+    The SPEC message the CDK entrypoint prints for `spec.yaml`, built without
+    importing the CDK: the file is loaded the same way and serialized with the
+    same key order and separators.
+    """
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    spec = yaml.load(
+        resources.files(__package__).joinpath(SPEC_FILE).read_text(), Loader=loader
+    )
+    return json.dumps({"type": "SPEC", "spec": spec})
 
 
 def run():
-    source = SourceDatadogUsage()
-    launch(source, sys.argv[1:])
+    args = sys.argv[1:]
+    if args == ["spec"]:
+        # Only `spec.yaml` is needed: skip the CDK, requests and the streams.
+        print(f"{spec_message()}\n", end="", flush=True)
+        return
+    if args[:1] == ["plan"]:
+        from .planner import main as plan
+
+        plan(args[1:])
+        return
+
+    from .output import DatadogUsageEntrypoint, MessageWriter
+    from .source import SourceDatadogUsage
+
+    # As `airbyte_cdk.entrypoint.launch`, with records written in large chunks.
+    entrypoint = DatadogUsageEntrypoint(SourceDatadogUsage())
+    parsed_args = entrypoint.parse_args(args)
+    with MessageWriter(sys.stdout.buffer) as writer:
+        for message in entrypoint.run(parsed_args):
+            writer.write(message)
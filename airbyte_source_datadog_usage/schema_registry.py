@@ -0,0 +1,82 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+
+import json
+from functools import lru_cache
+from importlib import resources
+from typing import Any, Dict, Iterable, List, Tuple
+
+SCHEMAS_DIRECTORY = "schemas"
+USAGE_TYPES_FILE = "usage_types.json"
+WIDE_BASE_SCHEMA = "hourly_usage_by_products"
+
+
+def _load_schemas() -> Dict[str, Dict[str, Any]]:
+    directory = resources.files(__package__).joinpath(SCHEMAS_DIRECTORY)
+    return {
+        entry.name[: -len(".json")]: json.loads(entry.read_text())
+        for entry in directory.iterdir()
+        if entry.name.endswith(".json")
+    }
+
+
+# Every schema shipped under `schemas/` is read and decoded once, at import time.
+_SCHEMAS = _load_schemas()
+# The usage types Datadog reports for each product family, i.e. the wide columns.
+_USAGE_TYPES: Dict[str, List[str]] = json.loads(
+    resources.files(__package__).joinpath(USAGE_TYPES_FILE).read_text()
+)
+
+
+def get_schema(name: str) -> Dict[str, Any]:
+    """
+    Returns the JSON schema stored as `schemas/<name>.json`.
+
+    The same object is returned on every call, so callers must not mutate it.
+    """
+    try:
+        return _SCHEMAS[name]
+    except KeyError:
+        raise KeyError(
+            f"No JSON schema named {name!r} in {SCHEMAS_DIRECTORY}/"
+        ) from None
+
+
+def usage_types(product_families: Iterable[str]) -> List[str]:
+    """Returns the sorted usage types of `product_families`, `all` meaning every family."""
+    product_families = set(product_families)
+    if "all" in product_families:
+        product_families = set(_USAGE_TYPES)
+    return sorted(
+        {
+            usage_type
+            for product_family in product_families
+            for usage_type in _USAGE_TYPES.get(product_family, ())
+        }
+    )
+
+
+@lru_cache(maxsize=None)
+def get_wide_schema(product_families: Tuple[str, ...]) -> Dict[str, Any]:
+    """
+    Returns the schema of wide hourly usage records of `product_families`: the
+    nested schema with one nullable column per usage type in place of
+    `measurements`.
+
+    Built once per set of families and then reused, so callers must not mutate it.
+    Usage types missing from `usage_types.json` are still emitted as extra columns.
+    """
+    base = get_schema(WIDE_BASE_SCHEMA)
+    properties = {
+        name: value
+        for name, value in base["properties"].items()
+        if name != "measurements"
+    }
+    for usage_type in usage_types(product_families):
+        properties[usage_type] = {
+            "type": ["null", "integer"],
+            "description": f"The hourly value of the `{usage_type}` usage metric",
+        }
+    return {**base, "properties": properties, "additionalProperties": True}
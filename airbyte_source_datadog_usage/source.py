@@ -3,21 +3,270 @@
 #
 
 
+import hashlib
 import json
-import time
+import logging
+import sys
 from abc import ABC, abstractmethod
-from datetime import datetime
-from pathlib import Path
-from typing import Any, Dict, Iterable, List, Mapping, MutableMapping, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import parse_qs, urlsplit
 
 import requests
+from airbyte_cdk.models import (
+    AirbyteMessage,
+    AirbyteStateMessage,
+    ConfiguredAirbyteCatalog,
+    SyncMode,
+)
 from airbyte_cdk.sources import AbstractSource
 from airbyte_cdk.sources.streams import Stream
+from airbyte_cdk.sources.streams.core import StreamData
 from airbyte_cdk.sources.streams.http import HttpStream
+from airbyte_cdk.sources.streams.http.availability_strategy import (
+    HttpAvailabilityStrategy,
+)
+
+from .checkpointing import CheckpointPolicy
+from .concurrency import SliceFetcher, prefetched
+from .decoding import response_json, stream_items
+from .http_session import (
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    build_session,
+    timeouts,
+)
+from .metrics import StreamMetrics, body_size, format_metrics, trace_message
+from .organizations import Organization, organizations_from_config
+from .output import RecordEnvelope
+from .page_size import PAGE_LIMIT_PARAM, AdaptivePageSize, with_page_limit
+from .profiling import CPROFILE, profiling
+from .rate_limit import RateLimitScheduler
+from .response_cache import CACHE_HEADER, ResponseCache, cached_response
+from .rollup import HOUR, ROLLUPS, next_rollup_window, rolled_up, rollup_window
+from .schema_registry import get_schema, get_wide_schema
+
+HOUR_FORMAT = "%Y-%m-%dT%H"
+EXPIRY_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+MONTH_FORMAT = "%Y-%m"
+SLICE_WINDOWS = {"day": timedelta(days=1), "week": timedelta(weeks=1)}
+NESTED = "nested"
+FLAT = "flat"
+WIDE = "wide"
+# Days after the end of a month during which Datadog may still revise its estimated cost.
+DEFAULT_COST_SETTLING_DAYS = 3
+HOURLY_USAGE_SCHEMAS = {
+    NESTED: "hourly_usage_by_products",
+    FLAT: "hourly_usage_by_products_flat",
+}
+OUTPUT_FORMATS = {NESTED, FLAT, WIDE}
+
+
+def _next_month(month: str) -> str:
+    year, month_index = divmod(int(month[:4]) * 12 + int(month[5:7]), 12)
+    return f"{year:04d}-{month_index + 1:02d}"
+
+
+def _compact_measurements(measurements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drops measurements without a value. The decoded measurement dicts are reused
+    rather than copied when they hold nothing but `usage_type` and `value`.
+    """
+    return [
+        (
+            measurement
+            if len(measurement) == 2
+            else {
+                "usage_type": measurement["usage_type"],
+                "value": measurement["value"],
+            }
+        )
+        for measurement in measurements
+        if measurement["value"] is not None
+    ]
 
 
 # Basic full refresh stream
 class DatadogUsageStream(HttpStream, ABC):
+    # Not `page_size`, which the CDK reserves for a fixed int.
+    adaptive_page_size: Optional[AdaptivePageSize] = None
+    # Whether to checkpoint after the record `read_records` yielded last.
+    _checkpoint_due = False
+
+    def __init__(
+        self,
+        rate_limiter: Optional[RateLimitScheduler] = None,
+        max_concurrency: int = 1,
+        session: Optional[requests.Session] = None,
+        timeout: Optional[Tuple[float, float]] = None,
+        read_engine: str = "sync",
+        http2: bool = False,
+        url_base: Optional[str] = None,
+        response_cache: Optional[ResponseCache] = None,
+        prefetch_pages: int = 0,
+        organizations: Optional[List[Organization]] = None,
+        checkpoint_policy: Optional[CheckpointPolicy] = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        if session is not None:
+            self._session = session
+        self._url_base = url_base
+        self.response_cache = response_cache
+        self.prefetch_pages = prefetch_pages
+        self.checkpoint_policy = checkpoint_policy or CheckpointPolicy()
+        self.rate_limiter = rate_limiter or RateLimitScheduler()
+        self.organizations = organizations or []
+        self._organizations = {
+            organization.name: organization for organization in self.organizations
+        }
+        # Organizations without a rate limiter of their own share `rate_limiter`.
+        self._rate_limiters = {
+            organization.api_key: organization.rate_limiter
+            for organization in self.organizations
+            if organization.rate_limiter is not None
+        }
+        self._reading_org: Optional[str] = None
+        self.max_concurrency = max_concurrency
+        self.read_engine = read_engine
+        # The async engine has a client of its own; `session` carries HTTP/2 otherwise.
+        self.http2 = http2
+        self.timeout = timeout or (DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)
+        self._slice_fetcher: Optional[SliceFetcher] = None
+        self.metrics = StreamMetrics()
+        self.record_envelope = RecordEnvelope(self.name, self.namespace)
+
+    @property
+    def partitioned(self) -> bool:
+        """Whether slices and state are partitioned by organization."""
+        return any(organization.name is not None for organization in self.organizations)
+
+    def _organization(self, stream_slice: Optional[Mapping[str, Any]]) -> Organization:
+        return self._organizations.get(
+            (stream_slice or {}).get("org"), self.organizations[0]
+        )
+
+    def _rate_limiter(self, headers: Mapping[str, Any]) -> RateLimitScheduler:
+        return self._rate_limiters.get(headers.get("DD-API-KEY"), self.rate_limiter)
+
+    @staticmethod
+    def _org_state(
+        stream_state: MutableMapping[str, Any], org: Optional[str]
+    ) -> MutableMapping[str, Any]:
+        if org is None:
+            return stream_state
+        return stream_state.setdefault("orgs", {}).setdefault(org, {})
+
+    def _organization_slices(
+        self,
+        stream_state: MutableMapping[str, Any],
+        org_slices: Callable[[MutableMapping[str, Any]], List[Mapping[str, Any]]],
+    ) -> List[Mapping[str, Any]]:
+        """Slices of every organization, built by `org_slices` from its own state."""
+        slices = []
+        for organization in self.organizations:
+            org = organization.name
+            for stream_slice in org_slices(self._org_state(stream_state, org)):
+                slices.append(
+                    stream_slice if org is None else {**stream_slice, "org": org}
+                )
+        return slices
+
+    def _observe_response(self, response: requests.Response, *args, **kwargs):
+        self._rate_limiter(response.request.headers).update(response.headers)
+        history = getattr(getattr(response.raw, "retries", None), "history", ())
+        self.metrics.observe_response(
+            response.status_code, history, retried=self.should_retry(response)
+        )
+        # Timeouts and 5xx that urllib3 already retried count as failures too.
+        if response.status_code >= 500 or any(
+            attempt.error is not None or (attempt.status or 0) >= 500
+            for attempt in history
+        ):
+            self._shrink_page_size()
+
+    def _shrink_page_size(self) -> None:
+        if self.adaptive_page_size is not None:
+            self.adaptive_page_size.shrink()
+            self.metrics.set("page_size", self.adaptive_page_size.current)
+
+    def _observe_page(self, response: requests.Response, size: int) -> None:
+        if self.adaptive_page_size is not None:
+            self.adaptive_page_size.observe(response.elapsed.total_seconds(), size)
+            self.metrics.set("page_size", self.adaptive_page_size.current)
+
+    def _send(
+        self, request: requests.PreparedRequest, request_kwargs: Mapping[str, Any]
+    ) -> requests.Response:
+        # The session may be shared with other streams, so the hook is bound to the request.
+        if self._observe_response not in request.hooks["response"]:
+            request.register_hook("response", self._observe_response)
+        if self.adaptive_page_size is not None:
+            # Retries re-send the prepared request: use the page size as it stands.
+            request.url = with_page_limit(request.url, self.adaptive_page_size.current)
+        rate_limiter = self._rate_limiter(request.headers)
+        self.metrics.add("throttle_wait_seconds", rate_limiter.acquire())
+        self.metrics.add("requests")
+        try:
+            with self.metrics.timer("network_seconds"):
+                return super()._send(request, request_kwargs)
+        except requests.exceptions.Timeout:
+            self._shrink_page_size()
+            raise
+
+    def _send_request(
+        self, request: requests.PreparedRequest, request_kwargs: Mapping[str, Any]
+    ) -> requests.Response:
+        cache = self.response_cache
+        if cache is None or not self._cacheable(request.url):
+            return super()._send_request(request, request_kwargs)
+
+        key = cache.key(request.url, request.headers.get("DD-API-KEY", ""))
+        body = cache.get(key)
+        if body is not None:
+            self.metrics.add("cache_hits")
+            return cached_response(request, body)
+        # Cached pages are read in full once, then replayed like a live response.
+        response = super()._send_request(request, {**request_kwargs, "stream": False})
+        if response.status_code != 200:
+            return response
+        cache.put(key, response.content)
+        cached = cached_response(request, response.content, cache_status="miss")
+        cached.elapsed = response.elapsed
+        return cached
+
+    def _cacheable(self, url: str) -> bool:
+        """Whether the response to `url` can no longer change and may be cached."""
+        return False
+
+    def request_kwargs(self, **kwargs) -> Mapping[str, Any]:
+        return {"timeout": self.timeout}
+
+    def backoff_time(self, response: requests.Response) -> Optional[float]:
+        if response.status_code == 429:
+            reset = response.headers.get("X-RateLimit-Reset")
+            if reset:
+                return float(reset)
+        return None
+
+    @property
+    def availability_strategy(self) -> Optional[HttpAvailabilityStrategy]:
+        # `check_connection` already validates the keys. Probing every stream would
+        # spend an extra request, and start slice prefetching, on every sync.
+        return None
 
     @property
     def url_base(self) -> str:
@@ -30,7 +279,7 @@ class DatadogUsageStream(HttpStream, ABC):
     def next_page_token(
         self, response: requests.Response
     ) -> Optional[Mapping[str, Any]]:
-        json_response = response.json()
+        json_response = response_json(response)
         next_record_id = (
             json_response.get("meta", {}).get("pagination", {}).get("next_record_id")
         )
@@ -52,10 +301,149 @@ class DatadogUsageStream(HttpStream, ABC):
     ) -> Iterable[Mapping]:
         yield {}
 
+    def read_records(
+        self,
+        sync_mode: SyncMode,
+        cursor_field: Optional[List[str]] = None,
+        stream_slice: Optional[Mapping[str, Any]] = None,
+        stream_state: Optional[Mapping[str, Any]] = None,
+    ) -> Iterable[Mapping[str, Any]]:
+        # Tells `get_updated_state` which organization the records belong to.
+        self._reading_org = (stream_slice or {}).get("org")
+        if self._slice_fetcher and self._slice_fetcher.has(stream_slice):
+            records = self._slice_fetcher.records(stream_slice)
+        else:
+            records = self._read_slice(stream_slice, stream_state)
+        finished = False
+        try:
+            for record in records:
+                # Decided once per record: the CDK may read `state_checkpoint_interval`
+                # any number of times after it.
+                self._checkpoint_due = self.checkpoint_policy.due()
+                yield record
+            finished = True
+        finally:
+            if not finished:
+                # The consumer stopped early: it will not read the slices fetched ahead.
+                self._close_slice_fetcher()
+        # The CDK checkpoints after every slice.
+        self.checkpoint_policy.reset()
+        self._checkpoint_due = False
+        self.logger.info(
+            f"Slice {json.dumps(stream_slice)} metrics: "
+            f"{format_metrics(self.metrics.since_last_report())}"
+        )
+
+    def read(self, *args, **kwargs) -> Iterable[StreamData]:
+        try:
+            yield from super().read(*args, **kwargs)
+        finally:
+            self._close_slice_fetcher()
+        totals = self.metrics.totals()
+        self.logger.info(f"Stream {self.name} metrics: {format_metrics(totals)}")
+        yield trace_message(self.name, totals)
+
+    def _read_slice(
+        self,
+        stream_slice: Optional[Mapping[str, Any]],
+        stream_state: Optional[Mapping[str, Any]],
+    ) -> Iterable[Mapping[str, Any]]:
+        return self._read_pages(self._parse_page, stream_slice, stream_state)
+
+    def _read_pages(
+        self,
+        records_generator_fn: Callable[..., Iterable[StreamData]],
+        stream_slice: Optional[Mapping[str, Any]] = None,
+        stream_state: Optional[Mapping[str, Any]] = None,
+    ) -> Iterable[StreamData]:
+        if self.prefetch_pages <= 0:
+            yield from super()._read_pages(
+                records_generator_fn, stream_slice, stream_state
+            )
+            return
+
+        stream_state = stream_state or {}
+        # The next page is requested as soon as its token is known, while the
+        # records of the previous ones are still being emitted.
+        pages = prefetched(self._pages(stream_slice, stream_state), self.prefetch_pages)
+        for request, response in pages:
+            yield from records_generator_fn(
+                request, response, stream_state, stream_slice
+            )
+
+    def _pages(
+        self, stream_slice: Optional[Mapping[str, Any]], stream_state: Mapping[str, Any]
+    ) -> Iterator[Tuple[requests.PreparedRequest, requests.Response]]:
+        next_page_token = None
+        while True:
+            request, response = self._fetch_next_page(
+                stream_slice, stream_state, next_page_token
+            )
+            yield request, response
+            next_page_token = self.next_page_token(response)
+            if not next_page_token:
+                return
+
+    def _parse_page(
+        self,
+        request: Optional[requests.PreparedRequest],
+        response: requests.Response,
+        stream_state: Mapping[str, Any],
+        stream_slice: Optional[Mapping[str, Any]],
+    ) -> Iterable[Mapping[str, Any]]:
+        yield from self.metrics.parsed(
+            self.parse_response(
+                response, stream_slice=stream_slice, stream_state=stream_state
+            )
+        )
+        # Streamed bodies are only fully read once every record has been parsed.
+        if response.headers.get(CACHE_HEADER) != "hit":
+            size = body_size(response)
+            self.metrics.add("bytes", size)
+            self.checkpoint_policy.add_bytes(size)
+            self._observe_page(response, size)
+
+    def _prefetch_slices(
+        self, slices: List[Mapping[str, Any]], stream_state: Mapping[str, Any]
+    ) -> None:
+        """
+        Starts fetching `slices` ahead of `read_records` when concurrency is enabled.
+
+        Each organization has its own rate-limit budget, so organizations are
+        fetched in parallel, `max_concurrency` slices each.
+        """
+        max_workers = self.max_concurrency
+        if self.partitioned:
+            max_workers *= len(self.organizations)
+        if max_workers <= 1 or len(slices) <= 1:
+            return
+        if self.read_engine == "async":
+            from .async_engine import AsyncSliceFetcher
+
+            self._slice_fetcher = AsyncSliceFetcher(self, stream_state, max_workers)
+        else:
+            fetch = partial(self._fetch_slice, stream_state=stream_state)
+            self._slice_fetcher = SliceFetcher(fetch, max_workers)
+        self._slice_fetcher.schedule(slices)
+
+    def _close_slice_fetcher(self) -> None:
+        """Cancels the slices fetched ahead and stops the threads fetching them."""
+        if self._slice_fetcher is not None:
+            self._slice_fetcher.close()
+            self._slice_fetcher = None
+
+    def _fetch_slice(
+        self, stream_slice: Mapping[str, Any], stream_state: Mapping[str, Any]
+    ) -> List[Mapping[str, Any]]:
+        return list(self._read_slice(stream_slice, stream_state))
+
 
 # Basic incremental stream
 class IncrementalDatadogUsageStream(DatadogUsageStream, ABC):
-    state_checkpoint_interval = 500
+    @property
+    def state_checkpoint_interval(self) -> Optional[int]:
+        # Read by the CDK after every record: 1 checkpoints right away, None waits.
+        return 1 if self._checkpoint_due else None
 
     @property
     def cursor_field(self) -> str:
@@ -74,41 +462,89 @@ class IncrementalDatadogUsageStream(DatadogUsageStream, ABC):
         current_stream_state: MutableMapping[str, Any],
         latest_record: Mapping[str, Any],
     ) -> Mapping[str, Any]:
+        # The CDK passes the state the sync started from to every call: the cursor
+        # is advanced in place and nothing is allocated while it does not move.
         latest_timestamp = latest_record.get(self.cursor_field)
-        current_timestamp = current_stream_state.get(self.cursor_field)
-
-        if current_timestamp and latest_timestamp:
-            return {self.cursor_field: max(latest_timestamp, current_timestamp)}
-        return {self.cursor_field: latest_timestamp or current_timestamp}
+        if latest_timestamp and latest_timestamp > current_stream_state.get(
+            self.cursor_field, ""
+        ):
+            current_stream_state[self.cursor_field] = latest_timestamp
+        return current_stream_state
 
 
 class HourlyUsageByProductStream(IncrementalDatadogUsageStream):
-    primary_key = ["timestamp", "product_family"]
-
     def __init__(
         self,
-        api_key: str,
-        application_key: str,
+        api_key: Optional[str],
+        application_key: Optional[str],
         site: str,
         product_families: List[str],
         start_date: str,
+        slice_window: str = "day",
+        fan_out_product_families: bool = False,
+        streaming_parse: bool = False,
+        settling_hours: int = 0,
+        output_format: str = NESTED,
+        adaptive_page_size: Optional[AdaptivePageSize] = None,
+        resume_pagination_minutes: int = 0,
+        rollup: str = HOUR,
+        organizations: Optional[List[Organization]] = None,
+        **kwargs,
     ):
-        super().__init__()
-        self.api_key = api_key
-        self.application_key = application_key
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        if rollup not in ROLLUPS:
+            raise ValueError(f"Unknown rollup: {rollup}")
+        super().__init__(
+            organizations=organizations
+            or [Organization(None, api_key, application_key)],
+            **kwargs,
+        )
         self.site = site
         self.product_families = product_families
         self.start_date = start_date
-        self._url_base = f"https://api.{site}"
+        self.slice_window = SLICE_WINDOWS[slice_window]
+        self.fan_out_product_families = fan_out_product_families
+        self.streaming_parse = streaming_parse
+        if streaming_parse:
+            # The token of the next page is only known once a streamed page is parsed.
+            self.prefetch_pages = 0
+        self.settling_hours = settling_hours
+        self.output_format = output_format
+        self.adaptive_page_size = adaptive_page_size or AdaptivePageSize()
+        self.metrics.set("page_size", self.adaptive_page_size.current)
+        self._settled_before: Optional[str] = None
+        # Days or months records are summed over; each slice is one of them.
+        self.rollup = None if rollup == HOUR else rollup
+        # How long the token of the next page is resumed from the state, if at all.
+        # A rollup is only correct over every page of its window.
+        self.pagination_ttl = (
+            timedelta(minutes=resume_pagination_minutes)
+            if resume_pagination_minutes and self.rollup is None
+            else None
+        )
+        # The slice read on the main thread and the state scope its pages are tracked in.
+        self._paging: Optional[Tuple[Mapping[str, Any], MutableMapping[str, Any]]] = (
+            None
+        )
+        self._url_base = self._url_base or f"https://api.{site}"
+
+    @property
+    def primary_key(self) -> List[str]:
+        primary_key = ["timestamp", "product_family"]
+        if self.output_format == FLAT:
+            primary_key.append("usage_type")
+        if self.partitioned:
+            primary_key.append("org_name")
+        return primary_key
 
     def path(self, **kwargs) -> str:
         return "/api/v2/usage/hourly_usage"
 
-    def request_headers(self, **kwargs) -> Mapping[str, Any]:
-        return {
-            "DD-API-KEY": self.api_key,
-            "DD-APPLICATION-KEY": self.application_key,
-        }
+    def request_headers(
+        self, stream_slice: Optional[Mapping[str, Any]] = None, **kwargs
+    ) -> Mapping[str, Any]:
+        return self._organization(stream_slice).headers
 
     def request_params(
         self,
@@ -117,73 +553,465 @@ class HourlyUsageByProductStream(IncrementalDatadogUsageStream):
         next_page_token: Mapping[str, Any] = None,
     ) -> MutableMapping[str, Any]:
         params = {
-            "filter[product_families]": ",".join(self.product_families),
-            "page[limit]": 500,
+            "filter[product_families]": self._product_families_filter(stream_slice),
+            PAGE_LIMIT_PARAM: self.adaptive_page_size.current,
         }
 
-        start_time = stream_state.get(self.cursor_field)
-        if start_time:
-            params["filter[timestamp][start]"] = start_time[:13]
+        if stream_slice:
+            params["filter[timestamp][start]"] = stream_slice["start"]
+            params["filter[timestamp][end]"] = stream_slice["end"]
         else:
-            params["filter[timestamp][start]"] = self.start_date
+            start_time = stream_state.get(self.cursor_field)
+            if start_time:
+                params["filter[timestamp][start]"] = start_time[:13]
+            else:
+                params["filter[timestamp][start]"] = self.start_date
 
-        if next_page_token:
-            time.sleep(5.0)
-            if "next_record_id" in next_page_token:
-                params["page[next_record_id]"] = next_page_token["next_record_id"]
+        if next_page_token and "next_record_id" in next_page_token:
+            params["page[next_record_id]"] = next_page_token["next_record_id"]
+        elif stream_slice and "next_record_id" in stream_slice:
+            # A page chain resumed from the state starts at the page it stopped at.
+            params["page[next_record_id]"] = stream_slice["next_record_id"]
 
         return params
 
+    def _product_families_filter(
+        self, stream_slice: Optional[Mapping[str, Any]]
+    ) -> str:
+        if stream_slice and "product_family" in stream_slice:
+            return stream_slice["product_family"]
+        return ",".join(self.product_families)
+
+    def _cacheable(self, url: str) -> bool:
+        end = parse_qs(urlsplit(url).query).get("filter[timestamp][end]")
+        if not end:
+            return False
+        fresh_from = datetime.now(timezone.utc) - timedelta(
+            hours=self.response_cache.freshness_hours
+        )
+        return end[0].upper() <= fresh_from.strftime(HOUR_FORMAT)
+
+    def request_kwargs(self, **kwargs) -> Mapping[str, Any]:
+        request_kwargs = super().request_kwargs(**kwargs)
+        if self.streaming_parse:
+            return {**request_kwargs, "stream": True}
+        return request_kwargs
+
+    def stream_slices(
+        self,
+        sync_mode: SyncMode,
+        cursor_field: Optional[List[str]] = None,
+        stream_state: Optional[Mapping[str, Any]] = None,
+    ) -> Iterable[Optional[Mapping[str, Any]]]:
+        stream_state = stream_state if stream_state is not None else {}
+        slices = self._slices(stream_state)
+        self._prefetch_slices(slices, stream_state)
+        return slices
+
+    def _slices(
+        self, stream_state: MutableMapping[str, Any]
+    ) -> List[Mapping[str, Any]]:
+        """The slices of a sync from `stream_state`, without fetching any of them."""
+        current_hour = datetime.now(timezone.utc).replace(
+            minute=0, second=0, microsecond=0
+        )
+        # `filter[timestamp][end]` is exclusive, so the last window includes the current hour.
+        end = current_hour + timedelta(hours=1)
+        # Hours before this one are final; later ones may still be revised by Datadog.
+        self._settled_before = (
+            current_hour - timedelta(hours=self.settling_hours)
+        ).strftime(HOUR_FORMAT)
+
+        slices = self._organization_slices(
+            stream_state, partial(self._org_slices, end=end)
+        )
+        if self.fan_out_product_families or self.partitioned:
+            slices.sort(key=lambda stream_slice: stream_slice["start"])
+        return slices
+
+    def _org_slices(
+        self, org_state: MutableMapping[str, Any], end: datetime
+    ) -> List[Mapping[str, Any]]:
+        if self.fan_out_product_families:
+            # Only states written before the fan-out have no partitions: their
+            # cursor covers every product family. Otherwise a product family
+            # without a partition has not been synced yet.
+            migrating = "partitions" not in org_state
+            fallback_cursor = org_state.get(self.cursor_field) if migrating else None
+            partitions = org_state.get("partitions", {})
+            slices = []
+            for product_family in self.product_families:
+                scope = partitions.get(product_family, {})
+                start = self._start_hour(scope, fallback_cursor)
+                for stream_slice in self._scope_slices(
+                    scope, start, end, product_family
+                ):
+                    stream_slice["product_family"] = product_family
+                    slices.append(stream_slice)
+        else:
+            start = self._start_hour(org_state)
+            slices = self._scope_slices(
+                org_state, start, end, self._product_families_filter(None)
+            )
+
+        if slices and "digests" in org_state:
+            # Records older than the first window are never fetched again.
+            first_start = min(stream_slice["start"] for stream_slice in slices)
+            org_state["digests"] = {
+                key: digest
+                for key, digest in org_state["digests"].items()
+                if key >= first_start
+            }
+        return slices
+
+    def _start_hour(
+        self, scope: Mapping[str, Any], fallback_cursor: Optional[str] = None
+    ) -> str:
+        if self.rollup is not None:
+            finalized_until = scope.get("finalized_until")
+            if finalized_until:
+                return finalized_until
+            # Rollups are only emitted for whole windows: start over from the
+            # beginning of the window the sync stopped in.
+            start = rollup_window(
+                self._resume_hour(scope, fallback_cursor), self.rollup
+            )
+            return max(start, self.start_date)
+        return self._resume_hour(scope, fallback_cursor)
+
+    def _resume_hour(
+        self, scope: Mapping[str, Any], fallback_cursor: Optional[str] = None
+    ) -> str:
+        settled_until = scope.get("settled_until")
+        if settled_until:
+            return settled_until
+        # States written before `settled_until` existed: resume from the cursor's hour.
+        cursor = scope.get(self.cursor_field) or fallback_cursor
+        return (cursor or self.start_date)[:13]
+
+    def _scope_slices(
+        self,
+        scope: MutableMapping[str, Any],
+        start: str,
+        end: datetime,
+        product_families: str,
+    ) -> List[Dict[str, Any]]:
+        slices = []
+        pagination = self._resumed_pagination(scope, start, product_families)
+        if pagination is not None:
+            # The window a previous sync stopped in: continue from its next page.
+            slices.append(
+                {
+                    "start": pagination["start"],
+                    "end": pagination["end"],
+                    "next_record_id": pagination["next_record_id"],
+                }
+            )
+            start = pagination["end"]
+        slices.extend(
+            {"start": window_start, "end": window_end}
+            for window_start, window_end in self._windows(start, end)
+        )
+        return slices
+
+    def _resumed_pagination(
+        self, scope: MutableMapping[str, Any], start: str, product_families: str
+    ) -> Optional[Mapping[str, Any]]:
+        """
+        The page chain saved in `scope` if the sync can continue it: resuming is
+        enabled, its token has not expired, it was requested with the same
+        product families and the hours before `start` were all read.
+        """
+        pagination = scope.get("pagination")
+        if pagination is None:
+            return None
+        now = datetime.now(timezone.utc).strftime(EXPIRY_FORMAT)
+        if (
+            self.pagination_ttl is None
+            or pagination["expires_at"] <= now
+            or pagination["product_families"] != product_families
+            or not pagination["start"] <= start < pagination["end"]
+        ):
+            del scope["pagination"]
+            return None
+        return pagination
+
+    def _save_pagination(
+        self,
+        scope: MutableMapping[str, Any],
+        stream_slice: Mapping[str, Any],
+        next_page_token: Optional[Mapping[str, Any]],
+    ) -> None:
+        if not next_page_token:
+            scope.pop("pagination", None)
+            return
+        expires_at = datetime.now(timezone.utc) + self.pagination_ttl
+        scope["pagination"] = {
+            "start": stream_slice["start"],
+            "end": stream_slice["end"],
+            "product_families": self._product_families_filter(stream_slice),
+            "next_record_id": next_page_token["next_record_id"],
+            "expires_at": expires_at.strftime(EXPIRY_FORMAT),
+        }
+
+    def _windows(self, start: str, end: datetime) -> Iterable[Tuple[str, str]]:
+        window_start = datetime.strptime(start, HOUR_FORMAT).replace(
+            tzinfo=timezone.utc
+        )
+        while window_start < end:
+            if self.rollup is not None:
+                window_end = min(next_rollup_window(window_start, self.rollup), end)
+            else:
+                window_end = min(window_start + self.slice_window, end)
+            yield window_start.strftime(HOUR_FORMAT), window_end.strftime(HOUR_FORMAT)
+            window_start = window_end
+
+    def _state_scope(
+        self,
+        stream_state: MutableMapping[str, Any],
+        org: Optional[str],
+        product_family: Optional[str],
+    ) -> MutableMapping[str, Any]:
+        org_state = self._org_state(stream_state, org)
+        if self.fan_out_product_families and product_family:
+            return org_state.setdefault("partitions", {}).setdefault(product_family, {})
+        return org_state
+
+    def read_records(
+        self,
+        sync_mode: SyncMode,
+        cursor_field: Optional[List[str]] = None,
+        stream_slice: Optional[Mapping[str, Any]] = None,
+        stream_state: Optional[Mapping[str, Any]] = None,
+    ) -> Iterable[Mapping[str, Any]]:
+        org = (stream_slice or {}).get("org")
+        self._paging = None
+        if (
+            self.pagination_ttl is not None
+            and stream_slice
+            and stream_state is not None
+            and not (self._slice_fetcher and self._slice_fetcher.has(stream_slice))
+        ):
+            # Slices fetched ahead are emitted all at once: only the pages of one
+            # read here are emitted as they arrive and can be resumed from.
+            scope = self._state_scope(
+                stream_state, org, stream_slice.get("product_family")
+            )
+            self._paging = (stream_slice, scope)
+
+        records = super().read_records(
+            sync_mode,
+            cursor_field=cursor_field,
+            stream_slice=stream_slice,
+            stream_state=stream_state,
+        )
+        if self.rollup is not None:
+            records = rolled_up(records, self.rollup)
+        if self._settled_before is None or stream_state is None:
+            yield from records
+            return
+
+        yield from self._deduplicate(records, self._org_state(stream_state, org))
+
+        if stream_slice:
+            # The whole window was read: its settled hours never need fetching again.
+            scope = self._state_scope(
+                stream_state, org, stream_slice.get("product_family")
+            )
+            settled_until = min(stream_slice["end"], self._settled_before)
+            if settled_until > scope.get("settled_until", ""):
+                scope["settled_until"] = settled_until
+            # Rollups of windows whose hours have all settled are final.
+            if self.rollup is not None and stream_slice["end"] <= self._settled_before:
+                if stream_slice["end"] > scope.get("finalized_until", ""):
+                    scope["finalized_until"] = stream_slice["end"]
+
+    def _parse_page(
+        self,
+        request: Optional[requests.PreparedRequest],
+        response: requests.Response,
+        stream_state: Mapping[str, Any],
+        stream_slice: Optional[Mapping[str, Any]],
+    ) -> Iterable[Mapping[str, Any]]:
+        yield from super()._parse_page(request, response, stream_state, stream_slice)
+        if self._paging is not None and self._paging[0] is stream_slice:
+            # Every record of the page was emitted: a restarted sync can continue
+            # from the next page.
+            self._save_pagination(
+                self._paging[1], stream_slice, self.next_page_token(response)
+            )
+
+    def _deduplicate(
+        self,
+        records: Iterable[Mapping[str, Any]],
+        stream_state: MutableMapping[str, Any],
+    ) -> Iterable[Mapping[str, Any]]:
+        """
+        Drops records that were already emitted unchanged by an earlier sync.
+
+        Digests are kept in the state only for records inside the settling window,
+        the only ones that are fetched again.
+        """
+        digests = stream_state.setdefault("digests", {})
+        key_fields = self.primary_key
+        for record in records:
+            key = "|".join([str(record[field]) for field in key_fields])
+            unsettled = self._unsettled(record[self.cursor_field])
+            if unsettled or key in digests:
+                digest = hashlib.blake2b(
+                    json.dumps(record, sort_keys=True).encode(), digest_size=8
+                ).hexdigest()
+                if digests.get(key) == digest:
+                    continue
+                if unsettled:
+                    digests[key] = digest
+                else:
+                    del digests[key]
+            yield record
+
+    def _unsettled(self, timestamp: str) -> bool:
+        """Whether Datadog may still revise the record with cursor `timestamp`."""
+        if self.rollup is None:
+            return timestamp[:13] >= self._settled_before
+        # A rollup row is timestamped with the start of its window, and changes
+        # until the last hour of the window has settled.
+        window_start = datetime.strptime(timestamp[:13], HOUR_FORMAT)
+        window_end = next_rollup_window(window_start, self.rollup)
+        return window_end.strftime(HOUR_FORMAT) > self._settled_before
+
+    def get_updated_state(
+        self,
+        current_stream_state: MutableMapping[str, Any],
+        latest_record: Mapping[str, Any],
+    ) -> Mapping[str, Any]:
+        # The CDK passes the state the sync started from to every call, so cursors,
+        # per-org and per-family partitions and settling progress are all advanced
+        # in place.
+        latest_timestamp = latest_record.get(self.cursor_field)
+        if not latest_timestamp:
+            return current_stream_state
+
+        if latest_timestamp > current_stream_state.get(self.cursor_field, ""):
+            current_stream_state[self.cursor_field] = latest_timestamp
+        org_state = self._org_state(current_stream_state, self._reading_org)
+        scope = self._state_scope(
+            current_stream_state, self._reading_org, latest_record.get("product_family")
+        )
+        for partition in (org_state, scope):
+            if (
+                partition is not current_stream_state
+                and latest_timestamp > partition.get(self.cursor_field, "")
+            ):
+                partition[self.cursor_field] = latest_timestamp
+
+        # Records arrive in timestamp order, so every earlier hour is complete.
+        latest_hour = latest_timestamp[:13]
+        if (
+            self._settled_before is not None
+            and scope.get("settled_until", "") < latest_hour <= self._settled_before
+        ):
+            scope["settled_until"] = latest_hour
+        return current_stream_state
+
     def parse_response(
         self, response: requests.Response, **kwargs
     ) -> Iterable[Mapping]:
-        data = response.json()
-        for record in data.get("data", []):
+        if self.streaming_parse:
+            records = stream_items(response, "data.item")
+        else:
+            records = response_json(response).get("data", [])
+
+        # The same few families and orgs repeat on every page: interned, all records
+        # share one copy of each. Usage types are shared with the decoded page.
+        intern = sys.intern
+        if self.output_format == FLAT:
+            for record in records:
+                attributes = record["attributes"]
+                timestamp = attributes["timestamp"]
+                product_family = intern(attributes["product_family"])
+                org_name = intern(attributes["org_name"])
+                record_type = intern(record["type"])
+                for measurement in attributes["measurements"]:
+                    value = measurement["value"]
+                    if value is not None:
+                        yield {
+                            "timestamp": timestamp,
+                            "product_family": product_family,
+                            "org_name": org_name,
+                            "usage_type": measurement["usage_type"],
+                            "value": value,
+                            "type": record_type,
+                        }
+            return
+
+        if self.output_format == WIDE:
+            for record in records:
+                attributes = record["attributes"]
+                row = {
+                    "timestamp": attributes["timestamp"],
+                    "product_family": intern(attributes["product_family"]),
+                    "org_name": intern(attributes["org_name"]),
+                    "type": intern(record["type"]),
+                }
+                for measurement in attributes["measurements"]:
+                    value = measurement["value"]
+                    if value is not None:
+                        row[measurement["usage_type"]] = value
+                yield row
+            return
+
+        for record in records:
             attributes = record["attributes"]
             yield {
                 "timestamp": attributes["timestamp"],
-                "product_family": attributes["product_family"],
-                "org_name": attributes["org_name"],
-                "measurements": [
-                    {"usage_type": m["usage_type"], "value": m["value"]}
-                    for m in attributes["measurements"]
-                    if m["value"] is not None  # nullの値は除外
-                ],
-                "type": record["type"],
+                "product_family": intern(attributes["product_family"]),
+                "org_name": intern(attributes["org_name"]),
+                "measurements": _compact_measurements(attributes["measurements"]),
+                "type": intern(record["type"]),
             }
 
     def get_json_schema(self) -> Dict[str, Any]:
-        schema_path = (
-            Path(__file__).parent / "schemas" / "hourly_usage_by_products.json"
-        )
-        return json.loads(schema_path.read_text())
+        if self.output_format == WIDE:
+            return get_wide_schema(tuple(sorted(set(self.product_families))))
+        return get_schema(HOURLY_USAGE_SCHEMAS[self.output_format])
 
 
 class EstimatedCostStream(IncrementalDatadogUsageStream):
-    primary_key = ["sync_date", "month"]
-
     def __init__(
         self,
-        api_key: str,
-        application_key: str,
+        api_key: Optional[str],
+        application_key: Optional[str],
         site: str,
         start_month: Optional[str] = None,
+        organizations: Optional[List[Organization]] = None,
+        settling_days: int = DEFAULT_COST_SETTLING_DAYS,
+        **kwargs,
     ):
-        super().__init__()
-        self.api_key = api_key
-        self.application_key = application_key
+        super().__init__(
+            organizations=organizations
+            or [Organization(None, api_key, application_key)],
+            **kwargs,
+        )
         self.site = site
-        self._url_base = f"https://api.{site}"
-        self.start_month = start_month or datetime.now().strftime("%Y-%m")
+        self._url_base = self._url_base or f"https://api.{site}"
+        self.start_month = start_month or datetime.now(timezone.utc).strftime(
+            MONTH_FORMAT
+        )
+        self.settling_days = settling_days
+
+    @property
+    def primary_key(self) -> List[str]:
+        if self.partitioned:
+            return ["sync_date", "month", "org_name"]
+        return ["sync_date", "month"]
 
     def path(self, **kwargs) -> str:
         return "/api/v2/usage/estimated_cost"
 
-    def request_headers(self, **kwargs) -> Mapping[str, Any]:
-        return {
-            "DD-API-KEY": self.api_key,
-            "DD-APPLICATION-KEY": self.application_key,
-        }
+    def request_headers(
+        self, stream_slice: Optional[Mapping[str, Any]] = None, **kwargs
+    ) -> Mapping[str, Any]:
+        return self._organization(stream_slice).headers
 
     def request_params(
         self,
@@ -191,20 +1019,85 @@ class EstimatedCostStream(IncrementalDatadogUsageStream):
         stream_slice: Mapping[str, any] = None,
         next_page_token: Mapping[str, Any] = None,
     ) -> MutableMapping[str, Any]:
-        current_month = datetime.now().strftime("%Y-%m")
+        if stream_slice:
+            return {
+                "start_month": stream_slice["start_month"],
+                "end_month": stream_slice["end_month"],
+            }
+
+        current_month = datetime.now(timezone.utc).strftime(MONTH_FORMAT)
         params = {"start_month": current_month}
 
         return params
 
+    def stream_slices(
+        self,
+        sync_mode: SyncMode,
+        cursor_field: Optional[List[str]] = None,
+        stream_state: Optional[Mapping[str, Any]] = None,
+    ) -> Iterable[Optional[Mapping[str, Any]]]:
+        stream_state = stream_state if stream_state is not None else {}
+        slices = self._slices(stream_state)
+        self._prefetch_slices(slices, stream_state)
+        return slices
+
+    def _slices(
+        self, stream_state: MutableMapping[str, Any]
+    ) -> List[Mapping[str, Any]]:
+        """The slices of a sync from `stream_state`, without fetching any of them."""
+        current_month = datetime.now(timezone.utc).strftime(MONTH_FORMAT)
+        slices = self._organization_slices(
+            stream_state, partial(self._org_slices, current_month=current_month)
+        )
+        slices.sort(key=lambda stream_slice: stream_slice["start_month"])
+        return slices
+
+    def _org_slices(
+        self, org_state: Mapping[str, Any], current_month: str
+    ) -> List[Mapping[str, Any]]:
+        month = self.start_month
+        closed_month = org_state.get("closed_month")
+        if closed_month and closed_month >= month:
+            month = _next_month(closed_month)
+
+        slices = []
+        while month <= current_month:
+            slices.append({"start_month": month, "end_month": month})
+            month = _next_month(month)
+        return slices
+
+    def get_updated_state(
+        self,
+        current_stream_state: MutableMapping[str, Any],
+        latest_record: Mapping[str, Any],
+    ) -> Mapping[str, Any]:
+        super().get_updated_state(current_stream_state, latest_record)
+        # A month is closed once it has been synced after its cost settled; it is
+        # never fetched again.
+        latest_month = latest_record.get("month")
+        if latest_month and latest_record[self.cursor_field] >= self._settled_on(
+            latest_month
+        ):
+            scope = self._org_state(current_stream_state, self._reading_org)
+            if latest_month > scope.get("closed_month", ""):
+                scope["closed_month"] = latest_month
+        return current_stream_state
+
+    def _settled_on(self, month: str) -> str:
+        """The first sync date on which the estimated cost of `month` is final."""
+        month_end = datetime.strptime(_next_month(month), MONTH_FORMAT)
+        return (month_end + timedelta(days=self.settling_days)).strftime("%Y-%m-%d")
+
     def parse_response(
         self, response: requests.Response, **kwargs
     ) -> Iterable[Mapping]:
-        data = response.json()
+        data = response_json(response)
+        sync_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
         for record in data.get("data", []):
             attributes = record["attributes"]
             month = attributes["date"][:7]
             yield {
-                "sync_date": datetime.now().strftime("%Y-%m-%d"),
+                "sync_date": sync_date,
                 "month": month,
                 "org_name": attributes["org_name"],
                 "total_cost": attributes["total_cost"],
@@ -224,43 +1117,125 @@ class EstimatedCostStream(IncrementalDatadogUsageStream):
         return "sync_date"
 
     def get_json_schema(self) -> Dict[str, Any]:
-        schema_path = Path(__file__).parent / "schemas" / "estimated_cost.json"
-        return json.loads(schema_path.read_text())
+        return get_schema("estimated_cost")
 
 
 # Source
 class SourceDatadogUsage(AbstractSource):
+    _session: Optional[requests.Session] = None
+
+    def _http_session(self, config: Mapping[str, Any]) -> requests.Session:
+        if self._session is None:
+            self._session = build_session(config)
+        return self._session
+
+    def _all_product_families(self) -> List[str]:
+        spec = self.spec(logging.getLogger("airbyte"))
+        product_families = spec.connectionSpecification["properties"][
+            "hourly_usage_by_product"
+        ]["properties"]["product_families"]
+        return [
+            family for family in product_families["items"]["enum"] if family != "all"
+        ]
+
+    def _api_url(self, config: Mapping[str, Any]) -> str:
+        return f"https://api.{config['site']}"
+
     def check_connection(self, logger, config) -> Tuple[bool, any]:
         try:
-            url = f"https://api.{config['site']}/api/v1/validate"
-
-            headers = {
-                "DD-API-KEY": config["api_key"],
-                "DD-APPLICATION-KEY": config["application_key"],
-            }
+            url = f"{self._api_url(config)}/api/v1/validate"
 
-            response = requests.get(url, headers=headers)
+            for organization in organizations_from_config(config):
+                response = self._http_session(config).get(
+                    url, headers=organization.headers, timeout=timeouts(config)
+                )
 
-            if response.status_code == 200:
-                return True, None
+                if response.status_code != 200:
+                    error = f"HTTP {response.status_code}: {response.text}"
+                    if organization.name is not None:
+                        error = f"Organization {organization.name}: {error}"
+                    return False, error
 
-            return False, f"HTTP {response.status_code}: {response.text}"
+            return True, None
 
         except Exception as e:
             return False, str(e)
 
+    def read(
+        self,
+        logger: logging.Logger,
+        config: Mapping[str, Any],
+        catalog: ConfiguredAirbyteCatalog,
+        state: Optional[
+            Union[List[AirbyteStateMessage], MutableMapping[str, Any]]
+        ] = None,
+    ) -> Iterator[AirbyteMessage]:
+        profile = config.get("profile") or {}
+        with profiling(profile.get("path"), profile.get("profiler", CPROFILE)):
+            yield from super().read(logger, config, catalog, state)
+
+    def _get_message(
+        self, record_data_or_message: Union[StreamData, AirbyteMessage], stream: Stream
+    ) -> AirbyteMessage:
+        # Records of these streams are plain dicts that are never transformed:
+        # they are serialized straight into the stream's message envelope.
+        if isinstance(record_data_or_message, Mapping) and isinstance(
+            stream, DatadogUsageStream
+        ):
+            return stream.record_envelope.message(record_data_or_message)
+        return super()._get_message(record_data_or_message, stream)
+
     def streams(self, config: Mapping[str, Any]) -> List[Stream]:
+        read_engine = config.get("read_engine", "sync")
+        rate_limiter = RateLimitScheduler.from_config(config)
+        shared = {
+            "rate_limiter": rate_limiter,
+            "organizations": organizations_from_config(config, rate_limiter),
+            "session": self._http_session(config),
+            "timeout": timeouts(config),
+            "max_concurrency": config.get("max_concurrency", 1),
+            "read_engine": read_engine,
+            "http2": (config.get("http") or {}).get("http2", False),
+            "url_base": self._api_url(config),
+            "response_cache": ResponseCache.from_config(config),
+            "prefetch_pages": config.get("prefetch_pages", 0),
+        }
+        hourly_usage_config = config["hourly_usage_by_product"]
+        fan_out = hourly_usage_config.get("fan_out_product_families", False)
+        product_families = hourly_usage_config["product_families"]
+        if fan_out and "all" in product_families:
+            product_families = self._all_product_families()
         return [
             HourlyUsageByProductStream(
-                api_key=config["api_key"],
-                application_key=config["application_key"],
+                api_key=config.get("api_key"),
+                application_key=config.get("application_key"),
                 site=config["site"],
-                product_families=config["hourly_usage_by_product"]["product_families"],
-                start_date=config["hourly_usage_by_product"]["start_date"],
+                product_families=product_families,
+                start_date=hourly_usage_config["start_date"],
+                slice_window=hourly_usage_config.get("slice_window", "day"),
+                fan_out_product_families=fan_out,
+                # Pages fetched by the async engine are always read in full.
+                streaming_parse=hourly_usage_config.get("streaming_parse", False)
+                and read_engine != "async",
+                settling_hours=hourly_usage_config.get("settling_hours", 0),
+                output_format=hourly_usage_config.get("output_format", NESTED),
+                adaptive_page_size=AdaptivePageSize.from_config(hourly_usage_config),
+                resume_pagination_minutes=hourly_usage_config.get(
+                    "resume_pagination_minutes", 0
+                ),
+                rollup=hourly_usage_config.get("rollup", HOUR),
+                checkpoint_policy=CheckpointPolicy.from_config(config),
+                **shared,
             ),
             EstimatedCostStream(
-                api_key=config["api_key"],
-                application_key=config["application_key"],
+                api_key=config.get("api_key"),
+                application_key=config.get("application_key"),
                 site=config["site"],
+                start_month=config.get("estimated_cost", {}).get("start_month"),
+                settling_days=config.get("estimated_cost", {}).get(
+                    "settling_days", DEFAULT_COST_SETTLING_DAYS
+                ),
+                checkpoint_policy=CheckpointPolicy.from_config(config),
+                **shared,
             ),
         ]
@@ -0,0 +1,62 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+"""
+Micro-benchmark of the per-page JSON decode cost.
+
+`before` decodes every page twice with the stdlib, as `next_page_token` and
+`parse_response` used to. `after` goes through `decoding.response_json`, which
+decodes once (with orjson when installed) and shares the result.
+
+    python -m benchmarks.bench_decode --records 500 --measurements 30
+"""
+
+import argparse
+import json
+import timeit
+
+import requests
+
+from airbyte_source_datadog_usage import decoding
+
+from .pages import hourly_usage_page
+
+
+def make_response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    return response
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--records", type=int, default=500)
+    parser.add_argument("--measurements", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    body = json.dumps(
+        hourly_usage_page(records=args.records, measurements=args.measurements)
+    ).encode()
+
+    def before():
+        response = make_response(body)
+        json.loads(response.content)
+        json.loads(response.content)
+
+    def after():
+        response = make_response(body)
+        decoding.response_json(response)
+        decoding.response_json(response)
+
+    backend = "orjson" if decoding.orjson is not None else "json"
+    print(f"page size: {len(body) / 1024:.0f} KiB, backend: {backend}")
+    for name, fn in (("before", before), ("after", after)):
+        seconds = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        print(f"{name:>6}: {seconds * 1000:.2f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
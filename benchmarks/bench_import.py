@@ -0,0 +1,164 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+"""
+Startup benchmark of the connector commands that run in a fresh container.
+
+Every command runs `main.py` in a new interpreter under `python -X importtime`,
+as the entrypoint of the image does: with the environment the Dockerfile sets
+and with bytecode compiled ahead (a first, untimed run fills a private
+`PYTHONPYCACHEPREFIX`). It reports the wall time, the import time and number of
+modules imported, and the top-level packages that took longest to import.
+`spec` and `discover` run end to end; `import` loads the source module, which is
+what `check` and `read` import before they reach the network.
+
+    python -m benchmarks.bench_import                    # compare with import_baseline.json
+    python -m benchmarks.bench_import --save-baseline    # record a new baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE = Path(__file__).with_name("import_baseline.json")
+METRICS = ("wall_ms", "import_ms", "modules")
+# Set by the Dockerfile.
+IMAGE_ENV = {"SETUPTOOLS_USE_DISTUTILS": "stdlib"}
+CONFIG = {
+    "api_key": "benchmark",
+    "application_key": "benchmark",
+    "site": "datadoghq.com",
+    "hourly_usage_by_product": {
+        "product_families": ["all"],
+        "start_date": "2024-01-01T00",
+    },
+}
+COMMANDS = {
+    "spec": ["main.py", "spec"],
+    "discover": ["main.py", "discover", "--config", "{config}"],
+    "import": ["-c", "import airbyte_source_datadog_usage.source"],
+}
+
+_IMPORT_TIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+
+
+def parse_importtime(
+    stderr: str,
+) -> Tuple[float, int, Dict[str, float]]:
+    """Total import time in ms, modules imported and self time in ms per top-level package."""
+    total_us = 0
+    modules = 0
+    packages: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        modules += 1
+        packages[name.split(".")[0]] += int(self_us) / 1000
+        if len(indent) == 1:
+            total_us += int(cumulative_us)
+    return total_us / 1000, modules, dict(packages)
+
+
+def run_command(args: List[str], pycache: str) -> Dict[str, float]:
+    env = {
+        **os.environ,
+        **IMAGE_ENV,
+        "PYTHONPATH": str(ROOT),
+        "PYTHONPYCACHEPREFIX": pycache,
+    }
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    with tempfile.TemporaryDirectory() as directory:
+        config = Path(directory, "config.json")
+        config.write_text(json.dumps(CONFIG))
+        command = [sys.executable, "-X", "importtime"] + [
+            arg.format(config=config) for arg in args
+        ]
+        started = time.perf_counter()
+        completed = subprocess.run(
+            command,
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        wall_ms = (time.perf_counter() - started) * 1000
+    import_ms, modules, packages = parse_importtime(completed.stderr)
+    return {
+        "wall_ms": wall_ms,
+        "import_ms": import_ms,
+        "modules": modules,
+        "packages": packages,
+    }
+
+
+def _report(
+    name: str,
+    result: Mapping[str, float],
+    baseline: Optional[Mapping[str, float]],
+    top: int,
+) -> None:
+    print(f"{name}:")
+    for metric in METRICS:
+        line = f"  {metric:>10}: {result[metric]:>10,.1f}"
+        if baseline and metric in baseline:
+            change = result[metric] / baseline[metric] - 1
+            line += f"  (baseline {baseline[metric]:,.1f}, {change:+.1%})"
+        print(line)
+    heaviest = sorted(result["packages"].items(), key=lambda item: -item[1])[:top]
+    print(
+        "  heaviest: " + ", ".join(f"{package} {ms:,.1f}ms" for package, ms in heaviest)
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--command", choices=sorted(COMMANDS), action="append", dest="commands"
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=8)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    baselines = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    results = {}
+    pycache = tempfile.mkdtemp(prefix="bench_import_pycache_")
+    for name in args.commands or list(COMMANDS):
+        run_command(COMMANDS[name], pycache)
+        runs = [run_command(COMMANDS[name], pycache) for _ in range(args.repeat)]
+        results[name] = result = min(runs, key=lambda run: run["wall_ms"])
+        _report(name, result, baselines.get("commands", {}).get(name), args.top)
+    shutil.rmtree(pycache)
+
+    if args.save_baseline:
+        baselines.setdefault("commands", {}).update(
+            {
+                name: {metric: round(result[metric], 1) for metric in METRICS}
+                for name, result in results.items()
+            }
+        )
+        baselines["environment"] = {
+            "python": platform.python_version(),
+            "platform": platform.platform(terse=True),
+        }
+        BASELINE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {BASELINE}")
+
+
+if __name__ == "__main__":
+    main()
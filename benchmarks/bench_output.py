@@ -0,0 +1,110 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+"""
+Micro-benchmark of writing hourly usage records to stdout as Airbyte messages.
+
+`cdk` is the default path of `airbyte_cdk.entrypoint.launch`: every record is
+wrapped in pydantic models, counted, serialized with `.json()` and printed with a
+flush. `fast` is the path of `run.py`: records are serialized into the envelope
+of their stream and written in large chunks, flushed at every checkpoint. Both
+write to /dev/null, with a state message every `--checkpoint-every` records.
+
+    python -m benchmarks.bench_output --pages 20 --records 500
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+
+from airbyte_cdk.entrypoint import AirbyteEntrypoint
+from airbyte_cdk.sources import AbstractSource
+
+from airbyte_source_datadog_usage.output import DatadogUsageEntrypoint, MessageWriter
+from airbyte_source_datadog_usage.source import (
+    HourlyUsageByProductStream,
+    SourceDatadogUsage,
+)
+
+from .bench_records import decoded_response
+from .pages import hourly_usage_page
+
+STATE = json.dumps({"type": "STATE", "state": {"type": "STREAM"}})
+
+
+def write_cdk(source, stream, records, checkpoint_every):
+    counts = defaultdict(float)
+    with open(os.devnull, "w") as output:
+        for index, data in enumerate(records, 1):
+            message = AbstractSource._get_message(source, data, stream)
+            AirbyteEntrypoint.handle_record_counts(message, counts)
+            message = AirbyteEntrypoint.airbyte_message_to_string(message)
+            print(f"{message}\n", end="", flush=True, file=output)
+            if index % checkpoint_every == 0:
+                print(f"{STATE}\n", end="", flush=True, file=output)
+
+
+def write_fast(source, stream, records, checkpoint_every):
+    counts = defaultdict(float)
+    with open(os.devnull, "wb") as output, MessageWriter(output) as writer:
+        for index, data in enumerate(records, 1):
+            message = source._get_message(data, stream)
+            DatadogUsageEntrypoint.handle_record_counts(message, counts)
+            writer.write(AirbyteEntrypoint.airbyte_message_to_string(message))
+            if index % checkpoint_every == 0:
+                writer.write(STATE)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--records", type=int, default=500)
+    parser.add_argument("--measurements", type=int, default=30)
+    parser.add_argument("--output-format", default="nested")
+    parser.add_argument("--checkpoint-every", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    source = SourceDatadogUsage()
+    stream = HourlyUsageByProductStream(
+        api_key="",
+        application_key="",
+        site="datadoghq.com",
+        product_families=["all"],
+        start_date="2024-01-01T00",
+        output_format=args.output_format,
+    )
+    page = json.dumps(
+        hourly_usage_page(records=args.records, measurements=args.measurements)
+    ).encode()
+    records = [
+        record
+        for _ in range(args.pages)
+        for record in stream.parse_response(decoded_response(page))
+    ]
+
+    print(
+        f"{len(records)} {args.output_format} records of {args.measurements} measurements"
+    )
+    rates = {}
+    for name, write in (("cdk", write_cdk), ("fast", write_fast)):
+        best = min(
+            _timed(write, source, stream, records, args.checkpoint_every)
+            for _ in range(args.repeat)
+        )
+        rates[name] = len(records) / best
+        print(f"{name:>5}: {rates[name]:>10,.0f} messages/s")
+    print(f"speedup: {rates['fast'] / rates['cdk']:.1f}x")
+
+
+def _timed(write, *args) -> float:
+    started = time.perf_counter()
+    write(*args)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    main()
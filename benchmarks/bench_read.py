@@ -0,0 +1,379 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+"""
+End-to-end throughput benchmark of `SourceDatadogUsage.read` against the simulator.
+
+Every scenario runs `check` and a full `read` of both streams in a fresh process,
+serializing and writing each message as `run.py` does, and reports records/sec,
+bytes/sec (on the wire), peak RSS, and the time spent sleeping (backoff and rate
+limiting), on the network and parsing responses. Network and parse times are
+summed over threads, so they can exceed the wall time of concurrent scenarios.
+
+    python -m benchmarks.bench_read                    # compare with baseline.json
+    python -m benchmarks.bench_read --save-baseline    # record a new baseline
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+from unittest import mock
+
+from .simulator import Simulator, SimulatorOptions
+
+BASELINE = Path(__file__).with_name("baseline.json")
+METRICS = ("records_per_sec", "bytes_per_sec", "peak_rss_mib")
+TIMINGS = ("wall", "sleep", "network", "parse")
+# Round trip of a page; the real usage API takes longer than this.
+LATENCY_MS = 50
+
+
+@dataclass
+class Scenario:
+    simulator: SimulatorOptions = field(default_factory=SimulatorOptions)
+    config: Mapping[str, Any] = field(default_factory=dict)
+    days: int = 7
+    months: int = 6
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "sequential": Scenario(simulator=SimulatorOptions(latency_ms=LATENCY_MS)),
+    "throttled": Scenario(
+        simulator=SimulatorOptions(latency_ms=LATENCY_MS, throttle_every=10)
+    ),
+    "concurrent": Scenario(
+        simulator=SimulatorOptions(latency_ms=LATENCY_MS), config={"max_concurrency": 4}
+    ),
+    "prefetch": Scenario(
+        simulator=SimulatorOptions(latency_ms=LATENCY_MS), config={"prefetch_pages": 2}
+    ),
+    "http2": Scenario(
+        simulator=SimulatorOptions(latency_ms=LATENCY_MS, http2=True),
+        config={"max_concurrency": 4, "http": {"http2": True}},
+    ),
+    "streaming_parse": Scenario(
+        simulator=SimulatorOptions(latency_ms=LATENCY_MS),
+        config={"hourly_usage_by_product": {"streaming_parse": True}},
+    ),
+}
+
+
+class Timings:
+    """Thread-safe accumulators for the time spent in each phase of a read."""
+
+    def __init__(self) -> None:
+        self.seconds = dict.fromkeys(TIMINGS[1:], 0.0)
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[phase] += seconds
+
+    def sleep(self, sleep):
+        def timed_sleep(seconds: float) -> None:
+            started = time.perf_counter()
+            try:
+                sleep(seconds)
+            finally:
+                elapsed = time.perf_counter() - started
+                self._local.slept = self._slept() + elapsed
+                self.add("sleep", elapsed)
+
+        return timed_sleep
+
+    def _slept(self) -> float:
+        return getattr(self._local, "slept", 0.0)
+
+    def send(self, send):
+        def timed_send(*args: Any, **kwargs: Any) -> Any:
+            slept = self._slept()
+            started = time.perf_counter()
+            response = send(*args, **kwargs)
+            elapsed = time.perf_counter() - started
+            # urllib3 retries sleep inside `send`; that time is already counted.
+            self.add("network", elapsed - (self._slept() - slept))
+            with self._lock:
+                self.bytes += int(response.headers.get("Content-Length", 0))
+            return response
+
+        return timed_send
+
+    def async_send(self, send):
+        async def timed_send(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            response = await send(*args, **kwargs)
+            self.add("network", time.perf_counter() - started)
+            with self._lock:
+                self.bytes += int(response.headers.get("Content-Length", 0))
+            return response
+
+        return timed_send
+
+    def parse(self, method):
+        def timed_parse(*args: Any, **kwargs: Any) -> Any:
+            started = time.perf_counter()
+            result = method(*args, **kwargs)
+            if not hasattr(result, "__next__"):
+                self.add("parse", time.perf_counter() - started)
+                return result
+            return self._timed_generator(result, started)
+
+        return timed_parse
+
+    def _timed_generator(self, generator, started: float):
+        elapsed = time.perf_counter() - started
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(generator)
+            except StopIteration:
+                self.add("parse", elapsed + time.perf_counter() - started)
+                return
+            elapsed += time.perf_counter() - started
+            yield item
+
+
+def _config(scenario: Scenario) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    start_date = (now - timedelta(days=scenario.days)).strftime("%Y-%m-%dT%H")
+    start_month = (now - timedelta(days=31 * scenario.months)).strftime("%Y-%m")
+    overrides = dict(scenario.config)
+    hourly_usage = {
+        "product_families": ["all"],
+        "start_date": start_date,
+        **overrides.pop("hourly_usage_by_product", {}),
+    }
+    return {
+        "api_key": "benchmark",
+        "application_key": "benchmark",
+        "site": "datadoghq.com",
+        "hourly_usage_by_product": hourly_usage,
+        "estimated_cost": {"start_month": start_month},
+        **overrides,
+    }
+
+
+def _run(scenario: Scenario, url: str, cafile: Optional[str]) -> Dict[str, float]:
+    import requests
+    from airbyte_cdk.entrypoint import AirbyteEntrypoint
+    from airbyte_cdk.models import ConfiguredAirbyteCatalog, Type
+
+    from airbyte_source_datadog_usage import source as source_module
+    from airbyte_source_datadog_usage.output import MessageWriter
+
+    timings = Timings()
+
+    class BenchmarkSource(source_module.SourceDatadogUsage):
+        def _api_url(self, config: Mapping[str, Any]) -> str:
+            return url
+
+        def _http_session(self, config: Mapping[str, Any]) -> requests.Session:
+            session = super()._http_session(config)
+            if cafile:
+                # Streams send prepared requests, which skip REQUESTS_CA_BUNDLE.
+                session.verify = cafile
+            return session
+
+        def streams(self, config: Mapping[str, Any]):
+            streams = super().streams(config)
+            # The scheduler binds `time.sleep` when it is created, so wrap it here.
+            rate_limiter = streams[0].rate_limiter
+            rate_limiter._sleep = timings.sleep(rate_limiter._sleep)
+            return streams
+
+    logger = logging.getLogger("airbyte")
+    logger.setLevel(logging.WARNING)
+    config = _config(scenario)
+    source = BenchmarkSource()
+    catalog = ConfiguredAirbyteCatalog.parse_obj(
+        {
+            "streams": [
+                {
+                    "stream": stream.dict(exclude_unset=True),
+                    "sync_mode": "incremental",
+                    "destination_sync_mode": "append",
+                }
+                for stream in source.discover(logger, config).streams
+            ]
+        }
+    )
+
+    with ExitStack() as patches:
+        patches.enter_context(mock.patch("time.sleep", timings.sleep(time.sleep)))
+        patches.enter_context(
+            mock.patch.object(
+                requests.Session, "send", timings.send(requests.Session.send)
+            )
+        )
+        try:
+            import httpx
+        except ImportError:
+            pass
+        else:
+            patches.enter_context(
+                mock.patch.object(
+                    httpx.AsyncClient,
+                    "send",
+                    timings.async_send(httpx.AsyncClient.send),
+                )
+            )
+        for stream_class in (
+            source_module.HourlyUsageByProductStream,
+            source_module.EstimatedCostStream,
+        ):
+            for method in ("parse_response", "next_page_token"):
+                patches.enter_context(
+                    mock.patch.object(
+                        stream_class,
+                        method,
+                        timings.parse(getattr(stream_class, method)),
+                    )
+                )
+
+        records = 0
+        started = time.perf_counter()
+        with open(os.devnull, "wb") as output, MessageWriter(output) as writer:
+            ok, error = source.check_connection(logger, config)
+            if not ok:
+                raise RuntimeError(f"check failed: {error}")
+            for message in source.read(logger, config, catalog, None):
+                writer.write(AirbyteEntrypoint.airbyte_message_to_string(message))
+                records += message.type == Type.RECORD
+        wall = time.perf_counter() - started
+
+    return {
+        "records": records,
+        "records_per_sec": records / wall,
+        "bytes_per_sec": timings.bytes / wall,
+        # ru_maxrss is in KiB on Linux and in bytes on macOS.
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / (1024**2 if sys.platform == "darwin" else 1024),
+        "wall": wall,
+        **timings.seconds,
+    }
+
+
+def _run_in_child(
+    scenario: Scenario, url: str, cafile: Optional[str], results: Any
+) -> None:
+    if cafile:
+        # The simulator's self-signed certificate, when it is served over TLS.
+        os.environ["REQUESTS_CA_BUNDLE"] = os.environ["SSL_CERT_FILE"] = cafile
+    results.send(_run(scenario, url, cafile))
+    results.close()
+
+
+def run_scenario(scenario: Scenario) -> Dict[str, float]:
+    """Runs `scenario` in a fresh process, so peak RSS and caches are its own."""
+    context = multiprocessing.get_context("spawn")
+    with Simulator(scenario.simulator) as simulator:
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(
+            target=_run_in_child,
+            args=(scenario, simulator.url, simulator.cafile, sender),
+        )
+        process.start()
+        sender.close()
+        try:
+            result = receiver.recv()
+        except EOFError:
+            raise RuntimeError("the benchmark process failed") from None
+        finally:
+            process.join()
+    return result
+
+
+def _report(
+    name: str, result: Mapping[str, float], baseline: Optional[Mapping[str, float]]
+) -> None:
+    print(f"{name}: {result['records']:.0f} records in {result['wall']:.2f}s")
+    for metric in METRICS:
+        line = f"  {metric:>16}: {result[metric]:>14,.1f}"
+        if baseline and metric in baseline:
+            change = result[metric] / baseline[metric] - 1
+            line += f"  (baseline {baseline[metric]:,.1f}, {change:+.1%})"
+        print(line)
+    phases = ", ".join(f"{phase} {result[phase]:.2f}s" for phase in TIMINGS[1:])
+    other = result["wall"] - sum(result[phase] for phase in TIMINGS[1:])
+    if other > 0:
+        # Record building, serialization and CDK bookkeeping.
+        phases += f", other {other:.2f}s"
+    print(f"  {'time':>16}: {phases}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--scenario", choices=sorted(SCENARIOS), action="append", dest="scenarios"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--pages", type=int, help="pages per hourly usage slice")
+    parser.add_argument("--records", type=int, help="records per page")
+    parser.add_argument("--latency-ms", type=float)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=0.25,
+        help="fail when records/sec drops by more than this fraction of the baseline",
+    )
+    args = parser.parse_args()
+
+    overrides = {
+        key: value
+        for key, value in (
+            ("pages", args.pages),
+            ("records", args.records),
+            ("latency_ms", args.latency_ms),
+        )
+        if value is not None
+    }
+    baselines = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+    results = {}
+    regressions = []
+    for name in args.scenarios or list(SCENARIOS):
+        scenario = SCENARIOS[name]
+        scenario = replace(scenario, simulator=replace(scenario.simulator, **overrides))
+        runs = [run_scenario(scenario) for _ in range(args.repeat)]
+        results[name] = result = min(runs, key=lambda run: run["wall"])
+        baseline = baselines.get("scenarios", {}).get(name)
+        _report(name, result, baseline)
+        if baseline and result["records_per_sec"] < baseline["records_per_sec"] * (
+            1 - args.max_regression
+        ):
+            regressions.append(name)
+
+    if args.save_baseline:
+        baselines.setdefault("scenarios", {}).update(
+            {
+                name: {key: round(value, 3) for key, value in result.items()}
+                for name, result in results.items()
+            }
+        )
+        baselines["environment"] = {
+            "python": platform.python_version(),
+            "platform": platform.platform(terse=True),
+        }
+        BASELINE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {BASELINE}")
+    elif regressions:
+        sys.exit(f"records/sec regressed for: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
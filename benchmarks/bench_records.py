@@ -0,0 +1,130 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+"""
+Micro-benchmark of hourly usage record construction.
+
+`before` rebuilds every record and every measurement dict, as
+`parse_response` used to. `nested`, `flat` and `wide` go through
+`HourlyUsageByProductStream.parse_response` in each output format. Pages are
+decoded before timing and all records are kept alive, like a buffered slice;
+the benchmark reports construction throughput, garbage collections, the
+memory the records hold once their pages are released and their size as JSON.
+
+    python -m benchmarks.bench_records --pages 20 --records 500
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import requests
+
+from airbyte_source_datadog_usage import decoding
+from airbyte_source_datadog_usage.source import HourlyUsageByProductStream
+
+from .pages import hourly_usage_page
+
+
+def decoded_response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    decoding.response_json(response)
+    return response
+
+
+def parse_before(response: requests.Response):
+    for record in decoding.response_json(response).get("data", []):
+        attributes = record["attributes"]
+        yield {
+            "timestamp": attributes["timestamp"],
+            "product_family": attributes["product_family"],
+            "org_name": attributes["org_name"],
+            "measurements": [
+                {"usage_type": m["usage_type"], "value": m["value"]}
+                for m in attributes["measurements"]
+                if m["value"] is not None
+            ],
+            "type": record["type"],
+        }
+
+
+def measure(parse, bodies, repeat):
+    best = None
+    for _ in range(repeat):
+        # Pages are decoded up front: only record construction is timed.
+        responses = [decoded_response(body) for body in bodies]
+        gc.collect()
+        collections = sum(stats["collections"] for stats in gc.get_stats())
+        started = time.perf_counter()
+        records = [record for response in responses for record in parse(response)]
+        elapsed = time.perf_counter() - started
+        collections = (
+            sum(stats["collections"] for stats in gc.get_stats()) - collections
+        )
+        if best is None or elapsed < best[1]:
+            best = (len(records), elapsed, collections)
+        del records, responses
+
+    # The memory held by the records once their pages have been released.
+    gc.collect()
+    tracemalloc.start()
+    records = [record for body in bodies for record in parse(decoded_response(body))]
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    serialized = sum(len(json.dumps(record)) for record in records)
+    return (*best, held, serialized)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--records", type=int, default=500)
+    parser.add_argument("--measurements", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    bodies = [
+        json.dumps(
+            hourly_usage_page(records=args.records, measurements=args.measurements)
+        ).encode()
+        for _ in range(args.pages)
+    ]
+    source_records = args.pages * args.records
+
+    def stream(output_format):
+        return HourlyUsageByProductStream(
+            api_key="",
+            application_key="",
+            site="datadoghq.com",
+            product_families=["all"],
+            start_date="2024-01-01T00",
+            output_format=output_format,
+        ).parse_response
+
+    print(
+        f"{args.pages} pages of {args.records} records x {args.measurements} measurements"
+    )
+    for name, parse in (
+        ("before", parse_before),
+        ("nested", stream("nested")),
+        ("flat", stream("flat")),
+        ("wide", stream("wide")),
+    ):
+        rows, elapsed, collections, held, serialized = measure(
+            parse, bodies, args.repeat
+        )
+        print(
+            f"{name:>6}: {source_records / elapsed:>10,.0f} API records/s, "
+            f"{rows:>7} rows, {collections:>4} GC runs, {held / 2**20:6.1f} MiB held, "
+            f"{serialized / 2**20:6.1f} MiB as JSON"
+        )
+
+
+if __name__ == "__main__":
+    main()
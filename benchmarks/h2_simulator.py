@@ -0,0 +1,33 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+"""
+The Datadog usage API simulator served over TLS, with HTTP/2.
+
+The TLS and HTTP/2 serving is shared with the unit tests, in
+`unit_tests.h2_server`: clients that offer h2 over ALPN get a single
+multiplexed connection, others are served HTTP/1.1, and the self-signed
+certificate of the server is written to `cafile` for clients to trust.
+
+    python -m benchmarks.simulator --port 8127 --http2
+"""
+
+from typing import Optional, Sequence, Tuple
+
+from unit_tests.h2_server import H2ServerMixin
+
+from .simulator import SimulatorOptions, SimulatorServer
+
+
+class H2SimulatorServer(H2ServerMixin, SimulatorServer):
+    """A `SimulatorServer` over TLS that negotiates one of `protocols` with ALPN."""
+
+    def __init__(
+        self,
+        address: Tuple[str, int],
+        options: SimulatorOptions,
+        protocols: Sequence[str] = ("h2", "http/1.1"),
+        certificate: Optional[Tuple[str, str]] = None,
+    ):
+        super().__init__(address, options, protocols=protocols, certificate=certificate)
@@ -0,0 +1,47 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+"""Synthetic Datadog usage API payloads shared by the benchmarks."""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+PRODUCT_FAMILIES = ["infra_hosts", "logs", "timeseries", "rum", "synthetics_api"]
+
+
+def hourly_usage_page(
+    records: int = 500,
+    measurements: int = 30,
+    start: datetime = datetime(2024, 1, 1, tzinfo=timezone.utc),
+    next_record_id: Optional[str] = None,
+    product_families: List[str] = PRODUCT_FAMILIES,
+) -> Dict[str, Any]:
+    data = []
+    for index in range(records):
+        product_family = product_families[index % len(product_families)]
+        timestamp = start + timedelta(hours=index // len(product_families))
+        data.append(
+            {
+                "attributes": {
+                    "account_name": "benchmark_account",
+                    "account_public_id": "abc123",
+                    "measurements": [
+                        {
+                            "usage_type": f"{product_family}_usage_{m}",
+                            "value": None if m % 7 == 0 else index * m,
+                        }
+                        for m in range(measurements)
+                    ],
+                    "org_name": "benchmark_org",
+                    "product_family": product_family,
+                    "public_id": "def456",
+                    "region": "us1",
+                    "timestamp": timestamp.isoformat(),
+                },
+                "id": f"{index:024x}",
+                "type": "usage_timeseries",
+            }
+        )
+    meta = {"pagination": {"next_record_id": next_record_id}}
+    return {"data": data, "meta": meta}
@@ -0,0 +1,263 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+"""
+Local stand-in for the Datadog usage API endpoints the source calls.
+
+Serves `/api/v1/validate`, `/api/v2/usage/hourly_usage` and
+`/api/v2/usage/estimated_cost` with synthetic pages of configurable size and
+count, optional per-request latency, gzip bodies, `X-RateLimit-*` headers and
+injected 429 responses. With `--http2` it is served over TLS, with HTTP/2 (see
+`benchmarks.h2_simulator`).
+
+    python -m benchmarks.simulator --port 8126 --pages 4 --records 500
+"""
+
+import argparse
+import gzip
+import json
+import multiprocessing
+import threading
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Mapping, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from .pages import PRODUCT_FAMILIES, hourly_usage_page
+
+
+@dataclass
+class SimulatorOptions:
+    pages: int = 4
+    records: int = 500
+    measurements: int = 30
+    latency_ms: float = 0.0
+    throttle_every: int = 0
+    throttle_reset: float = 0.05
+    rate_limit: int = 100_000
+    rate_limit_period: int = 60
+    gzip: bool = True
+    http2: bool = False
+
+
+@lru_cache(maxsize=1024)
+def _hourly_usage_body(
+    start: str, page: int, records: int, measurements: int, last: bool
+) -> bytes:
+    window_start = datetime.strptime(start[:13], "%Y-%m-%dT%H").replace(
+        tzinfo=timezone.utc
+    )
+    return json.dumps(
+        hourly_usage_page(
+            records=records,
+            measurements=measurements,
+            start=window_start
+            + timedelta(hours=page * records // len(PRODUCT_FAMILIES)),
+            next_record_id=None if last else str(page + 1),
+        )
+    ).encode()
+
+
+@lru_cache(maxsize=256)
+def _estimated_cost_body(start_month: str) -> bytes:
+    month = start_month or datetime.now(timezone.utc).strftime("%Y-%m")
+    charges = [
+        {
+            "product_name": product_family,
+            "charge_type": charge_type,
+            "cost": 100.0,
+            "last_aggregation_function": "sum",
+        }
+        for product_family in PRODUCT_FAMILIES
+        for charge_type in ("committed", "on_demand", "total")
+    ]
+    record = {
+        "attributes": {
+            "date": f"{month}-01T00:00:00+00:00",
+            "org_name": "benchmark_org",
+            "total_cost": 100.0 * len(charges),
+            "charges": charges,
+        },
+        "id": "0",
+        "type": "cost_by_org",
+    }
+    return json.dumps({"data": [record]}).encode()
+
+
+@lru_cache(maxsize=1024)
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=1)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "SimulatorServer"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        status, headers, body = self.server.response(
+            self.path, self.headers.get("Accept-Encoding", "")
+        )
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class SimulatorServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], options: SimulatorOptions):
+        super().__init__(address, _Handler)
+        self.options = options
+        self._lock = threading.Lock()
+        self._requests = 0
+        self._window_start = time.monotonic()
+        self._window_requests = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def response(
+        self, path: str, accept_encoding: str = ""
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        """The status, headers and body of the response to a GET of `path`."""
+        url = urlsplit(path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        status, body = self.respond(url.path, query)
+        headers = {"Content-Type": "application/json"}
+        headers.update(self.rate_limit_headers(status))
+        if self.options.gzip and "gzip" in accept_encoding and body:
+            body = _gzip(body)
+            headers["Content-Encoding"] = "gzip"
+        headers["Content-Length"] = str(len(body))
+        return status, headers, body
+
+    def respond(self, path: str, query: Mapping[str, str]) -> Tuple[int, bytes]:
+        options = self.options
+        if options.latency_ms:
+            time.sleep(options.latency_ms / 1000)
+        with self._lock:
+            self._requests += 1
+            throttled = (
+                options.throttle_every and self._requests % options.throttle_every == 0
+            )
+        if throttled:
+            return 429, b'{"errors": ["Rate limit exceeded"]}'
+
+        if path == "/api/v1/validate":
+            return 200, b'{"valid": true}'
+        if path == "/api/v2/usage/hourly_usage":
+            page = int(query.get("page[next_record_id]", 0))
+            body = _hourly_usage_body(
+                query.get("filter[timestamp][start]", "2024-01-01T00"),
+                page,
+                options.records,
+                options.measurements,
+                page + 1 >= options.pages,
+            )
+            return 200, body
+        if path == "/api/v2/usage/estimated_cost":
+            return 200, _estimated_cost_body(query.get("start_month", ""))
+        return 404, b'{"errors": ["Not found"]}'
+
+    def rate_limit_headers(self, status: int) -> Dict[str, str]:
+        options = self.options
+        with self._lock:
+            elapsed = time.monotonic() - self._window_start
+            if elapsed >= options.rate_limit_period:
+                self._window_start += elapsed - elapsed % options.rate_limit_period
+                self._window_requests = 0
+                elapsed %= options.rate_limit_period
+            self._window_requests += 1
+            remaining = max(options.rate_limit - self._window_requests, 0)
+        reset = (
+            options.throttle_reset
+            if status == 429
+            else options.rate_limit_period - elapsed
+        )
+        return {
+            "X-RateLimit-Limit": str(options.rate_limit),
+            "X-RateLimit-Period": str(options.rate_limit_period),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": f"{reset:.3f}",
+        }
+
+
+def make_server(options: SimulatorOptions, port: int) -> SimulatorServer:
+    if options.http2:
+        from .h2_simulator import H2SimulatorServer
+
+        return H2SimulatorServer(("127.0.0.1", port), options)
+    return SimulatorServer(("127.0.0.1", port), options)
+
+
+def _serve(options: SimulatorOptions, port: int, ready: Any) -> None:
+    server = make_server(options, port)
+    ready.send((server.url, getattr(server, "cafile", None)))
+    ready.close()
+    server.serve_forever()
+
+
+class Simulator:
+    """
+    Runs a `SimulatorServer` in a child process, so that generating and sending
+    pages does not compete with the source under test for the GIL or count towards
+    its peak RSS. `cafile` is the certificate to trust when it is served over TLS.
+    """
+
+    def __init__(self, options: Optional[SimulatorOptions] = None, port: int = 0):
+        self.options = options or SimulatorOptions()
+        self.port = port
+        self.url: Optional[str] = None
+        self.cafile: Optional[str] = None
+        self._process: Optional[multiprocessing.Process] = None
+
+    def __enter__(self) -> "Simulator":
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        self._process = context.Process(
+            target=_serve, args=(self.options, self.port, sender), daemon=True
+        )
+        self._process.start()
+        self.url, self.cafile = receiver.recv()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._process.terminate()
+        self._process.join()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8126)
+    for name, default in asdict(SimulatorOptions()).items():
+        flag = "--" + name.replace("_", "-")
+        if isinstance(default, bool):
+            parser.add_argument(flag, action=argparse.BooleanOptionalAction)
+        else:
+            parser.add_argument(flag, type=type(default), default=default)
+    args = vars(parser.parse_args())
+    port = args.pop("port")
+    options = SimulatorOptions(
+        **{key: value for key, value in args.items() if value is not None}
+    )
+
+    server = make_server(options, port)
+    print(f"Serving the Datadog usage API simulator on {server.url}")
+    if options.http2:
+        print(f"Its certificate is in {server.cafile}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
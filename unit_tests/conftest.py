@@ -0,0 +1,72 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+from datetime import datetime
+
+import pytest
+from airbyte_cdk.models import ConfiguredAirbyteCatalog
+
+HOURLY_USAGE_URL = "https://api.datadoghq.com/api/v2/usage/hourly_usage"
+
+
+class FakeClock:
+    """A monotonic clock that moves when told to, or by `tick` on every reading."""
+
+    def __init__(self, tick: float = 0.0):
+        self.now = 0.0
+        self.tick = tick
+        self.sleeps = []
+
+    def __call__(self) -> float:
+        self.now += self.tick
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def configured_catalog(stream_name: str) -> ConfiguredAirbyteCatalog:
+    return ConfiguredAirbyteCatalog.parse_obj(
+        {
+            "streams": [
+                {
+                    "stream": {
+                        "name": stream_name,
+                        "json_schema": {},
+                        "supported_sync_modes": ["incremental"],
+                    },
+                    "sync_mode": "incremental",
+                    "destination_sync_mode": "append",
+                }
+            ]
+        }
+    )
+
+
+@pytest.fixture
+def frozen_now(mocker):
+    """Freezes the clock of the source: `frozen_now(2024, 1, 3, 5, 30)`."""
+
+    def freeze(*args: int) -> None:
+        frozen = datetime(*args)
+
+        class FrozenDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return frozen.replace(tzinfo=tz)
+
+        mocker.patch("airbyte_source_datadog_usage.source.datetime", FrozenDatetime)
+
+    return freeze
+
+
+@pytest.fixture
+def hourly_usage_catalog() -> ConfiguredAirbyteCatalog:
+    return configured_catalog("hourly_usage_by_product_stream")
+
+
+@pytest.fixture
+def estimated_cost_catalog() -> ConfiguredAirbyteCatalog:
+    return configured_catalog("estimated_cost_stream")
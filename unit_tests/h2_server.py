@@ -0,0 +1,328 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+"""
+A local Datadog usage API served over TLS, with HTTP/2.
+
+Clients that offer h2 over ALPN get a single multiplexed connection, on which
+each request is answered from a thread of its own, so that slow responses do
+not hold up the others. Other clients are served HTTP/1.1. The server presents a
+self-signed certificate for `localhost` and `127.0.0.1`, written to `cafile`
+for clients to trust. The benchmarks serve their simulator with `H2ServerMixin`.
+"""
+
+import ipaddress
+import json
+import queue
+import select
+import ssl
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+
+# How long the connection loop waits for a frame before sending ready responses.
+_POLL_INTERVAL = 0.002
+
+
+def self_signed_certificate(directory: Path) -> Tuple[str, str]:
+    """Writes a certificate for `localhost` and `127.0.0.1` and its key to `directory`."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.now(timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(minutes=5))
+        .not_valid_after(now + timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName(
+                [
+                    x509.DNSName("localhost"),
+                    x509.IPAddress(ipaddress.ip_address("127.0.0.1")),
+                ]
+            ),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .add_extension(
+            x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False
+        )
+        .sign(key, hashes.SHA256())
+    )
+    certfile, keyfile = Path(directory, "cert.pem"), Path(directory, "key.pem")
+    certfile.write_bytes(certificate.public_bytes(serialization.Encoding.PEM))
+    keyfile.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return str(certfile), str(keyfile)
+
+
+class H2ServerMixin:
+    """
+    Serves a `ThreadingHTTPServer` over TLS, negotiating one of `protocols` with ALPN.
+
+    HTTP/2 requests are answered with `response(path, accept_encoding)`, which
+    returns the status, headers and body; HTTP/1.1 connections are handled by
+    the handler class of the server. `connections` counts the connections
+    accepted for each negotiated protocol.
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        protocols: Sequence[str] = ("h2", "http/1.1"),
+        certificate: Optional[Tuple[str, str]] = None,
+        **kwargs: Any,
+    ):
+        if certificate is None:
+            self._certificate_directory = tempfile.TemporaryDirectory()
+            certificate = self_signed_certificate(self._certificate_directory.name)
+        self.cafile = certificate[0]
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(*certificate)
+        self.context.set_alpn_protocols(list(protocols))
+        self.connections: Counter = Counter()
+        self._connections_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"https://{host}:{port}"
+
+    def get_request(self) -> Tuple[ssl.SSLSocket, Any]:
+        sock, address = super().get_request()
+        # The handshake happens in the thread of the connection, not the accept loop.
+        return (
+            self.context.wrap_socket(
+                sock, server_side=True, do_handshake_on_connect=False
+            ),
+            address,
+        )
+
+    def finish_request(self, request: ssl.SSLSocket, client_address: Any) -> None:
+        request.settimeout(10)
+        try:
+            request.do_handshake()
+        except (OSError, ssl.SSLError):
+            return
+        protocol = request.selected_alpn_protocol() or "http/1.1"
+        with self._connections_lock:
+            self.connections[protocol] += 1
+        if protocol == "h2":
+            self._serve_h2(request)
+        else:
+            super().finish_request(request, client_address)
+
+    def _serve_h2(self, sock: ssl.SSLSocket) -> None:
+        # Only this thread touches the socket and the h2 state machine; request
+        # threads hand their responses back through `ready`.
+        connection = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        connection.initiate_connection()
+        ready: "queue.SimpleQueue[Tuple[int, int, Dict[str, str], bytes]]" = (
+            queue.SimpleQueue()
+        )
+        bodies: Dict[int, memoryview] = {}
+        sock.settimeout(None)
+        try:
+            sock.sendall(connection.data_to_send())
+            while True:
+                # Decrypted bytes may be pending in the TLS layer, unseen by select.
+                if sock.pending() or select.select([sock], [], [], _POLL_INTERVAL)[0]:
+                    data = sock.recv(1 << 16)
+                    if not data:
+                        return
+                    for event in connection.receive_data(data):
+                        if isinstance(event, h2.events.RequestReceived):
+                            threading.Thread(
+                                target=self._respond_h2,
+                                args=(event.stream_id, dict(event.headers), ready),
+                                daemon=True,
+                            ).start()
+                        elif isinstance(event, h2.events.StreamReset):
+                            bodies.pop(event.stream_id, None)
+                        elif isinstance(event, h2.events.ConnectionTerminated):
+                            return
+
+                while not ready.empty():
+                    stream_id, status, headers, body = ready.get()
+                    try:
+                        connection.send_headers(
+                            stream_id,
+                            [(":status", str(status)), *headers.items()],
+                            end_stream=not body,
+                        )
+                    except h2.exceptions.StreamClosedError:
+                        continue
+                    if body:
+                        bodies[stream_id] = memoryview(body)
+                for stream_id in list(bodies):
+                    self._send_body(connection, stream_id, bodies)
+                sock.sendall(connection.data_to_send())
+        except (OSError, h2.exceptions.ProtocolError):
+            return
+
+    def _respond_h2(
+        self,
+        stream_id: int,
+        headers: Dict[str, str],
+        ready: "queue.SimpleQueue[Tuple[int, int, Dict[str, str], bytes]]",
+    ) -> None:
+        status, response_headers, body = self.response(
+            headers[":path"], headers.get("accept-encoding", "")
+        )
+        ready.put(
+            (
+                stream_id,
+                status,
+                {name.lower(): value for name, value in response_headers.items()},
+                body,
+            )
+        )
+
+    @staticmethod
+    def _send_body(
+        connection: h2.connection.H2Connection,
+        stream_id: int,
+        bodies: Dict[int, memoryview],
+    ) -> None:
+        """Sends as much of the body of `stream_id` as flow control allows."""
+        body = bodies[stream_id]
+        try:
+            while body:
+                size = min(
+                    connection.local_flow_control_window(stream_id),
+                    connection.max_outbound_frame_size,
+                    len(body),
+                )
+                if size <= 0:
+                    break
+                connection.send_data(
+                    stream_id, body[:size].tobytes(), end_stream=size == len(body)
+                )
+                body = body[size:]
+        except h2.exceptions.StreamClosedError:
+            body = None
+        if body:
+            bodies[stream_id] = body
+        else:
+            del bodies[stream_id]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        status, headers, body = self.server.response(self.path)
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class UsageH2Server(H2ServerMixin, ThreadingHTTPServer):
+    """
+    Serves `/api/v1/validate` and `pages` pages of `records` hourly usage records
+    for each window, after `latency` seconds. Every `throttle_every`-th request is
+    answered with a 429 instead.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        pages: int = 2,
+        records: int = 20,
+        latency: float = 0.02,
+        throttle_every: int = 0,
+        **kwargs: Any,
+    ):
+        super().__init__(("127.0.0.1", 0), _Handler, **kwargs)
+        self.pages = pages
+        self.records = records
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def response(
+        self, path: str, accept_encoding: str = ""
+    ) -> Tuple[int, Dict[str, str], bytes]:
+        time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+            throttled = self.throttle_every and self.requests % self.throttle_every == 0
+        headers = {
+            "Content-Type": "application/json",
+            "X-RateLimit-Limit": "1000",
+            "X-RateLimit-Remaining": "0" if throttled else "999",
+            "X-RateLimit-Reset": "0.05" if throttled else "60",
+        }
+        url = urlsplit(path)
+        if throttled:
+            status, body = 429, {"errors": ["Rate limit exceeded"]}
+        elif url.path == "/api/v1/validate":
+            status, body = 200, {"valid": True}
+        elif url.path == "/api/v2/usage/hourly_usage":
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            status, body = 200, self._hourly_usage_page(query)
+        else:
+            status, body = 404, {"errors": ["Not found"]}
+        payload = json.dumps(body).encode()
+        headers["Content-Length"] = str(len(payload))
+        return status, headers, payload
+
+    def _hourly_usage_page(self, query: Dict[str, str]) -> Dict[str, Any]:
+        start = datetime.strptime(
+            query["filter[timestamp][start]"][:13], "%Y-%m-%dT%H"
+        ).replace(tzinfo=timezone.utc)
+        page = int(query.get("page[next_record_id]", 0))
+        return {
+            "data": [
+                {
+                    "attributes": {
+                        "timestamp": (start + timedelta(hours=index)).isoformat(),
+                        "product_family": "infra_hosts",
+                        "org_name": "test_org",
+                        "measurements": [{"usage_type": "host_count", "value": 1}],
+                    },
+                    "type": "usage_timeseries",
+                }
+                for index in range(page * self.records, (page + 1) * self.records)
+            ],
+            "meta": {
+                "pagination": {
+                    "next_record_id": str(page + 1) if page + 1 < self.pages else None
+                }
+            },
+        }
@@ -0,0 +1,119 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from airbyte_cdk.models import SyncMode
+
+from airbyte_source_datadog_usage.source import HourlyUsageByProductStream
+
+httpx = pytest.importorskip("httpx")
+
+
+class HourlyUsageHandler(BaseHTTPRequestHandler):
+    """Serves two pages per time window and a 429 on the first request."""
+
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        with self.lock:
+            self.requests.append(query)
+            first_request = len(self.requests) == 1
+        if first_request:
+            self._send(429, {"errors": ["rate limited"]}, {"X-RateLimit-Reset": "0.01"})
+            return
+
+        start = query["filter[timestamp][start]"][0]
+        page = 1 if "page[next_record_id]" in query else 0
+        body = {
+            "data": [
+                {
+                    "attributes": {
+                        "timestamp": f"{start}:{page:02d}:00+00:00",
+                        "product_family": "infra_hosts",
+                        "org_name": "test_org",
+                        "measurements": [{"usage_type": "host_count", "value": 1}],
+                    },
+                    "type": "usage_timeseries",
+                }
+            ],
+            "meta": {"pagination": {"next_record_id": None if page else "next"}},
+        }
+        self._send(
+            200,
+            body,
+            {
+                "X-RateLimit-Limit": "100",
+                "X-RateLimit-Remaining": "90",
+                "X-RateLimit-Reset": "30",
+            },
+        )
+
+    def _send(self, status, body, headers):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    HourlyUsageHandler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), HourlyUsageHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_async_engine_reads_slices_in_order(server):
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["infra_hosts"],
+        start_date="2024-01-01T00",
+        max_concurrency=4,
+        read_engine="async",
+    )
+    stream._url_base = server
+    slices = [
+        {"start": f"2024-01-0{day}T00", "end": f"2024-01-0{day + 1}T00"}
+        for day in range(1, 6)
+    ]
+    stream._prefetch_slices(slices, stream_state={})
+
+    records = []
+    for stream_slice in slices:
+        records.extend(
+            stream.read_records(
+                sync_mode=SyncMode.incremental,
+                stream_slice=stream_slice,
+                stream_state={},
+            )
+        )
+
+    assert [record["timestamp"] for record in records] == [
+        f"2024-01-0{day}T00:{page:02d}:00+00:00"
+        for day in range(1, 6)
+        for page in range(2)
+    ]
+    # one retried 429 plus two pages per slice
+    assert len(HourlyUsageHandler.requests) == 11
+    assert stream.rate_limiter.remaining is not None
+    assert stream._slice_fetcher._loop is None
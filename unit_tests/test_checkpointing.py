@@ -0,0 +1,165 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import logging
+import threading
+
+from airbyte_cdk.models import SyncMode, Type
+
+from airbyte_source_datadog_usage.checkpointing import CheckpointPolicy
+from airbyte_source_datadog_usage.source import (
+    HourlyUsageByProductStream,
+    SourceDatadogUsage,
+)
+
+from .conftest import HOURLY_USAGE_URL, FakeClock
+
+HOURLY_USAGE_PAGE = {
+    "data": [
+        {
+            "attributes": {
+                "measurements": [{"usage_type": "host_count", "value": 1}],
+                "org_name": "test_org",
+                "product_family": "infra_hosts",
+                "timestamp": f"2024-01-01T0{hour}:00:00+00:00",
+            },
+            "type": "usage_timeseries",
+        }
+        for hour in range(5)
+    ],
+    "meta": {},
+}
+
+
+def test_checkpoints_on_elapsed_time():
+    clock = FakeClock()
+    policy = CheckpointPolicy(interval_seconds=30, clock=clock)
+    clock.now = 29
+    assert not policy.due()
+    clock.now = 30
+    assert policy.due()
+    clock.now = 59
+    assert not policy.due()
+    clock.now = 60
+    assert policy.due()
+
+
+def test_checkpoints_on_downloaded_bytes():
+    policy = CheckpointPolicy(interval_seconds=None, interval_bytes=1000)
+    policy.add_bytes(999)
+    assert not policy.due()
+    policy.add_bytes(1)
+    assert policy.due()
+    assert not policy.due()
+
+
+def test_bytes_added_from_several_threads_are_all_counted():
+    policy = CheckpointPolicy(interval_seconds=None, interval_bytes=8 * 10_000)
+
+    def add_bytes():
+        for _ in range(10_000):
+            policy.add_bytes(1)
+
+    threads = [threading.Thread(target=add_bytes) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert policy.due()
+
+
+def test_checkpoints_on_records():
+    policy = CheckpointPolicy(interval_seconds=None, interval_records=3)
+    assert [policy.due() for _ in range(6)] == [False, False, True] * 2
+
+
+def test_reset_starts_a_new_interval():
+    clock = FakeClock()
+    policy = CheckpointPolicy(interval_seconds=30, interval_records=2, clock=clock)
+    policy.due()
+    clock.now = 20
+    policy.reset()
+    clock.now = 40
+    assert not policy.due()
+    assert policy.due()
+
+
+def test_from_config():
+    policy = CheckpointPolicy.from_config({})
+    assert (
+        policy.interval_seconds,
+        policy.interval_bytes,
+        policy.interval_records,
+    ) == (60, None, None)
+
+    policy = CheckpointPolicy.from_config(
+        {
+            "checkpointing": {
+                "interval_seconds": 0,
+                "interval_mb": 0.5,
+                "interval_records": 1000,
+            }
+        }
+    )
+    assert (
+        policy.interval_seconds,
+        policy.interval_bytes,
+        policy.interval_records,
+    ) == (None, 2**19, 1000)
+
+
+def test_read_checkpoints_within_slices(
+    frozen_now, hourly_usage_catalog, requests_mock
+):
+    frozen_now(2024, 1, 1, 4, 30)
+    requests_mock.get(HOURLY_USAGE_URL, json=HOURLY_USAGE_PAGE)
+    config = {
+        "api_key": "test_api_key",
+        "application_key": "test_app_key",
+        "site": "datadoghq.com",
+        "hourly_usage_by_product": {
+            "product_families": ["infra_hosts"],
+            "start_date": "2024-01-01T00",
+        },
+        "checkpointing": {"interval_seconds": 0, "interval_records": 2},
+    }
+    messages = SourceDatadogUsage().read(
+        logging.getLogger("airbyte"), config, hourly_usage_catalog, None
+    )
+
+    cursors = [
+        message.state.stream.stream_state.timestamp
+        for message in messages
+        if message.type == Type.STATE
+    ]
+    # After records 2 and 4, then at the end of the only slice.
+    assert cursors == [
+        "2024-01-01T01:00:00+00:00",
+        "2024-01-01T03:00:00+00:00",
+        "2024-01-01T04:00:00+00:00",
+    ]
+
+
+def test_reading_the_checkpoint_interval_does_not_count_records(requests_mock):
+    requests_mock.get(HOURLY_USAGE_URL, json=HOURLY_USAGE_PAGE)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["infra_hosts"],
+        start_date="2024-01-01T00",
+        checkpoint_policy=CheckpointPolicy(interval_seconds=None, interval_records=2),
+    )
+    stream_slice = {"start": "2024-01-01T00", "end": "2024-01-02T00"}
+
+    intervals = [
+        [stream.state_checkpoint_interval for _ in range(3)]
+        for _ in stream.read_records(
+            sync_mode=SyncMode.incremental, stream_slice=stream_slice, stream_state={}
+        )
+    ]
+
+    assert intervals == [[None] * 3, [1] * 3, [None] * 3, [1] * 3, [None] * 3]
+    assert stream.state_checkpoint_interval is None
@@ -0,0 +1,209 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import threading
+import time
+
+import pytest
+from airbyte_cdk.models import SyncMode
+
+from airbyte_source_datadog_usage.concurrency import SliceFetcher, prefetched
+from airbyte_source_datadog_usage.source import HourlyUsageByProductStream
+
+from .conftest import HOURLY_USAGE_URL
+
+
+def test_records_are_returned_in_slice_order():
+    def fetch(stream_slice):
+        # later slices finish first
+        time.sleep(0.01 * (5 - stream_slice["index"]))
+        return [{"index": stream_slice["index"]}]
+
+    slices = [{"index": i} for i in range(5)]
+    fetcher = SliceFetcher(fetch, max_workers=3)
+    fetcher.schedule(slices)
+
+    records = []
+    for stream_slice in slices:
+        assert fetcher.has(stream_slice)
+        records.extend(fetcher.records(stream_slice))
+
+    assert records == [{"index": i} for i in range(5)]
+    assert not fetcher.has(slices[0])
+
+
+def test_fetches_at_most_max_workers_ahead():
+    started = []
+    release = threading.Event()
+
+    def fetch(stream_slice):
+        started.append(stream_slice["index"])
+        release.wait(1)
+        return []
+
+    slices = [{"index": i} for i in range(10)]
+    fetcher = SliceFetcher(fetch, max_workers=2)
+    fetcher.schedule(slices)
+    time.sleep(0.05)
+
+    assert sorted(started) == [0, 1]
+    release.set()
+    for stream_slice in slices:
+        list(fetcher.records(stream_slice))
+    assert sorted(started) == list(range(10))
+
+
+def test_errors_are_raised_in_slice_order():
+    def fetch(stream_slice):
+        if stream_slice["index"] == 1:
+            raise RuntimeError("boom")
+        return [stream_slice]
+
+    slices = [{"index": i} for i in range(3)]
+    fetcher = SliceFetcher(fetch, max_workers=3)
+    fetcher.schedule(slices)
+
+    assert list(fetcher.records(slices[0])) == [slices[0]]
+    with pytest.raises(RuntimeError):
+        list(fetcher.records(slices[1]))
+    assert not fetcher.has(slices[2])
+
+
+def test_prefetched_keeps_order_and_stays_bounded():
+    produced = []
+
+    def items():
+        for index in range(10):
+            produced.append(index)
+            yield index
+
+    iterator = prefetched(items(), depth=2)
+    assert next(iterator) == 0
+    time.sleep(0.05)
+    # One item handed out, two queued and one waiting to be queued.
+    assert produced == [0, 1, 2, 3]
+    assert list(iterator) == list(range(1, 10))
+
+
+def test_prefetched_raises_errors_in_order():
+    def items():
+        yield 1
+        raise RuntimeError("boom")
+
+    iterator = prefetched(items(), depth=2)
+    assert next(iterator) == 1
+    with pytest.raises(RuntimeError):
+        next(iterator)
+
+
+def test_prefetched_stops_the_producer_when_closed():
+    produced = []
+
+    def items():
+        for index in range(100):
+            produced.append(index)
+            yield index
+
+    iterator = prefetched(items(), depth=1)
+    assert next(iterator) == 0
+    iterator.close()
+    time.sleep(0.3)
+    assert len(produced) <= 3
+
+
+def test_stream_requests_next_page_while_emitting_current_one(requests_mock):
+    def hourly_usage(request, context):
+        page = int(request.qs.get("page[next_record_id]", ["0"])[0])
+        return {
+            "data": [
+                {
+                    "attributes": {
+                        "measurements": [],
+                        "org_name": "test_org",
+                        "product_family": "infra_hosts",
+                        "timestamp": f"2024-01-01T0{page}:00:00+00:00",
+                    },
+                    "type": "usage_timeseries",
+                }
+            ],
+            "meta": {
+                "pagination": {"next_record_id": str(page + 1) if page < 2 else None}
+            },
+        }
+
+    requests_mock.get(
+        "https://api.datadoghq.com/api/v2/usage/hourly_usage", json=hourly_usage
+    )
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["infra_hosts"],
+        start_date="2024-01-01T00",
+        prefetch_pages=1,
+    )
+
+    records = stream.read_records(sync_mode=None, stream_state={})
+    first = next(records)
+    deadline = time.monotonic() + 1
+    while requests_mock.call_count < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert requests_mock.call_count >= 2
+    assert [first["timestamp"]] + [record["timestamp"] for record in records] == [
+        "2024-01-01T00:00:00+00:00",
+        "2024-01-01T01:00:00+00:00",
+        "2024-01-01T02:00:00+00:00",
+    ]
+    assert requests_mock.call_count == 3
+
+
+def test_stopping_a_concurrent_read_stops_the_fetcher_threads(
+    frozen_now, requests_mock
+):
+    frozen_now(2024, 1, 10, 5, 30)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["infra_hosts"],
+        start_date="2024-01-01T00",
+        max_concurrency=3,
+    )
+
+    def hourly_usage(request, context):
+        start = request.qs["filter[timestamp][start]"][0].upper()
+        return {
+            "data": [
+                {
+                    "attributes": {
+                        "measurements": [],
+                        "org_name": "test_org",
+                        "product_family": "infra_hosts",
+                        "timestamp": f"{start}:00:00+00:00",
+                    },
+                    "type": "usage_timeseries",
+                }
+            ],
+            "meta": {},
+        }
+
+    requests_mock.get(HOURLY_USAGE_URL, json=hourly_usage)
+
+    slices = stream.stream_slices(sync_mode=SyncMode.incremental, stream_state={})
+    records = stream.read_records(
+        sync_mode=SyncMode.incremental, stream_slice=slices[0], stream_state={}
+    )
+    next(records)
+    records.close()
+
+    fetchers = [
+        thread
+        for thread in threading.enumerate()
+        if thread.name.startswith("slice-fetcher")
+    ]
+    for thread in fetchers:
+        thread.join(1)
+    assert fetchers
+    assert not [thread for thread in fetchers if thread.is_alive()]
+    assert requests_mock.call_count < len(slices)
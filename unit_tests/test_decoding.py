@@ -0,0 +1,106 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import pytest
+import requests
+
+from airbyte_source_datadog_usage import decoding
+from airbyte_source_datadog_usage.source import HourlyUsageByProductStream
+
+
+def make_response(body: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = body
+    return response
+
+
+def test_response_json_decodes_once(mocker):
+    loads = mocker.spy(decoding, "loads")
+    response = make_response(b'{"data": [], "meta": {}}')
+
+    assert decoding.response_json(response) == {"data": [], "meta": {}}
+    assert decoding.response_json(response) == {"data": [], "meta": {}}
+    assert loads.call_count == 1
+
+
+def test_loads_falls_back_to_stdlib(mocker):
+    mocker.patch.object(decoding, "orjson", None)
+    assert decoding.loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+
+
+def test_pagination_and_parsing_share_one_decode(mocker):
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["all"],
+        start_date="2024-01-01T00",
+    )
+    loads = mocker.spy(decoding, "loads")
+    response = make_response(
+        b'{"data": [{"attributes": {"timestamp": "2024-01-01T00:00:00+00:00",'
+        b' "product_family": "logs", "org_name": "org", "measurements": []},'
+        b' "type": "usage_timeseries"}],'
+        b' "meta": {"pagination": {"next_record_id": "abc"}}}'
+    )
+
+    assert len(list(stream.parse_response(response))) == 1
+    assert stream.next_page_token(response) == {"next_record_id": "abc"}
+    assert loads.call_count == 1
+
+
+def test_streaming_parse_yields_records_and_keeps_pagination(requests_mock):
+    pytest.importorskip("ijson")
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["all"],
+        start_date="2024-01-01T00",
+        streaming_parse=True,
+    )
+    url = "https://api.datadoghq.com/api/v2/usage/hourly_usage"
+
+    def page(timestamps, next_record_id):
+        return {
+            "data": [
+                {
+                    "attributes": {
+                        "timestamp": timestamp,
+                        "product_family": "logs",
+                        "org_name": "org",
+                        "measurements": [
+                            {"usage_type": "ingested_events_bytes", "value": 1.5},
+                            {"usage_type": "indexed_events_count", "value": None},
+                        ],
+                    },
+                    "type": "usage_timeseries",
+                }
+                for timestamp in timestamps
+            ],
+            "meta": {"pagination": {"next_record_id": next_record_id}},
+        }
+
+    requests_mock.get(
+        url,
+        [
+            {"json": page(["2024-01-01T00:00:00+00:00"], "abc")},
+            {"json": page(["2024-01-01T01:00:00+00:00"], None)},
+        ],
+    )
+
+    assert stream.request_kwargs(stream_state={})["stream"] is True
+    records = list(stream.read_records(sync_mode=None, stream_state={}))
+    assert records == [
+        {
+            "timestamp": timestamp,
+            "product_family": "logs",
+            "org_name": "org",
+            "measurements": [{"usage_type": "ingested_events_bytes", "value": 1.5}],
+            "type": "usage_timeseries",
+        }
+        for timestamp in ["2024-01-01T00:00:00+00:00", "2024-01-01T01:00:00+00:00"]
+    ]
+    assert requests_mock.request_history[1].qs["page[next_record_id]"] == ["abc"]
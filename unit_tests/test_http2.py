@@ -0,0 +1,192 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import select
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from airbyte_cdk.models import SyncMode
+
+from airbyte_source_datadog_usage.http2 import HTTP2Adapter
+from airbyte_source_datadog_usage.http_session import build_session
+from airbyte_source_datadog_usage.source import HourlyUsageByProductStream
+
+pytest.importorskip("httpx")
+pytest.importorskip("h2")
+pytest.importorskip("cryptography")
+
+from .h2_server import UsageH2Server  # noqa: E402
+
+HTTP2_CONFIG = {"http": {"http2": True}, "max_concurrency": 4}
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def serve(protocols=("h2", "http/1.1")):
+        server = UsageH2Server(protocols=protocols)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+class TunnelingProxyHandler(BaseHTTPRequestHandler):
+    """An HTTPS proxy: relays the bytes of each `CONNECT` tunnel both ways."""
+
+    def do_CONNECT(self):
+        self.server.tunnels.append(self.path)
+        host, port = self.path.rsplit(":", 1)
+        upstream = socket.create_connection((host, int(port)))
+        self.send_response(200)
+        self.end_headers()
+        sockets = [self.connection, upstream]
+        try:
+            while True:
+                for ready in select.select(sockets, [], [], 5)[0]:
+                    data = ready.recv(1 << 16)
+                    if not data:
+                        return
+                    (upstream if ready is self.connection else self.connection).sendall(
+                        data
+                    )
+        finally:
+            upstream.close()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def proxy():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TunnelingProxyHandler)
+    server.daemon_threads = True
+    server.tunnels = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def http2_session(server):
+    session = build_session(HTTP2_CONFIG)
+    session.verify = server.cafile
+    return session
+
+
+def read_hourly_usage(server, session, **kwargs):
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["all"],
+        start_date="2024-01-01T00",
+        session=session,
+        url_base=server.url,
+        max_concurrency=4,
+        **kwargs,
+    )
+    slices = [
+        {"start": f"2024-01-0{day}T00", "end": f"2024-01-0{day + 1}T00"}
+        for day in range(1, 7)
+    ]
+    stream._prefetch_slices(slices, stream_state={})
+    return [
+        record
+        for stream_slice in slices
+        for record in stream.read_records(
+            sync_mode=SyncMode.incremental,
+            stream_slice=stream_slice,
+            stream_state={},
+        )
+    ]
+
+
+@pytest.mark.parametrize("streaming_parse", [False, True])
+def test_concurrent_reads_share_one_http2_connection(serve, streaming_parse):
+    server = serve()
+    session = http2_session(server)
+    assert isinstance(session.get_adapter(server.url), HTTP2Adapter)
+
+    records = read_hourly_usage(server, session, streaming_parse=streaming_parse)
+
+    # two pages of 20 records for each of the six slices
+    assert len(records) == 6 * 2 * 20
+    assert server.connections == {"h2": 1}
+    assert server.requests == 12
+
+
+def test_falls_back_to_http11_when_server_does_not_negotiate_h2(serve):
+    server = serve(protocols=("http/1.1",))
+    session = http2_session(server)
+
+    response = session.get(
+        f"{server.url}/api/v1/validate", timeout=(5, 5), verify=server.cafile
+    )
+    assert response.json() == {"valid": True}
+    assert response.raw.http_version == "HTTP/1.1"
+    assert len(read_hourly_usage(server, session)) == 6 * 2 * 20
+    assert set(server.connections) == {"http/1.1"}
+
+
+def test_leaves_throttled_requests_to_the_stream(serve):
+    server = serve()
+    server.throttle_every = 2
+    session = http2_session(server)
+
+    first = session.get(
+        f"{server.url}/api/v1/validate", timeout=(5, 5), verify=server.cafile
+    )
+    second = session.get(
+        f"{server.url}/api/v1/validate", timeout=(5, 5), verify=server.cafile
+    )
+
+    assert first.raw.http_version == second.raw.http_version == "HTTP/2"
+    # the stream waits for `X-RateLimit-Reset` before it retries
+    assert second.status_code == 429
+    assert second.headers["X-RateLimit-Reset"]
+    assert not second.raw.retries.history
+
+
+@pytest.mark.parametrize("from_environment", [False, True])
+def test_requests_go_through_the_proxy(serve, proxy, monkeypatch, from_environment):
+    server = serve()
+    session = http2_session(server)
+    proxy_url = f"http://127.0.0.1:{proxy.server_address[1]}"
+    monkeypatch.delenv("NO_PROXY", raising=False)
+    monkeypatch.delenv("no_proxy", raising=False)
+    if from_environment:
+        monkeypatch.setenv("HTTPS_PROXY", proxy_url)
+    else:
+        session.proxies = {"https": proxy_url}
+
+    records = read_hourly_usage(server, session)
+
+    assert len(records) == 6 * 2 * 20
+    assert set(proxy.tunnels) == {server.url[len("https://") :]}
+    assert server.connections == {"h2": len(proxy.tunnels)}
+
+
+def test_connection_errors_surface_as_requests_errors():
+    session = build_session({"http": {"http2": True, "max_retries": 0}})
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get("https://127.0.0.1:9/api/v1/validate", timeout=(1, 1))
+
+
+def test_uses_http11_when_h2_is_not_installed(monkeypatch):
+    monkeypatch.setattr(
+        "airbyte_source_datadog_usage.http_session.http2_available", lambda: False
+    )
+    session = build_session(HTTP2_CONFIG)
+    assert isinstance(
+        session.get_adapter("https://api.datadoghq.com"), requests.adapters.HTTPAdapter
+    )
@@ -0,0 +1,79 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from airbyte_source_datadog_usage.http_session import build_session, timeouts
+from airbyte_source_datadog_usage.source import HourlyUsageByProductStream
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    """Answers the first request with a 429 that resets in 0.3s."""
+
+    requested_at = []
+
+    def do_GET(self):
+        self.requested_at.append(time.monotonic())
+        if len(self.requested_at) == 1:
+            status, body = 429, {"errors": ["Rate limit exceeded"]}
+            headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "0.3"}
+        else:
+            status, body = 200, {"data": [], "meta": {}}
+            headers = {"X-RateLimit-Remaining": "99", "X-RateLimit-Reset": "60"}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_build_session_retries_with_jittered_backoff():
+    session = build_session({"http": {"max_retries": 5}, "max_concurrency": 12})
+    adapter = session.get_adapter("https://api.datadoghq.com")
+    retry = adapter.max_retries
+
+    assert retry.total == 5
+    assert retry.backoff_jitter > 0
+    assert {500, 502, 503, 504} <= set(retry.status_forcelist)
+    assert 429 not in retry.status_forcelist
+    assert not retry.raise_on_status
+    assert adapter._pool_maxsize == 12
+    assert session.headers["Accept-Encoding"] == "gzip, deflate"
+
+
+def test_timeouts_defaults():
+    assert timeouts({}) == (10.0, 300.0)
+    assert timeouts({"http": {"read_timeout": 60}}) == (10.0, 60)
+
+
+def test_throttled_requests_wait_for_the_rate_limit_reset():
+    ThrottlingHandler.requested_at = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        stream = HourlyUsageByProductStream(
+            api_key="test_api_key",
+            application_key="test_app_key",
+            site="datadoghq.com",
+            product_families=["all"],
+            start_date="2024-01-01T00",
+            session=build_session({}),
+            url_base=f"http://127.0.0.1:{server.server_address[1]}",
+        )
+        assert list(stream.read_records(sync_mode=None, stream_state={})) == []
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # the session does not retry the 429 itself: the stream waits for the reset
+    first, second = ThrottlingHandler.requested_at
+    assert second - first >= 0.3
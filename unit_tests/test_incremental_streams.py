@@ -1,14 +1,17 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from airbyte_cdk.models import SyncMode
 from pytest import fixture
 
+from airbyte_source_datadog_usage.checkpointing import CheckpointPolicy
 from airbyte_source_datadog_usage.source import (
     EstimatedCostStream,
     HourlyUsageByProductStream,
     IncrementalDatadogUsageStream,
 )
 
+from .conftest import FakeClock
+
 
 @fixture
 def patch_incremental_base_class(mocker):
@@ -51,8 +54,29 @@ def test_source_defined_cursor(patch_incremental_base_class):
 
 
 def test_stream_checkpoint_interval(patch_incremental_base_class):
+    clock = FakeClock()
+    stream = IncrementalDatadogUsageStream(
+        checkpoint_policy=CheckpointPolicy(interval_seconds=60, clock=clock)
+    )
+    stream._read_slice = lambda stream_slice, stream_state: iter([{}, {}])
+    records = stream.read_records(sync_mode=SyncMode.incremental, stream_slice={})
+    clock.now = 60
+    # the decision is taken as each record is read, not when it is looked up
+    assert stream.state_checkpoint_interval is None
+    next(records)
+    assert stream.state_checkpoint_interval == 1
+    assert stream.state_checkpoint_interval == 1
+    next(records)
+    assert stream.state_checkpoint_interval is None
+
+
+def test_get_updated_state_does_not_allocate(patch_incremental_base_class):
     stream = IncrementalDatadogUsageStream()
-    assert stream.state_checkpoint_interval == 500
+    state = {"timestamp": "2024-03-20T00:00:00Z", "other": 1}
+    assert (
+        stream.get_updated_state(state, {"timestamp": "2024-03-19T00:00:00Z"}) is state
+    )
+    assert state == {"timestamp": "2024-03-20T00:00:00Z", "other": 1}
 
 
 def test_hourly_usage_stream_properties():
@@ -171,6 +195,96 @@ def test_hourly_usage_stream_parse_response(mocker):
     ]
 
 
+def test_hourly_usage_stream_flat_output(mocker):
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["all"],
+        start_date="2024-01-01T00",
+        output_format="flat",
+    )
+    assert stream.primary_key == ["timestamp", "product_family", "usage_type"]
+    assert "usage_type" in stream.get_json_schema()["properties"]
+    assert "measurements" not in stream.get_json_schema()["properties"]
+
+    response = mocker.Mock()
+    response.json.return_value = {
+        "data": [
+            {
+                "attributes": {
+                    "measurements": [
+                        {"usage_type": "host_count", "value": 100},
+                        {"usage_type": "container_count", "value": None},
+                        {"usage_type": "agent_host_count", "value": 0},
+                    ],
+                    "org_name": "test_org",
+                    "product_family": "infra_hosts",
+                    "timestamp": "2019-09-19T10:00:00.000Z",
+                },
+                "type": "usage_timeseries",
+            }
+        ],
+        "meta": {},
+    }
+
+    assert list(stream.parse_response(response)) == [
+        {
+            "timestamp": "2019-09-19T10:00:00.000Z",
+            "product_family": "infra_hosts",
+            "org_name": "test_org",
+            "usage_type": usage_type,
+            "value": value,
+            "type": "usage_timeseries",
+        }
+        for usage_type, value in (("host_count", 100), ("agent_host_count", 0))
+    ]
+
+
+def test_hourly_usage_stream_wide_output(mocker):
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["infra_hosts"],
+        start_date="2024-01-01T00",
+        output_format="wide",
+    )
+    assert stream.primary_key == ["timestamp", "product_family"]
+    assert "host_count" in stream.get_json_schema()["properties"]
+
+    response = mocker.Mock()
+    response.json.return_value = {
+        "data": [
+            {
+                "attributes": {
+                    "measurements": [
+                        {"usage_type": "host_count", "value": 100},
+                        {"usage_type": "container_count", "value": None},
+                        {"usage_type": "agent_host_count", "value": 0},
+                    ],
+                    "org_name": "test_org",
+                    "product_family": "infra_hosts",
+                    "timestamp": "2019-09-19T10:00:00.000Z",
+                },
+                "type": "usage_timeseries",
+            }
+        ],
+        "meta": {},
+    }
+
+    assert list(stream.parse_response(response)) == [
+        {
+            "timestamp": "2019-09-19T10:00:00.000Z",
+            "product_family": "infra_hosts",
+            "org_name": "test_org",
+            "type": "usage_timeseries",
+            "host_count": 100,
+            "agent_host_count": 0,
+        }
+    ]
+
+
 def test_estimated_cost(mocker):
     config = {
         "api_key": "test_api_key",
@@ -268,7 +382,7 @@ def test_estimated_cost(mocker):
     ]
 
 
-def test_hourly_usage_stream_rate_limit(mocker):
+def test_hourly_usage_stream_does_not_sleep_between_pages(mocker):
     config = {
         "api_key": "test_api_key",
         "application_key": "test_app_key",
@@ -280,10 +394,465 @@ def test_hourly_usage_stream_rate_limit(mocker):
 
     sleep_mock = mocker.patch("time.sleep")
 
-    # sleep 5 seconds when using next_record_id
-    params = stream.request_params(
+    # pacing is left to the shared rate limit scheduler
+    stream.request_params(
         stream_state={},
         stream_slice=None,
-        next_page_token={"page[next_record_id]": "some_token"},
+        next_page_token={"next_record_id": "some_token"},
+    )
+    sleep_mock.assert_not_called()
+
+
+def test_hourly_usage_stream_slices(frozen_now):
+    frozen_now(2024, 1, 3, 5, 30)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["all"],
+        start_date="2024-01-01T00",
+    )
+
+    slices = stream.stream_slices(sync_mode=SyncMode.incremental, stream_state={})
+    assert slices == [
+        {"start": "2024-01-01T00", "end": "2024-01-02T00"},
+        {"start": "2024-01-02T00", "end": "2024-01-03T00"},
+        {"start": "2024-01-03T00", "end": "2024-01-03T06"},
+    ]
+
+    slices = stream.stream_slices(
+        sync_mode=SyncMode.incremental,
+        stream_state={"timestamp": "2024-01-02T22:00:00+00:00"},
+    )
+    assert slices == [
+        {"start": "2024-01-02T22", "end": "2024-01-03T06"},
+    ]
+
+    params = stream.request_params(stream_state={}, stream_slice=slices[0])
+    assert params == {
+        "filter[product_families]": "all",
+        "page[limit]": 500,
+        "filter[timestamp][start]": "2024-01-02T22",
+        "filter[timestamp][end]": "2024-01-03T06",
+    }
+
+
+def test_hourly_usage_stream_weekly_slices(frozen_now):
+    frozen_now(2024, 1, 3, 5, 30)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["all"],
+        start_date="2023-12-20T00",
+        slice_window="week",
+    )
+
+    slices = stream.stream_slices(sync_mode=SyncMode.incremental, stream_state={})
+    assert slices == [
+        {"start": "2023-12-20T00", "end": "2023-12-27T00"},
+        {"start": "2023-12-27T00", "end": "2024-01-03T00"},
+        {"start": "2024-01-03T00", "end": "2024-01-03T06"},
+    ]
+
+
+def test_hourly_usage_stream_concurrent_slices_keep_cursor_order(
+    frozen_now, requests_mock
+):
+    frozen_now(2024, 1, 3, 5, 30)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["infra_hosts"],
+        start_date="2024-01-01T00",
+        max_concurrency=3,
+    )
+
+    def hourly_usage(request, context):
+        start = request.qs["filter[timestamp][start]"][0].upper()
+        return {
+            "data": [
+                {
+                    "attributes": {
+                        "measurements": [],
+                        "org_name": "test_org",
+                        "product_family": "infra_hosts",
+                        "timestamp": f"{start}:00:00+00:00",
+                    },
+                    "type": "usage_timeseries",
+                }
+            ],
+            "meta": {},
+        }
+
+    requests_mock.get(
+        "https://api.datadoghq.com/api/v2/usage/hourly_usage", json=hourly_usage
+    )
+
+    records = []
+    for stream_slice in stream.stream_slices(
+        sync_mode=SyncMode.incremental, stream_state={}
+    ):
+        records.extend(
+            stream.read_records(
+                sync_mode=SyncMode.incremental,
+                stream_slice=stream_slice,
+                stream_state={},
+            )
+        )
+
+    assert [record["timestamp"] for record in records] == [
+        "2024-01-01T00:00:00+00:00",
+        "2024-01-02T00:00:00+00:00",
+        "2024-01-03T00:00:00+00:00",
+    ]
+    assert requests_mock.call_count == 3
+
+
+def test_hourly_usage_stream_fan_out_slices(frozen_now):
+    frozen_now(2024, 1, 3, 5, 30)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["logs", "timeseries"],
+        start_date="2024-01-01T00",
+        fan_out_product_families=True,
+    )
+
+    stream_state = {
+        "timestamp": "2024-01-02T10:00:00+00:00",
+        "partitions": {"logs": {"timestamp": "2024-01-03T01:00:00+00:00"}},
+    }
+    slices = stream.stream_slices(
+        sync_mode=SyncMode.incremental, stream_state=stream_state
+    )
+    # a product family without a partition has not been synced yet
+    assert slices == [
+        {
+            "start": "2024-01-01T00",
+            "end": "2024-01-02T00",
+            "product_family": "timeseries",
+        },
+        {
+            "start": "2024-01-02T00",
+            "end": "2024-01-03T00",
+            "product_family": "timeseries",
+        },
+        {
+            "start": "2024-01-03T00",
+            "end": "2024-01-03T06",
+            "product_family": "timeseries",
+        },
+        {"start": "2024-01-03T01", "end": "2024-01-03T06", "product_family": "logs"},
+    ]
+
+    params = stream.request_params(stream_state=stream_state, stream_slice=slices[3])
+    assert params["filter[product_families]"] == "logs"
+
+
+def test_hourly_usage_stream_fan_out_migrates_a_global_cursor(frozen_now):
+    frozen_now(2024, 1, 3, 5, 30)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["logs", "timeseries"],
+        start_date="2024-01-01T00",
+        fan_out_product_families=True,
+    )
+
+    # a state written before the fan-out covers every product family
+    slices = stream.stream_slices(
+        sync_mode=SyncMode.incremental,
+        stream_state={"timestamp": "2024-01-02T10:00:00+00:00"},
+    )
+    assert slices == [
+        {"start": "2024-01-02T10", "end": "2024-01-03T06", "product_family": "logs"},
+        {
+            "start": "2024-01-02T10",
+            "end": "2024-01-03T06",
+            "product_family": "timeseries",
+        },
+    ]
+
+
+def test_hourly_usage_stream_fan_out_state():
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["logs", "timeseries"],
+        start_date="2024-01-01T00",
+        fan_out_product_families=True,
+    )
+
+    stream_state = {}
+    for record in [
+        {"timestamp": "2024-01-01T05:00:00+00:00", "product_family": "logs"},
+        {"timestamp": "2024-01-01T03:00:00+00:00", "product_family": "timeseries"},
+        {"timestamp": "2024-01-01T01:00:00+00:00", "product_family": "logs"},
+    ]:
+        stream_state = stream.get_updated_state(stream_state, record)
+
+    assert stream_state == {
+        "timestamp": "2024-01-01T05:00:00+00:00",
+        "partitions": {
+            "logs": {"timestamp": "2024-01-01T05:00:00+00:00"},
+            "timeseries": {"timestamp": "2024-01-01T03:00:00+00:00"},
+        },
+    }
+
+
+def test_estimated_cost_month_slices(frozen_now):
+    frozen_now(2024, 1, 3, 5, 30)
+    stream = EstimatedCostStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        start_month="2023-11",
+    )
+
+    slices = stream.stream_slices(sync_mode=SyncMode.incremental, stream_state={})
+    assert slices == [
+        {"start_month": "2023-11", "end_month": "2023-11"},
+        {"start_month": "2023-12", "end_month": "2023-12"},
+        {"start_month": "2024-01", "end_month": "2024-01"},
+    ]
+    assert stream.request_params({}, stream_slice=slices[1]) == {
+        "start_month": "2023-12",
+        "end_month": "2023-12",
+    }
+
+    # closed months are never fetched again, the open month always is
+    slices = stream.stream_slices(
+        sync_mode=SyncMode.incremental,
+        stream_state={"sync_date": "2024-01-02", "closed_month": "2023-12"},
+    )
+    assert slices == [{"start_month": "2024-01", "end_month": "2024-01"}]
+
+
+def test_estimated_cost_state_tracks_closed_months():
+    stream = EstimatedCostStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        start_month="2023-11",
+    )
+
+    # Datadog revises the cost of a month for a few days after it ended
+    state = stream.get_updated_state(
+        {}, {"sync_date": "2024-01-03", "month": "2023-12"}
+    )
+    assert state == {"sync_date": "2024-01-03"}
+
+    state = stream.get_updated_state(
+        {}, {"sync_date": "2024-01-04", "month": "2023-12"}
+    )
+    assert state == {"sync_date": "2024-01-04", "closed_month": "2023-12"}
+
+    state = stream.get_updated_state(
+        state, {"sync_date": "2024-01-04", "month": "2024-01"}
+    )
+    assert state == {"sync_date": "2024-01-04", "closed_month": "2023-12"}
+
+    state = stream.get_updated_state(
+        {}, {"sync_date": "2024-01-03", "month": "2024-01"}
+    )
+    assert state == {"sync_date": "2024-01-03"}
+
+    stream.settling_days = 0
+    state = stream.get_updated_state(
+        {}, {"sync_date": "2024-01-01", "month": "2023-12"}
     )
-    sleep_mock.assert_called_once_with(5.0)
+    assert state == {"sync_date": "2024-01-01", "closed_month": "2023-12"}
+
+
+def hourly_usage_handler(values):
+    """Serves one record per hour of the requested window, valued from `values`."""
+
+    def handler(request, context):
+        start = datetime.strptime(
+            request.qs["filter[timestamp][start]"][0].upper(), "%Y-%m-%dT%H"
+        )
+        end = datetime.strptime(
+            request.qs["filter[timestamp][end]"][0].upper(), "%Y-%m-%dT%H"
+        )
+        data = []
+        while start < end:
+            timestamp = start.strftime("%Y-%m-%dT%H:00:00+00:00")
+            data.append(
+                {
+                    "attributes": {
+                        "timestamp": timestamp,
+                        "product_family": "logs",
+                        "org_name": "test_org",
+                        "measurements": [
+                            {"usage_type": "logs", "value": values.get(timestamp, 1)}
+                        ],
+                    },
+                    "type": "usage_timeseries",
+                }
+            )
+            start += timedelta(hours=1)
+        return {"data": data, "meta": {}}
+
+    return handler
+
+
+def test_hourly_usage_settling_window_and_deduplication(frozen_now, requests_mock):
+    frozen_now(2024, 1, 3, 5, 30)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["logs"],
+        start_date="2024-01-03T00",
+        settling_hours=2,
+    )
+    values = {}
+    requests_mock.get(
+        "https://api.datadoghq.com/api/v2/usage/hourly_usage",
+        json=hourly_usage_handler(values),
+    )
+
+    def sync(stream_state):
+        records = []
+        for stream_slice in stream.stream_slices(
+            sync_mode=SyncMode.incremental, stream_state=stream_state
+        ):
+            for record in stream.read_records(
+                sync_mode=SyncMode.incremental,
+                stream_slice=stream_slice,
+                stream_state=stream_state,
+            ):
+                stream_state = stream.get_updated_state(stream_state, record)
+                records.append(record["timestamp"][:13])
+        return records, stream_state
+
+    # now is 05:30: hours before 03 are final
+    records, stream_state = sync({})
+    assert records == [f"2024-01-03T0{hour}" for hour in range(6)]
+    assert stream_state["settled_until"] == "2024-01-03T03"
+    assert sorted(stream_state["digests"]) == [
+        f"2024-01-03T0{hour}:00:00+00:00|logs" for hour in range(3, 6)
+    ]
+
+    # the settling window is fetched again, but only revised records are emitted
+    values["2024-01-03T04:00:00+00:00"] = 42
+    records, stream_state = sync(stream_state)
+    assert requests_mock.last_request.qs["filter[timestamp][start]"] == [
+        "2024-01-03t03"
+    ]
+    assert records == ["2024-01-03T04"]
+
+
+def test_hourly_usage_resumes_interrupted_page_chain(frozen_now, requests_mock):
+    frozen_now(2024, 1, 3, 5, 30)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["logs"],
+        start_date="2024-01-03T00",
+        resume_pagination_minutes=30,
+    )
+
+    def one_hour_per_page(request, context):
+        hour = int(request.qs.get("page[next_record_id]", ["0"])[0])
+        return {
+            "data": [
+                {
+                    "attributes": {
+                        "timestamp": f"2024-01-03T0{hour}:00:00+00:00",
+                        "product_family": "logs",
+                        "org_name": "test_org",
+                        "measurements": [],
+                    },
+                    "type": "usage_timeseries",
+                }
+            ],
+            "meta": (
+                {"pagination": {"next_record_id": str(hour + 1)}} if hour < 5 else {}
+            ),
+        }
+
+    requests_mock.get(
+        "https://api.datadoghq.com/api/v2/usage/hourly_usage", json=one_hour_per_page
+    )
+
+    # the first sync is interrupted after the record of the third page
+    stream_state = {}
+    (stream_slice,) = stream.stream_slices(
+        sync_mode=SyncMode.incremental, stream_state=stream_state
+    )
+    records = stream.read_records(
+        sync_mode=SyncMode.incremental,
+        stream_slice=stream_slice,
+        stream_state=stream_state,
+    )
+    for _ in range(3):
+        stream_state = stream.get_updated_state(stream_state, next(records))
+    assert stream_state["pagination"] == {
+        "start": "2024-01-03T00",
+        "end": "2024-01-03T06",
+        "product_families": "logs",
+        "next_record_id": "2",
+        "expires_at": "2024-01-03T06:00:00Z",
+    }
+
+    # the next sync continues from the first page whose records were not all emitted
+    slices = stream.stream_slices(
+        sync_mode=SyncMode.incremental, stream_state=stream_state
+    )
+    assert slices == [
+        {"start": "2024-01-03T00", "end": "2024-01-03T06", "next_record_id": "2"}
+    ]
+    requests_mock.reset_mock()
+    timestamps = []
+    for record in stream.read_records(
+        sync_mode=SyncMode.incremental,
+        stream_slice=slices[0],
+        stream_state=stream_state,
+    ):
+        stream_state = stream.get_updated_state(stream_state, record)
+        timestamps.append(record["timestamp"][:13])
+    assert timestamps == [f"2024-01-03T0{hour}" for hour in range(2, 6)]
+    assert requests_mock.call_count == 4
+    assert "pagination" not in stream_state
+
+
+def test_hourly_usage_discards_stale_page_chain(frozen_now):
+    frozen_now(2024, 1, 3, 5, 30)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["logs"],
+        start_date="2024-01-03T00",
+        resume_pagination_minutes=30,
+    )
+    pagination = {
+        "start": "2024-01-03T00",
+        "end": "2024-01-03T06",
+        "product_families": "logs",
+        "next_record_id": "2",
+        "expires_at": "2024-01-03T06:00:00Z",
+    }
+    fresh_slices = [{"start": "2024-01-03T02", "end": "2024-01-03T06"}]
+
+    for stale in (
+        {"expires_at": "2024-01-03T05:00:00Z"},
+        {"product_families": "infra_hosts"},
+        {"end": "2024-01-03T02"},
+    ):
+        stream_state = {
+            "settled_until": "2024-01-03T02",
+            "pagination": {**pagination, **stale},
+        }
+        slices = stream.stream_slices(
+            sync_mode=SyncMode.incremental, stream_state=stream_state
+        )
+        assert slices == fresh_slices
+        assert "pagination" not in stream_state
@@ -0,0 +1,130 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import json
+import logging
+import pstats
+from collections import namedtuple
+
+from airbyte_cdk.models import TraceType, Type
+
+from airbyte_source_datadog_usage.metrics import METRICS_EVENT, StreamMetrics
+from airbyte_source_datadog_usage.source import SourceDatadogUsage
+
+RequestHistory = namedtuple(
+    "RequestHistory", "method url error status redirect_location"
+)
+
+CONFIG = {
+    "api_key": "test_api_key",
+    "application_key": "test_app_key",
+    "site": "datadoghq.com",
+    "hourly_usage_by_product": {
+        "product_families": ["all"],
+        "start_date": "2024-01-01T00",
+    },
+    "http": {"max_retries": 0},
+}
+
+
+def estimated_cost_page(months):
+    return {
+        "data": [
+            {
+                "attributes": {
+                    "date": f"{month}-01T00:00:00+00:00",
+                    "org_name": "test_org",
+                    "total_cost": 1.0,
+                    "charges": [],
+                },
+            }
+            for month in months
+        ]
+    }
+
+
+def test_stream_metrics_counts_pages_and_reports_deltas():
+    metrics = StreamMetrics()
+    assert list(metrics.parsed(iter([1, 2, 3]))) == [1, 2, 3]
+    assert list(metrics.parsed([])) == []
+    metrics.add("requests", 2)
+    metrics.add("bytes", 100)
+
+    report = metrics.since_last_report()
+    assert report["pages"] == 2
+    assert report["records"] == 3
+    assert report["records_per_page"] == 1.5
+    assert report["requests"] == 2
+    assert report["bytes"] == 100
+    assert report["parse_seconds"] >= 0
+
+    metrics.add("requests")
+    assert metrics.since_last_report()["requests"] == 1
+    assert metrics.totals()["requests"] == 3
+
+
+def test_stream_metrics_counts_retries_and_throttling():
+    metrics = StreamMetrics()
+    history = [
+        RequestHistory("GET", "/", None, 429, None),
+        RequestHistory("GET", "/", None, 503, None),
+    ]
+    metrics.observe_response(200, history)
+    metrics.observe_response(429, retried=True)
+
+    totals = metrics.totals()
+    assert totals["retries"] == 3
+    assert totals["throttled"] == 2
+
+
+def test_read_emits_stream_metrics_trace(requests_mock, caplog, estimated_cost_catalog):
+    requests_mock.get(
+        "https://api.datadoghq.com/api/v2/usage/estimated_cost",
+        [
+            {"status_code": 429, "headers": {"X-RateLimit-Reset": "0.01"}},
+            {"json": estimated_cost_page(["2024-01", "2024-02"])},
+        ],
+    )
+
+    with caplog.at_level(logging.INFO):
+        messages = list(
+            SourceDatadogUsage().read(
+                logging.getLogger("airbyte"), CONFIG, estimated_cost_catalog
+            )
+        )
+
+    traces = [
+        message.trace
+        for message in messages
+        if message.type == Type.TRACE and message.trace.type == TraceType.ANALYTICS
+    ]
+    assert [trace.analytics.type for trace in traces] == [METRICS_EVENT]
+    metrics = json.loads(traces[0].analytics.value)
+    assert metrics["stream"] == "estimated_cost_stream"
+    assert metrics["requests"] == 2
+    assert metrics["retries"] == 1
+    assert metrics["throttled"] == 1
+    assert metrics["pages"] == 1
+    assert metrics["records"] == 2
+    assert metrics["records_per_page"] == 2
+    assert metrics["bytes"] > 0
+    assert any("Slice" in line and "pages=1" in line for line in caplog.messages)
+
+
+def test_read_writes_profile(requests_mock, tmp_path, estimated_cost_catalog):
+    requests_mock.get(
+        "https://api.datadoghq.com/api/v2/usage/estimated_cost",
+        json=estimated_cost_page(["2024-01"]),
+    )
+    path = tmp_path / "sync.prof"
+    config = {**CONFIG, "profile": {"path": str(path)}}
+
+    list(
+        SourceDatadogUsage().read(
+            logging.getLogger("airbyte"), config, estimated_cost_catalog
+        )
+    )
+
+    functions = pstats.Stats(str(path)).stats
+    assert any(name == "parse_response" for _, _, name in functions)
@@ -0,0 +1,165 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+from airbyte_cdk.models import AirbyteStateMessage, Type
+
+from airbyte_source_datadog_usage.organizations import organizations_from_config
+from airbyte_source_datadog_usage.source import SourceDatadogUsage
+
+from .conftest import HOURLY_USAGE_URL
+
+CONFIG = {
+    "site": "datadoghq.com",
+    "organizations": [
+        {"name": "parent", "api_key": "parent_key", "application_key": "parent_app"},
+        {"name": "child", "api_key": "child_key", "application_key": "child_app"},
+    ],
+    "hourly_usage_by_product": {
+        "product_families": ["infra_hosts"],
+        "start_date": "2024-01-01T00",
+    },
+    "http": {"max_retries": 0},
+}
+
+
+def hourly_usage(request, context):
+    org_name = {"parent_key": "parent org", "child_key": "child org"}[
+        request.headers["DD-API-KEY"]
+    ]
+    start = request.qs["filter[timestamp][start]"][0].upper()
+    return {
+        "data": [
+            {
+                "attributes": {
+                    "measurements": [{"usage_type": "host_count", "value": 1}],
+                    "org_name": org_name,
+                    "product_family": "infra_hosts",
+                    "timestamp": f"{start[:10]}T{start[11:13]}:00:00+00:00",
+                },
+                "type": "usage_timeseries",
+            }
+        ],
+        "meta": {},
+    }
+
+
+def test_organizations_from_config():
+    parent, child = organizations_from_config(CONFIG)
+    assert (parent.name, child.name) == ("parent", "child")
+    assert child.headers == {
+        "DD-API-KEY": "child_key",
+        "DD-APPLICATION-KEY": "child_app",
+    }
+    assert parent.rate_limiter is not child.rate_limiter
+
+    (single,) = organizations_from_config(
+        {"api_key": "key", "application_key": "app"}, rate_limiter="shared"
+    )
+    assert (single.name, single.rate_limiter) == (None, "shared")
+
+    with pytest.raises(ValueError):
+        organizations_from_config({"site": "datadoghq.com"})
+    with pytest.raises(ValueError):
+        organizations_from_config(
+            {"organizations": CONFIG["organizations"] + CONFIG["organizations"][:1]}
+        )
+
+
+def test_check_connection_checks_every_organization(requests_mock):
+    requests_mock.get(
+        "https://api.datadoghq.com/api/v1/validate",
+        [
+            {"status_code": 200, "json": {"valid": True}},
+            {"status_code": 403, "text": "Forbidden"},
+        ],
+    )
+    assert SourceDatadogUsage().check_connection(MagicMock(), CONFIG) == (
+        False,
+        "Organization child: HTTP 403: Forbidden",
+    )
+    assert [
+        request.headers["DD-API-KEY"] for request in requests_mock.request_history
+    ] == ["parent_key", "child_key"]
+
+
+def test_streams_share_each_organization_budget():
+    hourly_usage, estimated_cost = SourceDatadogUsage().streams(CONFIG)
+    assert hourly_usage.organizations is estimated_cost.organizations
+    assert hourly_usage.primary_key == ["timestamp", "product_family", "org_name"]
+    assert estimated_cost.primary_key == ["sync_date", "month", "org_name"]
+    parent, child = hourly_usage.organizations
+    assert hourly_usage._rate_limiter({"DD-API-KEY": "child_key"}) is (
+        child.rate_limiter
+    )
+    assert hourly_usage._rate_limiter({"DD-API-KEY": "parent_key"}) is (
+        parent.rate_limiter
+    )
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 2])
+def test_read_partitions_state_by_organization(
+    frozen_now, hourly_usage_catalog, requests_mock, max_concurrency
+):
+    frozen_now(2024, 1, 2, 5, 30)
+    requests_mock.get(HOURLY_USAGE_URL, json=hourly_usage)
+    config = {**CONFIG, "max_concurrency": max_concurrency}
+    state = AirbyteStateMessage.parse_obj(
+        {
+            "type": "STREAM",
+            "stream": {
+                "stream_descriptor": {"name": "hourly_usage_by_product_stream"},
+                "stream_state": {
+                    "timestamp": "2024-01-02T00:00:00+00:00",
+                    "orgs": {"child": {"timestamp": "2024-01-02T00:00:00+00:00"}},
+                },
+            },
+        }
+    )
+
+    messages = list(
+        SourceDatadogUsage().read(
+            logging.getLogger("airbyte"),
+            config,
+            hourly_usage_catalog,
+            [state],
+        )
+    )
+
+    requested = sorted(
+        (request.headers["DD-API-KEY"], request.qs["filter[timestamp][start]"][0])
+        for request in requests_mock.request_history
+    )
+    assert requested == [
+        ("child_key", "2024-01-02t00"),
+        ("parent_key", "2024-01-01t00"),
+        ("parent_key", "2024-01-02t00"),
+    ]
+    records = [
+        message.record.data for message in messages if message.type == Type.RECORD
+    ]
+    assert [(record["timestamp"], record["org_name"]) for record in records] == [
+        ("2024-01-01T00:00:00+00:00", "parent org"),
+        ("2024-01-02T00:00:00+00:00", "parent org"),
+        ("2024-01-02T00:00:00+00:00", "child org"),
+    ]
+    final_state = [
+        message.state.stream.stream_state.dict()
+        for message in messages
+        if message.type == Type.STATE
+    ][-1]
+    assert final_state == {
+        "timestamp": "2024-01-02T00:00:00+00:00",
+        "orgs": {
+            org: {
+                "timestamp": "2024-01-02T00:00:00+00:00",
+                "settled_until": "2024-01-02T05",
+                "digests": {},
+            }
+            for org in ("parent", "child")
+        },
+    }
@@ -0,0 +1,118 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import io
+import json
+from collections import defaultdict
+
+from airbyte_cdk.entrypoint import AirbyteEntrypoint
+from airbyte_cdk.models import (
+    AirbyteMessage,
+    AirbyteStateMessage,
+    AirbyteStateType,
+    AirbyteStreamState,
+    StreamDescriptor,
+    Type,
+)
+from airbyte_cdk.sources import AbstractSource
+
+from airbyte_source_datadog_usage.output import (
+    DatadogUsageEntrypoint,
+    MessageWriter,
+    RecordMessage,
+)
+from airbyte_source_datadog_usage.source import (
+    HourlyUsageByProductStream,
+    SourceDatadogUsage,
+)
+
+RECORD = {
+    "timestamp": "2024-01-01T00:00:00+00:00",
+    "product_family": "logs",
+    "org_name": "test_org",
+    "measurements": [{"usage_type": "logs", "value": 1.5}],
+    "type": "usage_timeseries",
+}
+
+
+def hourly_usage_stream():
+    return HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["logs"],
+        start_date="2024-01-01T00",
+    )
+
+
+def test_record_messages_serialize_like_the_cdk():
+    source = SourceDatadogUsage()
+    stream = hourly_usage_stream()
+
+    message = source._get_message(dict(RECORD), stream)
+    expected = AbstractSource._get_message(source, dict(RECORD), stream)
+    expected.record.emitted_at = message.emitted_at
+
+    assert isinstance(message, RecordMessage)
+    assert message.record.data == RECORD
+    assert json.loads(
+        AirbyteEntrypoint.airbyte_message_to_string(message)
+    ) == json.loads(AirbyteEntrypoint.airbyte_message_to_string(expected))
+
+
+def test_record_counts_reach_state_messages():
+    stream = hourly_usage_stream()
+    counts = defaultdict(float)
+    for _ in range(3):
+        DatadogUsageEntrypoint.handle_record_counts(
+            stream.record_envelope.message(RECORD), counts
+        )
+
+    state = AirbyteMessage(
+        type=Type.STATE,
+        state=AirbyteStateMessage(
+            type=AirbyteStateType.STREAM,
+            stream=AirbyteStreamState(
+                stream_descriptor=StreamDescriptor(name=stream.name),
+                stream_state={},
+            ),
+        ),
+    )
+    DatadogUsageEntrypoint.handle_record_counts(state, counts)
+    assert state.state.sourceStats.recordCount == 3.0
+
+
+class CountingBuffer(io.BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+        super().flush()
+
+
+def test_writer_buffers_records_until_a_checkpoint_or_size():
+    output = CountingBuffer()
+    record = hourly_usage_stream().record_envelope.message(RECORD).json()
+    with MessageWriter(output, buffer_size=len(record) * 3) as writer:
+        writer.write(record)
+        writer.write(record)
+        assert output.getvalue() == b""
+
+        writer.write('{"type": "STATE", "state": {}}')
+        assert output.getvalue().count(b"\n") == 3
+        assert output.flushes == 1
+
+        for _ in range(3):
+            writer.write(record)
+        assert output.getvalue().count(b"\n") == 6
+        writer.write(record)
+    assert output.getvalue().count(b"\n") == 7
+    assert [json.loads(line)["type"] for line in output.getvalue().splitlines()] == [
+        "RECORD",
+        "RECORD",
+        "STATE",
+        *["RECORD"] * 4,
+    ]
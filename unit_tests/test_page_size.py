@@ -0,0 +1,114 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import pytest
+from airbyte_cdk.models import SyncMode
+
+from airbyte_source_datadog_usage.page_size import AdaptivePageSize, with_page_limit
+from airbyte_source_datadog_usage.source import HourlyUsageByProductStream
+
+from .conftest import HOURLY_USAGE_URL
+
+
+def test_shrinks_on_slow_or_large_pages_and_grows_back():
+    page_size = AdaptivePageSize(
+        minimum=100, maximum=500, target_seconds=10, max_bytes=1000
+    )
+    assert page_size.current == 500
+
+    page_size.observe(seconds=11, size_bytes=10)
+    assert page_size.current == 250
+    page_size.observe(seconds=1, size_bytes=1001)
+    assert page_size.current == 125
+    page_size.shrink()
+    assert page_size.current == 100
+
+    # Within half of both budgets neither grows nor shrinks.
+    page_size.observe(seconds=6, size_bytes=10)
+    assert page_size.current == 100
+    page_size.observe(seconds=1, size_bytes=10)
+    assert page_size.current == 200
+    page_size.observe(seconds=1, size_bytes=10)
+    page_size.observe(seconds=1, size_bytes=10)
+    assert page_size.current == 500
+
+
+def test_from_config():
+    page_size = AdaptivePageSize.from_config(
+        {"page_size": {"min": 10, "max": 200, "target_seconds": 5, "max_page_mb": 2}}
+    )
+    assert (page_size.minimum, page_size.maximum, page_size.current) == (10, 200, 200)
+    assert page_size.target_seconds == 5
+    assert page_size.max_bytes == 2 * 2**20
+    assert AdaptivePageSize.from_config({}).current == 500
+
+
+def test_invalid_bounds():
+    with pytest.raises(ValueError):
+        AdaptivePageSize(minimum=200, maximum=100)
+
+
+def test_with_page_limit():
+    url = f"{HOURLY_USAGE_URL}?page%5Blimit%5D=500&page%5Bnext_record_id%5D=5001"
+    assert with_page_limit(url, 250) == (
+        f"{HOURLY_USAGE_URL}?page%5Blimit%5D=250&page%5Bnext_record_id%5D=5001"
+    )
+    assert with_page_limit(HOURLY_USAGE_URL, 250) == HOURLY_USAGE_URL
+
+
+def test_retries_after_a_server_error_request_smaller_pages(mocker, requests_mock):
+    mocker.patch.object(HourlyUsageByProductStream, "retry_factor", 0)
+    requests_mock.get(
+        HOURLY_USAGE_URL,
+        [
+            {"status_code": 503, "json": {}},
+            {"status_code": 200, "json": {"data": [], "meta": {}}},
+        ],
+    )
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["infra_hosts"],
+        start_date="2024-01-01T00",
+        adaptive_page_size=AdaptivePageSize(minimum=100, maximum=400),
+    )
+    stream_slice = {"start": "2024-01-01T00", "end": "2024-01-02T00"}
+
+    records = list(
+        stream.read_records(
+            sync_mode=SyncMode.incremental, stream_slice=stream_slice, stream_state={}
+        )
+    )
+
+    assert records == []
+    assert [request.qs["page[limit]"] for request in requests_mock.request_history] == [
+        ["400"],
+        ["200"],
+    ]
+    # The fast, empty page that answered the retry grew it back.
+    assert stream.metrics.totals()["page_size"] == 400
+
+
+def test_cdk_page_size_does_not_replace_the_adaptive_page_size(requests_mock):
+    requests_mock.get(HOURLY_USAGE_URL, json={"data": [], "meta": {}})
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["infra_hosts"],
+        start_date="2024-01-01T00",
+        adaptive_page_size=AdaptivePageSize(minimum=100, maximum=400),
+    )
+    # the CDK sets a fixed `page_size` when it is given one
+    stream.page_size = 50
+    stream_slice = {"start": "2024-01-01T00", "end": "2024-01-02T00"}
+
+    list(
+        stream.read_records(
+            sync_mode=SyncMode.incremental, stream_slice=stream_slice, stream_state={}
+        )
+    )
+
+    assert requests_mock.last_request.qs["page[limit]"] == ["400"]
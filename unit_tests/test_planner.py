@@ -0,0 +1,157 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import copy
+import json
+import sys
+
+import pytest
+
+from airbyte_source_datadog_usage.planner import SlicePlan, StreamPlan, plan_sync
+from airbyte_source_datadog_usage.run import run
+from airbyte_source_datadog_usage.source import SourceDatadogUsage
+
+from .conftest import HOURLY_USAGE_URL
+
+CONFIG = {
+    "api_key": "test_api_key",
+    "application_key": "test_app_key",
+    "site": "datadoghq.com",
+    "max_concurrency": 4,
+    "hourly_usage_by_product": {
+        "product_families": ["logs", "infra_hosts"],
+        "start_date": "2024-01-01T00",
+    },
+    "estimated_cost": {"start_month": "2023-12"},
+}
+
+
+@pytest.fixture(autouse=True)
+def freeze_clock(frozen_now):
+    frozen_now(2024, 1, 3, 5, 30)
+
+
+def hourly_usage_page(hours, records_per_hour, next_record_id=None):
+    return {
+        "data": [
+            {
+                "attributes": {
+                    "timestamp": f"2024-01-02T{hour:02d}:00:00+00:00",
+                    "product_family": "logs",
+                    "org_name": "test_org",
+                    "measurements": [{"usage_type": "logs", "value": 1}],
+                },
+                "type": "usage_timeseries",
+            }
+            for hour in range(hours)
+            for _ in range(records_per_hour)
+        ],
+        "meta": {"pagination": {"next_record_id": next_record_id}},
+    }
+
+
+def test_plan_lists_slices_from_state_without_fetching(requests_mock):
+    state = {"hourly_usage_by_product_stream": {"settled_until": "2024-01-02T00"}}
+    original_state = copy.deepcopy(state)
+
+    plan = plan_sync(SourceDatadogUsage(), CONFIG, state)
+
+    hourly_usage, estimated_cost = plan.streams
+    assert hourly_usage.product_families == ["logs", "infra_hosts"]
+    assert [
+        (slice_plan.stream_slice, slice_plan.requests, slice_plan.records)
+        for slice_plan in hourly_usage.slices
+    ] == [
+        ({"start": "2024-01-02T00", "end": "2024-01-03T00"}, 1, 48),
+        ({"start": "2024-01-03T00", "end": "2024-01-03T06"}, 1, 12),
+    ]
+    assert [slice_plan.stream_slice for slice_plan in estimated_cost.slices] == [
+        {"start_month": "2023-12", "end_month": "2023-12"},
+        {"start_month": "2024-01", "end_month": "2024-01"},
+    ]
+    assert plan.to_dict()["requests"] == 4
+    assert not requests_mock.called
+    assert state == original_state
+
+
+def test_calibration_extrapolates_the_first_page_of_each_slice(requests_mock):
+    rate_limit_headers = {"X-RateLimit-Limit": "20", "X-RateLimit-Period": "60"}
+    requests_mock.get(
+        HOURLY_USAGE_URL,
+        [
+            # 2 records an hour over the first 5 hours of a 24-hour slice
+            {
+                "json": hourly_usage_page(5, 2, next_record_id="next"),
+                "headers": rate_limit_headers,
+            },
+            {"json": hourly_usage_page(6, 1), "headers": rate_limit_headers},
+        ],
+    )
+    config = {
+        **CONFIG,
+        "hourly_usage_by_product": {**CONFIG["hourly_usage_by_product"]},
+    }
+    config["hourly_usage_by_product"]["start_date"] = "2024-01-02T00"
+
+    plan = plan_sync(
+        SourceDatadogUsage(),
+        config,
+        stream_names=["hourly_usage_by_product_stream"],
+        calibrate=True,
+    )
+
+    (hourly_usage,) = plan.streams
+    assert [
+        (slice_plan.requests, slice_plan.records, slice_plan.calibrated)
+        for slice_plan in hourly_usage.slices
+    ] == [(5, 48, True), (1, 6, True)]
+    assert requests_mock.call_count == 2
+    estimate = plan.estimate()
+    assert estimate["latency_source"] == "calibrated"
+    assert estimate["rate_limits"] == {
+        "hourly_usage_by_product_stream": {"limit": 20.0, "period": 60.0}
+    }
+
+
+def test_runtime_is_bound_by_concurrency_and_rate_limit():
+    stream = StreamPlan(
+        "hourly_usage_by_product_stream",
+        [SlicePlan({"start": str(day)}, requests=3) for day in range(10)],
+        reserve=1,
+    )
+    assert stream.runtime(latency=1.0, max_concurrency=1) == 30
+    assert stream.runtime(latency=1.0, max_concurrency=4) == 7.5
+    # pages of a slice are sequential
+    assert stream.runtime(latency=1.0, max_concurrency=16) == 3
+    # 9 requests per window, after the reserved one: 4 windows
+    assert stream.runtime(1.0, 4, rate_limit=(10, 60)) == 180
+
+    # organizations are fetched in parallel, each within its own budget
+    partitioned = StreamPlan(
+        "hourly_usage_by_product_stream",
+        [
+            SlicePlan({"start": str(day), "org": org}, requests=3)
+            for day in range(5)
+            for org in ("a", "b")
+        ],
+        organizations=2,
+        reserve=1,
+    )
+    assert partitioned.runtime(1.0, 1) == 15
+    assert partitioned.runtime(1.0, 1, rate_limit=(10, 60)) == 60
+
+
+def test_plan_command(tmp_path, monkeypatch, capsys):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps(CONFIG))
+    monkeypatch.setattr(
+        sys, "argv", ["main.py", "plan", "--config", str(config_path), "--latency", "2"]
+    )
+
+    run()
+
+    output = capsys.readouterr().out
+    assert "hourly_usage_by_product_stream: 3 slices, ~3 requests" in output
+    assert "Latency: 2.00s per request (given)" in output
+    assert "max_concurrency   4: 4s (configured)" in output
@@ -0,0 +1,123 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import pytest
+
+from airbyte_source_datadog_usage.rate_limit import RateLimitScheduler
+from airbyte_source_datadog_usage.source import HourlyUsageByProductStream
+
+from .conftest import HOURLY_USAGE_URL, FakeClock
+
+
+def headers(limit, remaining, reset, period=60):
+    return {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(remaining),
+        "X-RateLimit-Reset": str(reset),
+        "X-RateLimit-Period": str(period),
+    }
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_no_wait_before_first_response(clock):
+    scheduler = RateLimitScheduler(clock=clock, sleep=clock.sleep)
+    assert scheduler.acquire() == 0.0
+    assert clock.sleeps == []
+
+
+def test_no_wait_while_budget_is_healthy(clock):
+    scheduler = RateLimitScheduler(clock=clock, sleep=clock.sleep)
+    scheduler.update(headers(limit=100, remaining=80, reset=30))
+    for _ in range(50):
+        scheduler.acquire()
+    assert clock.sleeps == []
+    assert scheduler.remaining == 30
+
+
+def test_adaptive_paces_when_budget_runs_low(clock):
+    scheduler = RateLimitScheduler(
+        clock=clock, sleep=clock.sleep, low_watermark=0.2, reserve=1
+    )
+    scheduler.update(headers(limit=100, remaining=11, reset=50))
+
+    scheduler.acquire()
+    scheduler.acquire()
+    # 10 spendable tokens spread over the 50 seconds left in the window
+    assert clock.sleeps == [5.0]
+
+
+def test_adaptive_waits_for_reset_when_only_reserve_is_left(clock):
+    scheduler = RateLimitScheduler(clock=clock, sleep=clock.sleep, reserve=1)
+    scheduler.update(headers(limit=100, remaining=1, reset=12))
+
+    scheduler.acquire()
+    assert clock.sleeps == [12.0]
+    assert scheduler.remaining == 99
+
+
+def test_burst_only_waits_when_exhausted(clock):
+    scheduler = RateLimitScheduler(mode="burst", clock=clock, sleep=clock.sleep)
+    scheduler.update(headers(limit=100, remaining=2, reset=20))
+
+    scheduler.acquire()
+    scheduler.acquire()
+    assert clock.sleeps == []
+
+    scheduler.acquire()
+    assert clock.sleeps == [20.0]
+
+
+def test_stale_headers_do_not_refill_budget(clock):
+    scheduler = RateLimitScheduler(clock=clock, sleep=clock.sleep)
+    scheduler.update(headers(limit=100, remaining=50, reset=30))
+    scheduler.update(headers(limit=100, remaining=60, reset=30))
+    assert scheduler.remaining == 50
+
+
+def test_from_config():
+    scheduler = RateLimitScheduler.from_config({"rate_limit": {"mode": "burst"}})
+    assert scheduler.mode == "burst"
+    assert scheduler.reserve == 0
+
+    scheduler = RateLimitScheduler.from_config({})
+    assert scheduler.mode == "adaptive"
+
+    with pytest.raises(ValueError):
+        RateLimitScheduler(mode="unknown")
+
+
+def test_stream_reads_rate_limit_headers(requests_mock):
+    scheduler = RateLimitScheduler()
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["all"],
+        start_date="2024-01-01T00",
+        rate_limiter=scheduler,
+    )
+    requests_mock.get(
+        HOURLY_USAGE_URL,
+        json={"data": [], "meta": {}},
+        headers=headers(limit=100, remaining=42, reset=10),
+    )
+    records = list(stream.read_records(sync_mode=None, stream_state={}))
+    assert records == []
+    assert scheduler.remaining == 42
+
+
+def test_backoff_time_uses_reset_header(mocker):
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["all"],
+        start_date="2024-01-01T00",
+    )
+    response = mocker.Mock(status_code=429, headers={"X-RateLimit-Reset": "7"})
+    assert stream.backoff_time(response) == 7.0
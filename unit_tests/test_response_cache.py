@@ -0,0 +1,109 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import os
+
+from airbyte_cdk.models import SyncMode
+
+from airbyte_source_datadog_usage.response_cache import CACHE_FILE, ResponseCache
+from airbyte_source_datadog_usage.source import HourlyUsageByProductStream
+
+from .conftest import HOURLY_USAGE_URL, FakeClock
+
+
+def test_entries_are_compressed_and_persisted(tmp_path):
+    body = b'{"data": [' + b'{"value": 1},' * 1000 + b"{}]}"
+    cache = ResponseCache(str(tmp_path))
+    key = cache.key("https://api.datadoghq.com/api/v2/usage/hourly_usage?a=1", "k")
+    assert cache.get(key) is None
+
+    cache.put(key, body)
+    assert cache.get(key) == body
+    assert 0 < cache.size < len(body) / 10
+    cache.close()
+
+    reopened = ResponseCache(str(tmp_path))
+    assert reopened.get(key) == body
+    assert reopened.size == cache.size
+    assert os.path.exists(tmp_path / CACHE_FILE)
+
+
+def test_keys_depend_on_the_api_key():
+    url = "https://api.datadoghq.com/api/v2/usage/hourly_usage?a=1"
+    assert ResponseCache.key(url, "org-1") != ResponseCache.key(url, "org-2")
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_size_bytes=60, clock=FakeClock(tick=1))
+    bodies = {key: key.encode() * 50 for key in ("a", "b", "c")}
+    cache.put("a", bodies["a"])
+    cache.put("b", bodies["b"])
+    entry_size = cache.size // 2
+    cache.max_size_bytes = entry_size * 2
+
+    assert cache.get("a") == bodies["a"]
+    cache.put("c", bodies["c"])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == bodies["a"]
+    assert cache.get("c") == bodies["c"]
+    assert cache.size == entry_size * 2
+
+
+def test_stream_serves_settled_windows_from_the_cache(
+    frozen_now, requests_mock, tmp_path
+):
+    frozen_now(2024, 1, 4, 5, 30)
+    requests_mock.get(
+        HOURLY_USAGE_URL,
+        json={
+            "data": [
+                {
+                    "attributes": {
+                        "measurements": [{"usage_type": "host_count", "value": 1}],
+                        "org_name": "test_org",
+                        "product_family": "infra_hosts",
+                        "timestamp": "2024-01-01T00:00:00+00:00",
+                    },
+                    "type": "usage_timeseries",
+                }
+            ],
+            "meta": {},
+        },
+    )
+
+    def read():
+        stream = HourlyUsageByProductStream(
+            api_key="test_api_key",
+            application_key="test_app_key",
+            site="datadoghq.com",
+            product_families=["infra_hosts"],
+            start_date="2024-01-01T00",
+            response_cache=ResponseCache(str(tmp_path), freshness_hours=24),
+        )
+        records = [
+            record
+            for stream_slice in stream.stream_slices(
+                sync_mode=SyncMode.incremental, stream_state={}
+            )
+            for record in stream.read_records(
+                sync_mode=SyncMode.incremental,
+                stream_slice=stream_slice,
+                stream_state={},
+            )
+        ]
+        return stream, records
+
+    _, first = read()
+    # Four daily windows; the first two ended more than 24 hours ago.
+    assert requests_mock.call_count == 4
+
+    stream, second = read()
+    assert second == first
+    assert requests_mock.call_count == 6
+    assert [
+        request.qs["filter[timestamp][start]"][0]
+        for request in requests_mock.request_history[4:]
+    ] == ["2024-01-03t00", "2024-01-04t00"]
+    assert stream.metrics.totals()["cache_hits"] == 2
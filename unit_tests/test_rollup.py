@@ -0,0 +1,197 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+from datetime import datetime, timedelta
+
+from airbyte_cdk.models import SyncMode
+
+from airbyte_source_datadog_usage.rollup import (
+    DAY,
+    MONTH,
+    next_rollup_window,
+    rolled_up,
+    rollup_window,
+)
+from airbyte_source_datadog_usage.source import HourlyUsageByProductStream
+
+from .conftest import HOURLY_USAGE_URL
+
+
+def test_windows():
+    assert (
+        rollup_window("2024-02-03T05:00:00+00:00", DAY) == "2024-02-03T00:00:00+00:00"
+    )
+    assert rollup_window("2024-02-03T05", MONTH) == "2024-02-01T00"
+    assert next_rollup_window(datetime(2024, 2, 28, 5), DAY) == datetime(2024, 2, 29)
+    assert next_rollup_window(datetime(2024, 2, 3, 5), MONTH) == datetime(2024, 3, 1)
+    assert next_rollup_window(datetime(2024, 12, 3), MONTH) == datetime(2025, 1, 1)
+
+
+def test_rolled_up_sums_every_output_format():
+    def hour(hour, **fields):
+        return {
+            "timestamp": f"2024-01-0{1 + hour // 24}T{hour % 24:02d}:00:00+00:00",
+            "product_family": "logs",
+            "org_name": "test_org",
+            **fields,
+            "type": "usage_timeseries",
+        }
+
+    nested = [
+        hour(0, measurements=[{"usage_type": "logs", "value": 1}]),
+        hour(
+            1,
+            measurements=[
+                {"usage_type": "logs", "value": 2},
+                {"usage_type": "bytes", "value": 10},
+            ],
+        ),
+        hour(24, measurements=[{"usage_type": "logs", "value": 4}]),
+    ]
+    assert list(rolled_up(nested, DAY)) == [
+        {
+            "timestamp": "2024-01-01T00:00:00+00:00",
+            "product_family": "logs",
+            "org_name": "test_org",
+            "type": "usage_timeseries",
+            "measurements": [
+                {"usage_type": "logs", "value": 3},
+                {"usage_type": "bytes", "value": 10},
+            ],
+        },
+        {
+            "timestamp": "2024-01-02T00:00:00+00:00",
+            "product_family": "logs",
+            "org_name": "test_org",
+            "type": "usage_timeseries",
+            "measurements": [{"usage_type": "logs", "value": 4}],
+        },
+    ]
+
+    flat = [
+        hour(0, usage_type="logs", value=1),
+        hour(0, usage_type="bytes", value=10),
+        hour(24, usage_type="logs", value=2.5),
+    ]
+    assert [(row["usage_type"], row["value"]) for row in rolled_up(flat, MONTH)] == [
+        ("logs", 3.5),
+        ("bytes", 10),
+    ]
+
+    wide = [hour(0, logs=1), hour(1, logs=2, bytes=10)]
+    assert [(row["logs"], row["bytes"]) for row in rolled_up(wide, DAY)] == [(3, 10)]
+
+
+def one_record_per_hour(request, context):
+    start, end = [
+        datetime.strptime(request.qs[param][0].upper(), "%Y-%m-%dT%H")
+        for param in ("filter[timestamp][start]", "filter[timestamp][end]")
+    ]
+    data = []
+    while start < end:
+        data.append(
+            {
+                "attributes": {
+                    "timestamp": start.strftime("%Y-%m-%dT%H:00:00+00:00"),
+                    "product_family": "logs",
+                    "org_name": "test_org",
+                    "measurements": [{"usage_type": "logs", "value": 1}],
+                },
+                "type": "usage_timeseries",
+            }
+        )
+        start += timedelta(hours=1)
+    return {"data": data, "meta": {}}
+
+
+def sync(stream, stream_state):
+    """Reads every slice, returning them, the totals of the emitted rows and the state."""
+    totals = {}
+    slices = stream.stream_slices(
+        sync_mode=SyncMode.incremental, stream_state=stream_state
+    )
+    for stream_slice in slices:
+        for record in stream.read_records(
+            sync_mode=SyncMode.incremental,
+            stream_slice=stream_slice,
+            stream_state=stream_state,
+        ):
+            stream_state = stream.get_updated_state(stream_state, record)
+            totals[record["timestamp"][:10]] = record["measurements"][0]["value"]
+    return slices, totals, stream_state
+
+
+def daily_rollup_stream(**kwargs):
+    return HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["logs"],
+        start_date="2024-01-01T12",
+        rollup=DAY,
+        **kwargs,
+    )
+
+
+def test_daily_rollup_slices_and_finalized_windows(frozen_now, requests_mock):
+    frozen_now(2024, 1, 3, 5, 30)
+    requests_mock.get(HOURLY_USAGE_URL, json=one_record_per_hour)
+    stream = daily_rollup_stream()
+
+    # now is 2024-01-03T05:30: the first window starts at `start_date`
+    slices, totals, stream_state = sync(stream, {})
+    assert slices == [
+        {"start": "2024-01-01T12", "end": "2024-01-02T00"},
+        {"start": "2024-01-02T00", "end": "2024-01-03T00"},
+        {"start": "2024-01-03T00", "end": "2024-01-03T06"},
+    ]
+    assert totals == {"2024-01-01": 12, "2024-01-02": 24, "2024-01-03": 6}
+    assert stream_state["finalized_until"] == "2024-01-03T00"
+
+    # only the open day is fetched again, and emitted once it changed
+    slices, totals, stream_state = sync(stream, stream_state)
+    assert slices == [{"start": "2024-01-03T00", "end": "2024-01-03T06"}]
+    assert totals == {}
+
+    frozen_now(2024, 1, 3, 6, 30)
+    slices, totals, stream_state = sync(stream, stream_state)
+    assert totals == {"2024-01-03": 7}
+
+
+def test_rerun_with_settling_does_not_emit_open_windows_again(
+    frozen_now, requests_mock
+):
+    frozen_now(2024, 1, 3, 5, 30)
+    requests_mock.get(HOURLY_USAGE_URL, json=one_record_per_hour)
+    stream = daily_rollup_stream(settling_hours=12)
+
+    _, totals, stream_state = sync(stream, {})
+    assert totals == {"2024-01-01": 12, "2024-01-02": 24, "2024-01-03": 6}
+    # 2024-01-02 started before the settling cutoff, but its last hours have not settled
+    assert stream_state["finalized_until"] == "2024-01-02T00"
+
+    slices, totals, stream_state = sync(stream, stream_state)
+    assert slices == [
+        {"start": "2024-01-02T00", "end": "2024-01-03T00"},
+        {"start": "2024-01-03T00", "end": "2024-01-03T06"},
+    ]
+    assert totals == {}
+
+
+def test_rollup_starts_from_window_of_existing_state(frozen_now):
+    frozen_now(2024, 1, 3, 5, 30)
+    stream = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["logs"],
+        start_date="2023-12-01T00",
+        rollup=MONTH,
+    )
+
+    slices = stream.stream_slices(
+        sync_mode=SyncMode.incremental,
+        stream_state={"settled_until": "2024-01-02T07"},
+    )
+    assert slices == [{"start": "2024-01-01T00", "end": "2024-01-03T06"}]
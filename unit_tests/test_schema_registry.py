@@ -0,0 +1,69 @@
+#
+# Copyright (c) 2024 Airbyte, Inc., all rights reserved.
+#
+
+import logging
+
+import pytest
+
+from airbyte_source_datadog_usage import schema_registry
+from airbyte_source_datadog_usage.source import (
+    EstimatedCostStream,
+    HourlyUsageByProductStream,
+    SourceDatadogUsage,
+)
+
+
+def test_schemas_are_loaded_once():
+    assert {"hourly_usage_by_products", "estimated_cost"} <= set(
+        schema_registry._SCHEMAS
+    )
+    assert schema_registry.get_schema("estimated_cost") is schema_registry.get_schema(
+        "estimated_cost"
+    )
+
+    with pytest.raises(KeyError):
+        schema_registry.get_schema("missing")
+
+
+def test_streams_do_not_read_schema_files(mocker):
+    read_text = mocker.patch("pathlib.Path.read_text")
+    hourly_usage = HourlyUsageByProductStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+        product_families=["all"],
+        start_date="2024-01-01T00",
+    )
+    estimated_cost = EstimatedCostStream(
+        api_key="test_api_key",
+        application_key="test_app_key",
+        site="datadoghq.com",
+    )
+
+    assert "measurements" in hourly_usage.get_json_schema()["properties"]
+    assert "charges" in estimated_cost.get_json_schema()["properties"]
+    read_text.assert_not_called()
+
+
+def test_usage_types_cover_every_product_family_of_the_spec():
+    spec = SourceDatadogUsage().spec(logging.getLogger("airbyte"))
+    product_families = spec.connectionSpecification["properties"][
+        "hourly_usage_by_product"
+    ]["properties"]["product_families"]["items"]["enum"]
+    assert set(schema_registry._USAGE_TYPES) == set(product_families) - {"all"}
+
+
+def test_wide_schema_is_generated_once_per_product_families():
+    schema = schema_registry.get_wide_schema(("infra_hosts", "logs"))
+    assert schema is schema_registry.get_wide_schema(("infra_hosts", "logs"))
+
+    properties = schema["properties"]
+    assert "measurements" not in properties
+    assert {"timestamp", "product_family", "org_name", "type"} <= set(properties)
+    assert properties["host_count"]["type"] == ["null", "integer"]
+    assert "billable_ingested_bytes" in properties
+    assert "check_calls_count" not in properties
+
+    every_family = schema_registry.get_wide_schema(("all",))
+    assert "check_calls_count" in every_family["properties"]
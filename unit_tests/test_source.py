@@ -16,7 +16,7 @@ def test_check_connection(mocker):
         "site": "datadoghq.com",
     }
 
-    requests_mock = mocker.patch("requests.get")
+    requests_mock = mocker.patch("requests.Session.get")
     requests_mock.return_value.status_code = 200
     assert source.check_connection(logger_mock, config) == (True, None)
 
@@ -31,6 +31,44 @@ def test_check_connection(mocker):
     assert source.check_connection(logger_mock, config) == (False, "Connection error")
 
 
+def test_check_connection_uses_pooled_session(requests_mock):
+    source = SourceDatadogUsage()
+    config = {
+        "api_key": "test_api_key",
+        "application_key": "test_app_key",
+        "site": "datadoghq.com",
+        "http": {"connect_timeout": 3, "read_timeout": 30, "max_retries": 0},
+    }
+    requests_mock.get("https://api.datadoghq.com/api/v1/validate", json={"valid": True})
+
+    assert source.check_connection(MagicMock(), config) == (True, None)
+    request = requests_mock.last_request
+    assert request.headers["DD-API-KEY"] == "test_api_key"
+    assert request.headers["Accept-Encoding"] == "gzip, deflate"
+    assert request.timeout == (3, 30)
+
+
+def test_streams_share_one_session():
+    source = SourceDatadogUsage()
+    config = {
+        "api_key": "test_api_key",
+        "application_key": "test_application_key",
+        "site": "datadoghq.com",
+        "hourly_usage_by_product": {
+            "product_families": ["all"],
+            "start_date": "2024-01-01T00",
+        },
+    }
+    hourly_usage, estimated_cost = source.streams(config)
+    assert hourly_usage._session is estimated_cost._session
+    assert hourly_usage._session is source._http_session(config)
+    assert hourly_usage.rate_limiter is estimated_cost.rate_limiter
+    assert (
+        hourly_usage.url_base == estimated_cost.url_base == "https://api.datadoghq.com"
+    )
+    assert hourly_usage.request_kwargs(stream_state={}) == {"timeout": (10.0, 300.0)}
+
+
 def test_streams(mocker):
     source = SourceDatadogUsage()
     config = {
@@ -45,3 +83,21 @@ def test_streams(mocker):
     streams = source.streams(config)
     expected_streams_number = 2
     assert len(streams) == expected_streams_number
+
+
+def test_streams_fan_out_expands_all_product_families():
+    source = SourceDatadogUsage()
+    config = {
+        "api_key": "test_api_key",
+        "application_key": "test_application_key",
+        "site": "datadoghq.com",
+        "hourly_usage_by_product": {
+            "product_families": ["all"],
+            "start_date": "2024-01-01T00",
+            "fan_out_product_families": True,
+        },
+    }
+    hourly_usage = source.streams(config)[0]
+    assert hourly_usage.fan_out_product_families
+    assert "all" not in hourly_usage.product_families
+    assert {"logs", "timeseries", "infra_hosts"} <= set(hourly_usage.product_families)
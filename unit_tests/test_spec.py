@@ -1,3 +1,9 @@
+import logging
+
+from airbyte_cdk.entrypoint import AirbyteEntrypoint
+from airbyte_cdk.models import AirbyteMessage, Type
+
+from airbyte_source_datadog_usage.run import spec_message
 from airbyte_source_datadog_usage.source import SourceDatadogUsage
 
 
@@ -27,3 +33,10 @@ def test_spec_matches_source():
 
     stream = source.streams(config)[0]
     assert stream.product_families == ["infra_hosts", "analyzed_logs"]
+
+
+def test_spec_message_matches_entrypoint():
+    spec = SourceDatadogUsage().spec(logging.getLogger("airbyte"))
+    message = AirbyteMessage(type=Type.SPEC, spec=spec)
+
+    assert spec_message() == AirbyteEntrypoint.airbyte_message_to_string(message)